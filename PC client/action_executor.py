@@ -0,0 +1,169 @@
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from serial_handler import LatencyTracker
+
+log = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+DEFAULT_TIMEOUT = 30.0
+
+class ActionCancelled(Exception):
+    pass
+
+class ActionTimeout(Exception):
+    pass
+
+class _Job:
+    def __init__(self, lane, name, fn, args, kwargs, timeout, keyboard):
+        self.lane = lane
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.keyboard = keyboard
+        self.future = Future()
+        self.cancelled = threading.Event()
+        self.queued_at = time.monotonic()
+        self.deadline = None
+
+class ActionExecutor:
+    """
+    Runs deck actions (app launches, password typing) off the Tk thread on a
+    bounded worker pool.
+    Each lane (one per deck) runs its actions one at a time in the order they
+    were submitted; different lanes run in parallel. Actions marked keyboard
+    also hold a shared lock so keystrokes from two decks never interleave.
+    Python threads cannot be killed, so cancel and timeout are cooperative:
+    actions call checkpoint() or sleep() between steps, which raise once the
+    action was cancelled or ran past its deadline.
+    """
+    def __init__(self, max_workers=MAX_WORKERS, default_timeout=DEFAULT_TIMEOUT):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="action")
+        self.default_timeout = default_timeout
+        self.lock = threading.Lock()
+        self.keyboard_lock = threading.Lock()
+        self.lanes = {}
+        self.busy_lanes = set()
+        self.jobs = {}
+        self.local = threading.local()
+        # Queue-to-completion time per action name, and time spent waiting for a worker
+        self.latency = collections.defaultdict(LatencyTracker)
+        self.queue_wait = LatencyTracker()
+        self.outcomes = collections.Counter()
+
+    def submit(self, lane, name, fn, *args, timeout=None, keyboard=False, **kwargs):
+        job = _Job(lane, name, fn, args, kwargs, timeout or self.default_timeout, keyboard)
+        with self.lock:
+            self.jobs[job.future] = job
+            self.lanes.setdefault(lane, collections.deque()).append(job)
+            self._schedule(lane)
+        return job.future
+
+    def _schedule(self, lane):
+        """Start the next job on lane if nothing is running there. Caller holds self.lock."""
+        if lane in self.busy_lanes:
+            return
+        pending = self.lanes.get(lane)
+        while pending:
+            job = pending.popleft()
+            if job.future.set_running_or_notify_cancel():
+                self.busy_lanes.add(lane)
+                self.pool.submit(self._run, job)
+                return
+            # Cancelled while queued
+            self.jobs.pop(job.future, None)
+            self.outcomes["cancelled"] += 1
+        self.lanes.pop(lane, None)
+
+    def _run(self, job):
+        started = time.monotonic()
+        self.queue_wait.record(started - job.queued_at)
+        job.deadline = started + job.timeout
+        self.local.job = job
+        try:
+            if job.keyboard:
+                with self.keyboard_lock:
+                    self.checkpoint()
+                    result = job.fn(*job.args, **job.kwargs)
+            else:
+                result = job.fn(*job.args, **job.kwargs)
+            job.future.set_result(result)
+            self.outcomes["done"] += 1
+        except ActionCancelled as e:
+            job.future.set_exception(e)
+            self.outcomes["cancelled"] += 1
+        except ActionTimeout as e:
+            job.future.set_exception(e)
+            self.outcomes["timeout"] += 1
+            log.warning(f"Action {job.name} timed out after {job.timeout:g}s")
+        except Exception as e:
+            job.future.set_exception(e)
+            self.outcomes["failed"] += 1
+            log.error(f"Action {job.name} failed: {e}")
+        finally:
+            self.local.job = None
+            self.latency[job.name].record(time.monotonic() - job.queued_at)
+            with self.lock:
+                self.jobs.pop(job.future, None)
+                self.busy_lanes.discard(job.lane)
+                self._schedule(job.lane)
+
+    # Called from inside running actions
+
+    def checkpoint(self):
+        job = getattr(self.local, "job", None)
+        if job is None:
+            return
+        if job.cancelled.is_set():
+            raise ActionCancelled(job.name)
+        if time.monotonic() > job.deadline:
+            raise ActionTimeout(job.name)
+
+    def sleep(self, seconds):
+        """time.sleep that wakes up early when the running action is cancelled"""
+        job = getattr(self.local, "job", None)
+        if job is None:
+            time.sleep(seconds)
+            return
+        job.cancelled.wait(min(seconds, max(0.0, job.deadline - time.monotonic())))
+        self.checkpoint()
+
+    # Cancellation
+
+    def cancel(self, future):
+        """Cancel a queued action, or ask a running one to stop at its next checkpoint"""
+        if future.cancel():
+            return True
+        with self.lock:
+            job = self.jobs.get(future)
+        if job is None:
+            return False
+        job.cancelled.set()
+        return True
+
+    def cancel_all(self, lane=None):
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if lane is None or job.lane == lane]
+        for job in jobs:
+            self.cancel(job.future)
+        return len(jobs)
+
+    def shutdown(self):
+        self.cancel_all()
+        self.pool.shutdown(wait=False)
+
+    def stats(self):
+        with self.lock:
+            queued = sum(len(jobs) for jobs in self.lanes.values())
+            running = len(self.busy_lanes)
+        return {
+            "queued": queued,
+            "running": running,
+            "outcomes": dict(self.outcomes),
+            "queue_wait": self.queue_wait.summary(),
+            "actions": {name: tracker.summary() for name, tracker in self.latency.items()}
+        }
@@ -0,0 +1,247 @@
+import logging
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = 300
+URL_PATTERN = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*://")
+# .desktop Exec field codes (%f, %U, ...) that are filled in by the launcher, not us
+FIELD_CODE = re.compile(r"%[fFuUdDnNickvm]")
+# argv[0] meaning "hand argv[1] to os.startfile": going through cmd /c start would let & in a URL run a second command
+STARTFILE = "startfile"
+# Extensions Popen can run on Windows; anything else raises WinError 193
+WINDOWS_PROGRAMS = (".exe", ".com", ".bat", ".cmd")
+
+def _opener(target):
+    """Command that opens a URL or document with the desktop's default handler"""
+    if sys.platform.startswith("win"):
+        return [STARTFILE, target]
+    if sys.platform == "darwin":
+        return ["open", target]
+    return ["xdg-open", target]
+
+def _is_program(path):
+    """
+    True for a file to run directly. Windows ignores X_OK, so there it is
+    a PATHEXT extension that CreateProcess can start; documents, shortcuts
+    and scripts such as .vbs go to the default handler instead.
+    """
+    if not os.path.isfile(path):
+        return False
+    if sys.platform.startswith("win"):
+        ext = os.path.splitext(path)[1].lower()
+        pathext = os.environ.get("PATHEXT", ".COM;.EXE;.BAT;.CMD").lower().split(";")
+        return ext in pathext and ext in WINDOWS_PROGRAMS
+    return os.access(path, os.X_OK)
+
+def _parse_desktop_file(path):
+    """Returns (name, argv) for a launchable Type=Application entry, else None"""
+    fields = {}
+    in_entry = False
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    in_entry = line == "[Desktop Entry]"
+                elif in_entry and "=" in line:
+                    key, _, value = line.partition("=")
+                    fields.setdefault(key.strip(), value.strip())
+    except OSError:
+        return None
+
+    if fields.get("Type", "Application") != "Application" or fields.get("Hidden") == "true":
+        return None
+    exec_line = FIELD_CODE.sub("", fields.get("Exec", "")).replace("%%", "%")
+    try:
+        argv = shlex.split(exec_line)
+    except ValueError:
+        return None
+    if not argv:
+        return None
+    return fields.get("Name", ""), argv
+
+class AppIndex:
+    """
+    Lookup table from app names to launch commands, built from what the
+    platform lists as installed:
+      Linux    executables on $PATH and XDG .desktop entries
+      Windows  executables on %PATH% and Start Menu shortcuts
+      macOS    executables on $PATH and .app bundles
+    resolve() turns an apps.json value into an argv list that launch() spawns
+    directly; None means the typing fallback is the only option left.
+    """
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.built_at = None
+        self.build_seconds = 0.0
+        self.thread = None
+        self.running = False
+
+    # Building
+
+    def build(self):
+        started = time.perf_counter()
+        entries = {}
+        self._scan_path(entries)
+        if sys.platform.startswith("win"):
+            self._scan_start_menu(entries)
+        elif sys.platform == "darwin":
+            self._scan_app_bundles(entries)
+        else:
+            self._scan_desktop_entries(entries)
+        with self.lock:
+            self.entries = entries
+            self.built_at = time.time()
+            self.build_seconds = time.perf_counter() - started
+        return len(entries)
+
+    def _scan_path(self, entries):
+        extensions = [""]
+        if sys.platform.startswith("win"):
+            extensions = os.environ.get("PATHEXT", ".EXE;.BAT;.CMD").lower().split(";")
+        for directory in os.environ.get("PATH", "").split(os.pathsep):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                stem, ext = os.path.splitext(name)
+                if extensions != [""]:
+                    if ext.lower() not in extensions:
+                        continue
+                    key = stem.lower()
+                else:
+                    key = name.lower()
+                path = os.path.join(directory, name)
+                # Earlier PATH entries win, as they do in a shell
+                if key not in entries and os.access(path, os.X_OK) and not os.path.isdir(path):
+                    entries[key] = [path]
+
+    def _scan_desktop_entries(self, entries):
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+        desktop = {}
+        for base in [data_home] + data_dirs.split(":"):
+            for root, _, files in os.walk(os.path.join(base, "applications")):
+                for name in files:
+                    if not name.endswith(".desktop"):
+                        continue
+                    parsed = _parse_desktop_file(os.path.join(root, name))
+                    if not parsed:
+                        continue
+                    display_name, argv = parsed
+                    # Earlier data dirs take precedence, as in the XDG spec
+                    for key in (display_name.lower(), name[:-len(".desktop")].lower()):
+                        if key:
+                            desktop.setdefault(key, argv)
+        # A .desktop entry knows the right arguments, so it beats a bare executable
+        entries.update(desktop)
+
+    def _scan_start_menu(self, entries):
+        roots = [os.path.join(os.environ.get(var, ""), "Microsoft", "Windows", "Start Menu", "Programs")
+                 for var in ("APPDATA", "PROGRAMDATA")]
+        for directory in roots:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    stem, ext = os.path.splitext(name)
+                    if ext.lower() in (".lnk", ".url"):
+                        entries.setdefault(stem.lower(), _opener(os.path.join(root, name)))
+
+    def _scan_app_bundles(self, entries):
+        for directory in ("/Applications", "/System/Applications", os.path.expanduser("~/Applications")):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith(".app"):
+                    entries.setdefault(name[:-len(".app")].lower(), ["open", "-a", os.path.join(directory, name)])
+
+    def start(self, interval=REFRESH_INTERVAL, on_refresh=None):
+        """Build now and then every interval seconds, on a background thread"""
+        self.running = True
+
+        def loop():
+            while self.running:
+                try:
+                    count = self.build()
+                    log.debug(f"App index: {count} entries in {self.build_seconds * 1000:.0f} ms")
+                    if on_refresh:
+                        on_refresh()
+                except Exception as e:
+                    log.error(f"App index refresh failed: {e}")
+                for _ in range(int(interval)):
+                    if not self.running:
+                        return
+                    time.sleep(1)
+
+        self.thread = threading.Thread(target=loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    # Resolving and launching
+
+    def resolve(self, value):
+        """argv for an apps.json value (path, URL, command line or app name), or None"""
+        value = (value or "").strip().strip('"')
+        if not value:
+            return None
+        if URL_PATTERN.match(value):
+            return _opener(value)
+        if os.path.exists(value):
+            if value.endswith(".desktop"):
+                parsed = _parse_desktop_file(value)
+                return parsed[1] if parsed else None
+            if _is_program(value):
+                return [value]
+            return _opener(value)
+
+        with self.lock:
+            argv = self.entries.get(value.lower())
+        if argv:
+            return list(argv)
+
+        # A command line such as "firefox --new-window"
+        try:
+            parts = shlex.split(value, posix=not sys.platform.startswith("win"))
+        except ValueError:
+            return None
+        if len(parts) > 1:
+            with self.lock:
+                head = self.entries.get(parts[0].lower())
+            head = head or ([shutil.which(parts[0])] if shutil.which(parts[0]) else None)
+            if head:
+                return list(head) + parts[1:]
+        return None
+
+    @staticmethod
+    def launch(argv):
+        """Spawn argv detached from this process"""
+        if argv[0] == STARTFILE:
+            # Extra words from a command line such as "Obsidian --safe" still reach the program
+            if len(argv) > 2:
+                os.startfile(argv[1], arguments=subprocess.list2cmdline(argv[2:]))
+            else:
+                os.startfile(argv[1])
+            return None
+        kwargs = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+        if sys.platform.startswith("win"):
+            kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        return subprocess.Popen(argv, **kwargs)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "built_at": self.built_at, "build_ms": round(self.build_seconds * 1000, 1)}
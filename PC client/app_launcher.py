@@ -1,18 +1,22 @@
 import customtkinter as ctk
 import pyautogui
+import logging
 import time
 import subprocess
 import os
 from tkinter import filedialog
-from image_processor import ImageProcessor
+from upload_progress import UploadProgress
+
+log = logging.getLogger(__name__)
 
 class AppLauncher(ctk.CTkFrame):
-    def __init__(self, parent, apps_config, mappings, on_save, serial_handler=None):
+    def __init__(self, parent, apps_config, mappings, on_save, serial_handler=None, deck_sync=None):
         super().__init__(parent)
         self.apps_config = apps_config
         self.mappings = mappings
         self.on_save = on_save
         self.serial_handler = serial_handler
+        self.deck_sync = deck_sync
         
         self.grid_columnconfigure((0,1,2,3), weight=1)
         
@@ -26,22 +30,18 @@ class AppLauncher(ctk.CTkFrame):
         self.create_grid()
         
     def create_grid(self):
-        for widget in self.winfo_children():
-            widget.destroy()
-            
+        """Build the 16 key buttons once; later edits only patch a button's text"""
+        self.buttons = {}
         ctk.CTkLabel(self, text="App Launcher", font=("Arial", 20)).grid(row=0, column=0, columnspan=4, pady=10)
         
         for r in range(4):
             for c in range(4):
                 key = self.keys[r][c]
-                
-                label = self.mappings.get(key, f"App {key}")
-                if key == '*': label = "Back"
-                
+
                 if key == '*':
                     btn = ctk.CTkButton(
                         self, 
-                        text=f"{label}\n({key})",
+                        text=self.button_text(key),
                         width=120,
                         height=80,
                         fg_color="#444444",
@@ -50,17 +50,33 @@ class AppLauncher(ctk.CTkFrame):
                 else:
                     btn = ctk.CTkButton(
                         self, 
-                        text=f"{label}\n({key})",
+                        text=self.button_text(key),
                         width=120,
                         height=80,
                         command=lambda k=key: self.edit_app(k)
                     )
                 btn.grid(row=r+1, column=c, padx=10, pady=10)
-                
+                self.buttons[key] = btn
+
+    def button_text(self, key):
+        label = "Back" if key == '*' else self.mappings.get(key, f"App {key}")
+        return f"{label}\n({key})"
+
+    def update_button(self, key):
+        text = self.button_text(key)
+        btn = self.buttons[key]
+        if btn.cget("text") != text:
+            btn.configure(text=text)
+
+    def refresh(self):
+        """Re-sync every button with the mappings after they changed outside this panel"""
+        for key in self.buttons:
+            self.update_button(key)
+
     def edit_app(self, key):
         dialog = ctk.CTkToplevel(self)
         dialog.title(f"Edit App {key}")
-        dialog.geometry("400x350")
+        dialog.geometry("400x460")
         
         dialog.transient(self)
         dialog.grab_set()
@@ -88,19 +104,18 @@ class AppLauncher(ctk.CTkFrame):
         
         ctk.CTkButton(dialog, text="Browse...", command=browse, width=100).pack(pady=5)
         
+        progress_holder = ctk.CTkFrame(dialog, fg_color="transparent")
+        
         def upload():
             file_path = filedialog.askopenfilename(filetypes=[("Images", "*.png;*.jpg;*.jpeg")])
-            if file_path:
-                raw_data = ImageProcessor.convert_to_rgb565(file_path)
-                if raw_data:
-                    if self.serial_handler.send_icon_data(key, raw_data, icon_type="app"):
-                        print(f"App icon sent for key {key}")
-                    else:
-                        print("Failed to send icon")
-                else:
-                    print("Failed to convert image")
+            if file_path and self.deck_sync:
+                job = self.deck_sync.upload_icon_file("app", key, file_path)
+                for widget in progress_holder.winfo_children():
+                    widget.destroy()
+                UploadProgress(progress_holder, job).pack()
 
-        ctk.CTkButton(dialog, text="Upload Icon", command=upload, fg_color="#e67e22", hover_color="#d35400").pack(pady=20)
+        ctk.CTkButton(dialog, text="Upload Icon", command=upload, fg_color="#e67e22", hover_color="#d35400").pack(pady=(20, 5))
+        progress_holder.pack()
         
         def save():
             new_name = name_entry.get()
@@ -110,18 +125,18 @@ class AppLauncher(ctk.CTkFrame):
             
             self.apps_config[key] = new_path
             
-            if self.serial_handler and self.serial_handler.serial_conn:
-                self.serial_handler.send(f"LABEL_APP:{key}:{new_name}")
+            if self.deck_sync:
+                self.deck_sync.push_label("app", key, new_name)
             
             self.on_save(self.apps_config, self.mappings)
             
-            self.create_grid()
+            self.update_button(key)
             dialog.destroy()
             
         ctk.CTkButton(dialog, text="Save", command=save).pack(pady=10)
 
     def launch_app(self, app_name):
-        print(f"Launching: {app_name}")
+        log.info(f"Launching: {app_name}")
         
         if os.path.exists(app_name):
             try:
@@ -145,7 +160,7 @@ class AppLauncher(ctk.CTkFrame):
         return self.apps_config.get(key, "Unknown")
 
     def launch_app(self, app_name):
-        print(f"Launching: {app_name}")
+        log.info(f"Launching: {app_name}")
         
         if os.path.exists(app_name):
             try:
@@ -0,0 +1,343 @@
+"""
+Benchmark suite for the PC client's hot paths.
+
+Run from the PC client folder:
+    python benchmarks.py                       # everything that can run here
+    python benchmarks.py --only crypto rgb565  # a subset
+    python benchmarks.py --output run.json --compare baseline.json
+
+Every case reports p50/p99 latency and throughput. --output writes the results
+as JSON and --compare prints the p50 ratio against an earlier run, so a
+regression shows up as a ratio above 1.
+"""
+import io
+import os
+import base64
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import contextlib
+import statistics
+from PIL import Image
+from image_processor import ImageProcessor
+
+RGB565_SIZES = [(32, 32), (64, 64), (240, 320)]
+VAULT_SIZES = [10, 1000, 100000]
+UID_COUNTS = [100, 10000]
+DECK_COUNTS = [1, 2, 4, 8]
+DISPATCH_MESSAGES = ["RFID_READ: 00000000", "APP_LAUNCH: A", "PASS_LAUNCH: A", "LABEL_APP_OK"]
+
+def time_call(fn, repeat, units=1):
+    """Run fn repeat times; units is the work per call (bytes, messages) used for throughput"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, units)
+
+def summarize(samples, units=1):
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 4),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 4),
+        "throughput_per_s": round(units * len(samples) / total, 1) if total else 0.0,
+        "runs": len(samples)
+    }
+
+def legacy_rgb565(img):
+    """The original per-pixel getpixel loop, kept as the comparison baseline"""
+    width, height = img.size
+    raw_data = bytearray()
+    for y in range(height):
+        for x in range(width):
+            r, g, b = img.getpixel((x, y))
+            rgb565 = ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+            raw_data.append((rgb565 >> 8) & 0xFF)
+            raw_data.append(rgb565 & 0xFF)
+    return raw_data
+
+def bench_rgb565(repeat=50):
+    results = {}
+    for size in RGB565_SIZES:
+        img = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+        png = io.BytesIO()
+        img.save(png, format="PNG")
+        runs = max(3, repeat // (size[0] * size[1] // 1024))
+        legacy = time_call(lambda: legacy_rgb565(img), runs)
+        vectorized = time_call(lambda: ImageProcessor.image_to_rgb565(img), repeat)
+        results[f"{size[0]}x{size[1]}"] = {
+            "legacy": legacy,
+            "vectorized": vectorized,
+            "vectorized_dither": time_call(lambda: ImageProcessor.image_to_rgb565(img, dither=True), repeat),
+            # Full convert_to_rgb565 path from an encoded file, including decode and resize
+            "convert_from_png": time_call(lambda: ImageProcessor.convert_to_rgb565(io.BytesIO(png.getvalue()), size), repeat),
+            "speedup": round(legacy["p50_ms"] / max(vectorized["p50_ms"], 1e-6), 1)
+        }
+    return results
+
+def bench_crypto(sizes=VAULT_SIZES):
+    from encryption_manager import EncryptionManager
+    from vault import PasswordVault
+    from vault_file import VaultFile
+    em = EncryptionManager()
+    em.generate_key()
+    results = {}
+    for count in sizes:
+        vault = {f"entry{i}": {"username": f"user{i}@example.com", "password": os.urandom(12).hex()}
+                 for i in range(count)}
+        package = em.encrypt_data(vault)
+        runs = max(3, min(200, 200000 // count))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            vault_path = os.path.join(tmp, "passwords.vault")
+            store = PasswordVault(em, VaultFile(vault_path))
+            store.update(vault)
+            store.save()
+
+            # The same records in the previous base64-in-JSON layout, for the load-time comparison
+            json_path = os.path.join(tmp, "passwords.json")
+            encoded = {name: dict(zip(("nonce", "tag", "ciphertext"), (base64.b64encode(bytes(part)).decode() for part in record)))
+                       for name, record in store.store.read_all().items()}
+            with open(json_path, 'w') as f:
+                json.dump({"version": 2, "records": encoded}, f, indent=2)
+
+            store = PasswordVault(em, VaultFile(vault_path))
+
+            def save_one():
+                store["entry0"] = {"username": "user0@example.com", "password": os.urandom(12).hex()}
+                store.save()
+
+            results[f"{count}_entries"] = {
+                "encrypt": time_call(lambda: em.encrypt_data(vault), runs, count),
+                "decrypt": time_call(lambda: em.decrypt_data(package), runs, count),
+                "package_bytes": len(json.dumps(package)),
+                # Per-entry vault: edit one entry and save, and open the vault and read one entry
+                "vault_save_one": time_call(save_one, runs),
+                "vault_load_binary": time_call(lambda: PasswordVault(em, VaultFile(vault_path))["entry0"], runs),
+                "vault_load_json": time_call(lambda: PasswordVault(em, VaultFile(os.path.join(tmp, "missing.vault")), json_path)["entry0"], runs),
+                "vault_binary_bytes": os.path.getsize(vault_path),
+                "vault_json_bytes": os.path.getsize(json_path)
+            }
+    return results
+
+def bench_uids(counts=UID_COUNTS, repeat=2000):
+    """Allowlist lookups (one HMAC plus a dict probe) against the old list scan"""
+    from uid_allowlist import UidAllowlist, make_pepper
+    results = {}
+    for count in counts:
+        uids = [f"{i:08X}" for i in range(count)]
+        allowlist = UidAllowlist(make_pepper())
+        for uid in uids:
+            allowlist.add(uid)
+        missing = "FFFFFFFF0"
+        results[f"{count}_uids"] = {
+            "allowlist_hit": time_call(lambda: uids[-1] in allowlist, repeat),
+            "allowlist_miss": time_call(lambda: missing in allowlist, repeat),
+            "list_miss": time_call(lambda: missing in uids, repeat)
+        }
+    return results
+
+def bench_app_index(repeat=5):
+    """Building the application index, and resolving an apps.json value against it"""
+    from app_index import AppIndex
+    index = AppIndex()
+    index.build()
+    name = next(iter(index.entries), "python")
+    return {
+        "entries": len(index.entries),
+        "build": time_call(index.build, repeat),
+        "resolve_name": time_call(lambda: index.resolve(name), 2000),
+        "resolve_command_line": time_call(lambda: index.resolve(f"{name} --version"), 2000)
+    }
+
+def bench_fill(repeat=20):
+    """Credential fill time per timing profile, against the recording backend"""
+    from keystroke import RecordingBackend, TIMING_PROFILES
+    results = {}
+    for profile in TIMING_PROFILES:
+        backend = RecordingBackend(profile)
+        results[profile] = time_call(lambda: backend.fill("user@example.com", "correct horse battery staple"), repeat)
+    return results
+
+def bench_icon_upload(repeat=5, text=False):
+    """Upload a 32x32 icon to the emulated deck at 115200 baud; throughput is bytes per second"""
+    from deck_emulator import DeckEmulator
+    from serial_handler import SerialHandler
+
+    results = {}
+    modes = [("binary", True)] + ([("text", False)] if text else [])
+    data = os.urandom(32 * 32 * 2)
+    for name, binary in modes:
+        deck = DeckEmulator(binary=binary).start()
+        handler = SerialHandler(port=deck.port)
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler.start()
+            deadline = time.monotonic() + 2
+            while not handler.connected and time.monotonic() < deadline:
+                time.sleep(0.01)
+            results[name] = time_call(lambda: handler.send_icon_data("A", data).result(),
+                                      repeat if binary else 1, len(data))
+            handler.stop()
+        deck.stop()
+    return results
+
+def bench_decks(counts=DECK_COUNTS, rounds=100):
+    """
+    Key presses on every emulated deck at once, timed from the deck writing the
+    line to DeckManager handing it on with the deck's id; p50/p99 should stay
+    flat as decks are added
+    """
+    import queue
+    from deck_emulator import DeckEmulator
+    from deck_manager import DeckManager
+    from device_state import DeviceMirror
+    from icon_cache import IconCache
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        mirror = DeviceMirror(tmp)
+        cache = IconCache(os.path.join(tmp, "cache"))
+        for count in counts:
+            arrivals = queue.Queue()
+            emulators = [DeckEmulator().start() for _ in range(count)]
+            manager = DeckManager(mirror, cache, lambda deck_id, line: arrivals.put((deck_id, line, time.perf_counter())))
+            samples = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager.configure([(f"deck{i}", deck.port, {}, {}) for i, deck in enumerate(emulators)])
+                deadline = time.monotonic() + 3
+                while manager.connected_count() < count and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                for _ in range(rounds):
+                    sent = {}
+                    for i, deck in enumerate(emulators):
+                        sent[f"deck{i}"] = time.perf_counter()
+                        deck.press_app("A")
+                    for _ in range(count):
+                        deck_id, line, at = arrivals.get(timeout=2)
+                        samples.append(at - sent[deck_id])
+                manager.stop()
+            for deck in emulators:
+                deck.stop()
+            results[f"{count}_decks"] = summarize(samples)
+    return results
+
+def bench_recorder(repeat=20000):
+    """Cost the traffic recorder adds per line on the serial thread, and reading a trace back"""
+    from traffic_recorder import TrafficRecorder, read_trace
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.orcatrace")
+        recorder = TrafficRecorder(path)
+        frame = os.urandom(69)
+        results = {
+            "record_line": time_call(lambda: recorder.record_line("APP_LAUNCH: A"), repeat),
+            "record_line_redacted": time_call(lambda: recorder.record_line("RFID_READ: 52A77A5C"), repeat),
+            "record_frame": time_call(lambda: recorder.record_tx(frame), repeat)
+        }
+        recorder.close()
+        results["dropped"] = recorder.dropped
+        results["read_trace"] = time_call(lambda: read_trace(path), 5, recorder.written)
+    return results
+
+def _make_app():
+    from orca_deck_app import OrcaDeckApp
+    return OrcaDeckApp()
+
+def bench_dispatch(repeat=2000):
+    """Messages through OrcaDeckApp._process_serial_message on a live (locked) app instance"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = _make_app()
+        try:
+            results = {}
+            for message in DISPATCH_MESSAGES:
+                command = message.split(":")[0]
+                results[command] = time_call(lambda: app._process_serial_message(message), repeat)
+        finally:
+            app.quit_app()
+    return results
+
+def bench_startup(repeat=3):
+    """Cold construction of OrcaDeckApp until the first screen has been laid out"""
+    def start():
+        app = _make_app()
+        app.update_idletasks()
+        app.quit_app()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {"to_lock_screen": time_call(start, repeat)}
+
+BENCHMARKS = {
+    "dispatch": bench_dispatch,
+    "decks": bench_decks,
+    "icon_upload": bench_icon_upload,
+    "crypto": bench_crypto,
+    "rgb565": bench_rgb565,
+    "uids": bench_uids,
+    "app_index": bench_app_index,
+    "fill": bench_fill,
+    "recorder": bench_recorder,
+    "startup": bench_startup
+}
+
+def run(names, text_upload=False):
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "results": {}
+    }
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        try:
+            if name == "icon_upload":
+                report["results"][name] = bench_icon_upload(text=text_upload)
+            else:
+                report["results"][name] = BENCHMARKS[name]()
+        except Exception as e:
+            # GUI benchmarks need a display and the full dependency set
+            report["results"][name] = {"skipped": f"{type(e).__name__}: {e}"}
+    return report
+
+def _flatten(results, prefix=""):
+    for key, value in results.items():
+        if isinstance(value, dict) and "p50_ms" in value:
+            yield f"{prefix}{key}", value
+        elif isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+
+def compare(report, baseline):
+    old = dict(_flatten(baseline.get("results", {})))
+    for name, case in _flatten(report["results"]):
+        if name in old and old[name]["p50_ms"]:
+            ratio = case["p50_ms"] / old[name]["p50_ms"]
+            flag = "  REGRESSION" if ratio > 1.2 else ""
+            print(f"{name:50s} {old[name]['p50_ms']:>10.3f} -> {case['p50_ms']:>10.3f} ms  x{ratio:.2f}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="ORCA DECK PC client benchmarks")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--text-upload", action="store_true", help="also time the legacy hex upload (slow)")
+    args = parser.parse_args()
+
+    report = run(args.only or list(BENCHMARKS), args.text_upload)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import collections
+
+class Command(collections.namedtuple("Command", ["name", "arg", "raw", "deck", "received_at"], defaults=(None, None))):
+    """
+    A deck message split once into its command name and argument, e.g. "APP_LAUNCH: A" -> ("APP_LAUNCH", "A"),
+    plus the id of the deck that sent it and when it came off the wire (time.perf_counter())
+    """
+    __slots__ = ()
+
+def parse_command(line, deck=None, received_at=None):
+    name, _, arg = line.partition(":")
+    return Command(name.strip(), arg.strip(), line, deck, received_at)
+
+class CommandDispatcher:
+    """
+    Maps deck command names to handlers. Handlers take a Command; anything can
+    register one, so new deck commands do not need changes to the app class.
+    """
+    def __init__(self):
+        self.handlers = {}
+        self.unhandled = None
+
+    def register(self, name, handler=None):
+        """Register handler for name; without a handler, returns a decorator"""
+        if handler is None:
+            def decorator(fn):
+                self.handlers[name] = fn
+                return fn
+            return decorator
+        self.handlers[name] = handler
+        return handler
+
+    def unregister(self, name):
+        self.handlers.pop(name, None)
+
+    def dispatch(self, command):
+        if isinstance(command, str):
+            command = parse_command(command)
+        handler = self.handlers.get(command.name)
+        if handler is None:
+            if self.unhandled:
+                self.unhandled(command)
+            return False
+        handler(command)
+        return True
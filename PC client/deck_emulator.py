@@ -0,0 +1,332 @@
+"""
+Pure-Python stand-in for the ORCA deck firmware (sketch_oct16a), served over a
+pseudo-terminal so SerialHandler can connect to it like a real COM port.
+
+Run interactively:
+    python deck_emulator.py [--baud 115200] [--corrupt 0.01] [--drop 0.01] [--text-only]
+
+then point the app's COM port at the printed device and type commands:
+    tap <UID>      present an RFID card (answers AUTH_OK with RFID_UNLOCK_OK)
+    app <key>      press a key on the app launcher page
+    pass <key>     press a key on the password page
+    boot           replay the boot banner (forgets labels, lists SPIFFS files)
+    stall <secs>   stop answering for a while
+    state          print labels and stored icons
+    quit
+"""
+import os
+import sys
+import time
+import errno
+import random
+import select
+import argparse
+import threading
+import icon_protocol
+
+KEYS = "ABCD369#2580147*"
+BIN_UPLOAD_TIMEOUT = icon_protocol.BIN_UPLOAD_TIMEOUT
+
+class DeckEmulator:
+    def __init__(self, baud_rate=115200, pacing=True, binary=True,
+                 corrupt_rate=0.0, drop_rate=0.0, reply_delay=0.0, seed=None, device_id=None):
+        self.baud_rate = baud_rate
+        self.pacing = pacing
+        self.binary = binary
+        # Fraction of inbound frames/lines damaged in transit, and of outbound lines lost
+        self.corrupt_rate = corrupt_rate
+        self.drop_rate = drop_rate
+        self.reply_delay = reply_delay
+        self.random = random.Random(seed)
+        # Stands in for the ESP32's MAC in DECK_ID replies
+        self.device_id = (device_id or "%012X" % self.random.getrandbits(48)).upper()
+
+        self.master_fd, self.slave_fd = os.openpty()
+        self.port = os.ttyname(self.slave_fd)
+        self.running = False
+        self.thread = None
+        self.write_lock = threading.Lock()
+        self.stalled_until = 0.0
+
+        # Firmware state
+        self.labels = {"app": {}, "pass": {}}
+        self.files = {}
+        self.upload_name = None
+        self.upload_part = None
+        self.upload_remaining = 0
+        self.last_byte = 0.0
+        self.bin_active = False
+        self.bin_expected = 0
+        self.bin_nak_sent = False
+        self.pending_pass_key = None
+
+        self.stats = {"lines_in": 0, "lines_out": 0, "frames_ok": 0, "frames_bad": 0,
+                      "bytes_in": 0, "bytes_out": 0, "dropped": 0, "corrupted": 0}
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _pace(self, nbytes):
+        # 8N1 framing: ten bit times per byte on the wire
+        if self.pacing and self.baud_rate:
+            time.sleep(nbytes * 10.0 / self.baud_rate)
+
+    def _println(self, line):
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            self.stats["dropped"] += 1
+            return
+        if self.reply_delay:
+            time.sleep(self.reply_delay)
+        data = f"{line}\r\n".encode()
+        with self.write_lock:
+            self._pace(len(data))
+            try:
+                os.write(self.master_fd, data)
+            except OSError:
+                return
+        self.stats["lines_out"] += 1
+        self.stats["bytes_out"] += len(data)
+
+    # Events a user would trigger on the hardware
+
+    def tap_card(self, uid, pass_key=None):
+        """Present a card; pass_key simulates the RFID_VERIFY flow of the password page"""
+        self.pending_pass_key = pass_key
+        self._println(f"RFID_READ: {uid.upper()}")
+
+    def press_app(self, key):
+        self._println(f"APP_LAUNCH: {key}")
+
+    def press_pass(self, key):
+        self._println(f"PASS_LAUNCH: {key}")
+
+    def boot(self):
+        self.labels = {"app": {}, "pass": {}}
+        self.bin_active = False
+        self._println(icon_protocol.DECK_ID_REPLY + self.device_id)
+        self._println("SPIFFS Mounted")
+        for name in sorted(self.files):
+            self._println(f"FILE: /{name}")
+        self._println("Found PN53x chip, version: 32")
+        self._println("DECK_READY")
+
+    def stall(self, seconds):
+        self.stalled_until = time.monotonic() + seconds
+
+    # Serial loop
+
+    def _run(self):
+        buffer = bytearray()
+        while self.running:
+            try:
+                ready, _, _ = select.select([self.master_fd], [], [], 0.1)
+                if not ready:
+                    self._check_upload_timeout()
+                    continue
+                chunk = os.read(self.master_fd, 4096)
+            except OSError as e:
+                # EIO while the host has the port closed; wait for it to reopen
+                if e.errno == errno.EIO:
+                    time.sleep(0.05)
+                    continue
+                break
+
+            if time.monotonic() < self.stalled_until:
+                self._check_upload_timeout()
+                continue
+            self._pace(len(chunk))
+            self.last_byte = time.monotonic()
+            self.stats["bytes_in"] += len(chunk)
+            buffer += chunk
+            self._consume(buffer)
+
+    def _check_upload_timeout(self):
+        # Like the firmware: give up on a silent binary upload but keep the .part for a resume
+        if self.bin_active and time.monotonic() - self.last_byte > BIN_UPLOAD_TIMEOUT:
+            self.bin_active = False
+            self._println("UPLOAD_ABORT")
+
+    def _finish_upload(self):
+        self.files[self.upload_name] = self.files.pop(self.upload_part)
+        self.upload_name = self.upload_part = None
+        self._println("UPLOAD_DONE")
+
+    def _consume(self, buffer):
+        while buffer:
+            if self.bin_active:
+                if not self._consume_frame(buffer):
+                    return
+                continue
+
+            end = buffer.find(b"\n")
+            if end < 0:
+                return
+            line = buffer[:end].decode("utf-8", errors="ignore").strip()
+            del buffer[:end + 1]
+            if self.corrupt_rate and line and self.random.random() < self.corrupt_rate:
+                self.stats["corrupted"] += 1
+                line = line[:-1]
+            self.stats["lines_in"] += 1
+            self._handle_line(line)
+
+    def _consume_frame(self, buffer):
+        """Parse one frame from buffer; returns False when more bytes are needed"""
+        if buffer[0] != icon_protocol.FRAME_MAGIC:
+            del buffer[0]
+            return True
+        if len(buffer) < 3 or len(buffer) < buffer[2] + 5:
+            return False
+
+        length = buffer[2] + 5
+        frame = bytearray(buffer[:length])
+        del buffer[:length]
+        if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+            self.stats["corrupted"] += 1
+            frame[-1] ^= 0xFF
+
+        parsed = icon_protocol.parse_frame(frame)
+        if parsed is not None and not parsed[1]:
+            # An empty frame, whatever its sequence number, is the host cancelling
+            self.bin_active = False
+            self.files.pop(self.upload_part, None)
+            self.upload_name = self.upload_part = None
+            self._println("UPLOAD_ABORT")
+            return True
+        if parsed is None or parsed[0] != self.bin_expected:
+            self.stats["frames_bad"] += 1
+            if not self.bin_nak_sent:
+                self._println(f"NAK:{self.bin_expected}")
+                self.bin_nak_sent = True
+            return True
+
+        seq, payload = parsed
+        self.stats["frames_ok"] += 1
+        self.files[self.upload_part] += payload
+        self.upload_remaining -= len(payload)
+        self.bin_nak_sent = False
+        self._println(f"ACK:{seq}")
+        self.bin_expected = (self.bin_expected + 1) & 0xFF
+        if self.upload_remaining <= 0:
+            self.bin_active = False
+            self._finish_upload()
+        return True
+
+    def _handle_line(self, line):
+        if line == icon_protocol.CAPS_QUERY:
+            if self.binary:
+                self._println(icon_protocol.CAPS_REPLY + icon_protocol.CAP_BINARY)
+
+        elif line == icon_protocol.WHO_QUERY:
+            self._println(icon_protocol.DECK_ID_REPLY + self.device_id)
+
+        elif line.startswith("ICON_START:") or line.startswith("ICON_BIN:"):
+            parts = line.split(":")
+            if len(parts) < 4 or (parts[0] == "ICON_BIN" and not self.binary):
+                return
+            icon_type, key = parts[1], parts[2]
+            total = int(parts[3] or 0)
+            self.upload_name = f"{icon_type}_{key}.raw"
+            self.upload_part = f"{icon_type}_{key}.part"
+            resume = parts[0] == "ICON_BIN" and parts[4:5] == [icon_protocol.RESUME_FLAG]
+            kept = self.files.get(self.upload_part)
+            if not (resume and kept is not None and len(kept) <= total):
+                kept = self.files[self.upload_part] = bytearray()
+            self.upload_remaining = total - len(kept)
+            self._println(f"Opening for write: /{self.upload_part}")
+            if parts[0] == "ICON_BIN":
+                self.bin_active = True
+                self.bin_expected = 0
+                self.bin_nak_sent = False
+                self.last_byte = time.monotonic()
+            self._println(f"{icon_protocol.START_OK}:{len(kept)}")
+            if self.bin_active and self.upload_remaining <= 0:
+                self.bin_active = False
+                self._finish_upload()
+
+        elif line.startswith("ICON_DATA:"):
+            if self.upload_part:
+                try:
+                    chunk = bytes.fromhex(line[10:])
+                except ValueError:
+                    return
+                self.files[self.upload_part] += chunk
+                self.upload_remaining -= len(chunk)
+
+        elif line == "ICON_END":
+            if self.upload_part:
+                self._finish_upload()
+
+        elif line.startswith("LABEL_APP:") or line.startswith("LABEL_PASS:"):
+            command, _, rest = line.partition(":")
+            key, _, name = rest.partition(":")
+            if key in KEYS:
+                page = "app" if command == "LABEL_APP" else "pass"
+                self.labels[page][key] = name
+                self._println(f"{command}_OK:{key}")
+
+        elif line == "AUTH_OK":
+            if self.pending_pass_key:
+                key, self.pending_pass_key = self.pending_pass_key, None
+                self._println(f"PASS_LAUNCH: {key}")
+            else:
+                self._println("RFID_UNLOCK_OK")
+
+        elif line == "AUTH_FAIL":
+            self.pending_pass_key = None
+
+def main():
+    parser = argparse.ArgumentParser(description="ORCA deck emulator on a pseudo-terminal")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--no-pacing", action="store_true", help="do not throttle to the baud rate")
+    parser.add_argument("--text-only", action="store_true", help="behave like firmware without binary frames")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="fraction of inbound lines/frames to damage")
+    parser.add_argument("--drop", type=float, default=0.0, help="fraction of outbound lines to lose")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before each reply")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--id", help="DECK_ID to report (default: random)")
+    args = parser.parse_args()
+
+    deck = DeckEmulator(args.baud, not args.no_pacing, not args.text_only,
+                        args.corrupt, args.drop, args.delay, args.seed, args.id).start()
+    print(f"ORCA deck emulator {deck.device_id} listening on {deck.port}")
+    deck.boot()
+
+    try:
+        for raw in sys.stdin:
+            cmd, _, arg = raw.strip().partition(" ")
+            if cmd == "tap" and arg:
+                deck.tap_card(arg)
+            elif cmd == "app" and arg:
+                deck.press_app(arg)
+            elif cmd == "pass" and arg:
+                deck.press_pass(arg)
+            elif cmd == "boot":
+                deck.boot()
+            elif cmd == "stall" and arg:
+                deck.stall(float(arg))
+            elif cmd == "state":
+                print(f"Labels: {deck.labels}")
+                print(f"Icons: {({name: len(data) for name, data in deck.files.items()})}")
+                print(f"Stats: {deck.stats}")
+            elif cmd in ("quit", "exit"):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        deck.stop()
+
+if __name__ == "__main__":
+    main()
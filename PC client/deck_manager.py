@@ -0,0 +1,201 @@
+import logging
+import os
+import threading
+from serial_handler import SerialHandler, PRIORITY_NORMAL
+from device_state import DeckSync
+from storage import DEFAULT_DECK
+from port_discovery import PortDiscovery, AUTO_PORT, is_auto
+from traffic_recorder import TrafficRecorder, trace_path
+
+log = logging.getLogger(__name__)
+
+def parse_deck_list(text):
+    """
+    "kiosk2=COM5, COM6" -> [("kiosk2", "COM5"), ("COM6", "COM6")]
+    A deck without a name is known by its port. "auto" may be listed more than
+    once; each takes the next deck discovery finds.
+    """
+    decks = []
+    seen = set()
+    for item in text.split(","):
+        name, _, port = item.strip().rpartition("=")
+        port = port.strip()
+        deck_id = name.strip() or port
+        if port == AUTO_PORT and not name.strip():
+            deck_id = f"{AUTO_PORT}{len(decks) + 2}"
+        # A port can only be opened once, and ids key the deck's slots
+        if port and port not in seen and deck_id not in seen:
+            seen.update((port, deck_id) if port != AUTO_PORT else (deck_id,))
+            decks.append((deck_id, port))
+    return decks
+
+def format_deck_list(decks):
+    return ", ".join(port if deck_id == port else f"{deck_id}={port}" for deck_id, port in decks)
+
+class Deck:
+    """One deck: its serial link, the slot mappings it shows and the sync that keeps them on the device"""
+    def __init__(self, deck_id, port, serial_handler, sync, mappings, apps):
+        self.deck_id = deck_id
+        self.port = port
+        self.serial_handler = serial_handler
+        self.sync = sync
+        self.mappings = mappings
+        self.apps = apps
+        self.shown_connected = False
+
+    @property
+    def connected(self):
+        return self.serial_handler.connected
+
+class DeckManager:
+    """
+    Owns a SerialHandler and DeckSync per configured deck. Every line a deck
+    sends reaches on_message(deck_id, line), so handlers know which deck it
+    came from and can answer on that deck's link; the first deck is the one
+    the editing panels work on.
+    All decks share one DeviceMirror, keyed by port as before, so a deck moved
+    to another port is re-synced in full; decks found by discovery are keyed
+    by the DECK_ID they report in the handshake. The decks share one PortDiscovery.
+    """
+    def __init__(self, mirror, icon_cache, on_message, on_mappings_changed=None, handler_factory=SerialHandler, discovery=None):
+        self.mirror = mirror
+        self.icon_cache = icon_cache
+        self.on_message = on_message
+        self.on_mappings_changed = on_mappings_changed
+        self.handler_factory = handler_factory
+        self.discovery = discovery or PortDiscovery().start()
+        self.decks = {}
+        self.lock = threading.Lock()
+        # Directory for traffic traces while recording is on
+        self.record_dir = None
+
+    def configure(self, entries):
+        """
+        entries: [(deck_id, port, mappings, apps)] in display order. Decks that
+        are new or changed port get a fresh connection; unchanged decks keep
+        theirs, and decks no longer listed are stopped.
+        """
+        wanted = {entry[0]: entry for entry in entries}
+        with self.lock:
+            current = self.decks
+            self.decks = {}
+        for deck_id, deck in current.items():
+            if deck_id not in wanted or wanted[deck_id][1] != deck.port:
+                deck.serial_handler.stop()
+                self._stop_recording(deck)
+
+        decks = {}
+        for deck_id, port, mappings, apps in entries:
+            deck = current.get(deck_id)
+            if deck is not None and deck.port == port:
+                deck.mappings = deck.sync.mappings = mappings
+                deck.apps = apps
+            else:
+                deck = self._open(deck_id, port, mappings, apps)
+            decks[deck_id] = deck
+        with self.lock:
+            self.decks = decks
+
+    def _open(self, deck_id, port, mappings, apps):
+        handler = self.handler_factory(port=port, on_message=lambda line: self.on_message(deck_id, line), discovery=self.discovery)
+        sync = DeckSync(deck_id if is_auto(port) else port, handler, self.mirror, mappings, self.icon_cache,
+                        on_mappings_changed=self.on_mappings_changed, by_device_id=is_auto(port))
+        deck = Deck(deck_id, port, handler, sync, mappings, apps)
+        if self.record_dir:
+            self._start_recording(deck)
+        handler.start()
+        return deck
+
+    def stop(self):
+        with self.lock:
+            decks = list(self.decks.values())
+            self.decks = {}
+        for deck in decks:
+            deck.serial_handler.stop()
+            self._stop_recording(deck)
+        self.discovery.stop()
+
+    # Traffic recording
+
+    def record_to(self, directory):
+        """Record every deck's traffic to a trace file in directory; None stops recording"""
+        self.record_dir = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        for deck in self:
+            if directory and deck.serial_handler.recorder is None:
+                self._start_recording(deck)
+            elif not directory:
+                self._stop_recording(deck)
+
+    def _start_recording(self, deck):
+        try:
+            deck.serial_handler.recorder = TrafficRecorder(trace_path(self.record_dir, deck.deck_id),
+                                                           {"deck_id": deck.deck_id, "port": deck.port})
+        except OSError as e:
+            log.error(f"Cannot record traffic for {deck.deck_id}: {e}")
+
+    def _stop_recording(self, deck):
+        recorder = deck.serial_handler.recorder
+        deck.serial_handler.recorder = None
+        if recorder:
+            recorder.close()
+            log.info(f"Recorded {recorder.written} records to {recorder.path}")
+
+    # Lookup
+
+    def get(self, deck_id):
+        with self.lock:
+            return self.decks.get(deck_id)
+
+    @property
+    def primary(self):
+        with self.lock:
+            return self.decks.get(DEFAULT_DECK) or next(iter(self.decks.values()), None)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.decks.values()))
+
+    def __len__(self):
+        with self.lock:
+            return len(self.decks)
+
+    def connected_count(self):
+        return sum(1 for deck in self if deck.connected)
+
+    def connection_changes(self):
+        """Decks whose connection went up or down since the last call"""
+        changed = []
+        for deck in self:
+            connected = deck.connected
+            if connected != deck.shown_connected:
+                deck.shown_connected = connected
+                changed.append(deck)
+        return changed
+
+    # Sending
+
+    def send(self, deck_id, message, priority=PRIORITY_NORMAL):
+        """Queue a line for one deck; returns its future, or None if the deck is unknown"""
+        deck = self.get(deck_id)
+        if deck is None:
+            return None
+        return deck.serial_handler.send(message, priority=priority)
+
+    def sync_all_async(self, exclude=None):
+        for deck in self:
+            if deck is not exclude:
+                deck.sync.sync_async()
+
+    def stats(self):
+        return [{
+            "deck_id": deck.deck_id,
+            "port": deck.serial_handler.device_port or deck.port,
+            "device_id": deck.serial_handler.device_id,
+            "connected": deck.connected,
+            "reconnect_attempts": deck.serial_handler.backoff.attempt,
+            "latency": deck.serial_handler.latency_stats(),
+            "queue": deck.serial_handler.queue_stats(),
+            "recording": deck.serial_handler.recorder.stats() if deck.serial_handler.recorder else None
+        } for deck in self]
@@ -0,0 +1,312 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import CancelledError
+from persistence import atomic_write
+from serial_handler import IconUpload
+
+log = logging.getLogger(__name__)
+
+DECK_STATE_FILE = "deck_state.json"
+
+# Deck page names used on the wire, and the mappings.json section holding their labels
+PAGES = {"app": "apps", "pass": "passwords"}
+LABEL_COMMANDS = {"app": "LABEL_APP", "pass": "LABEL_PASS"}
+# '*' is the hardware back key and never carries a label or icon
+SKIP_KEYS = ("*",)
+
+class DeviceMirror:
+    """
+    Host-side record of what each deck holds: a label and an icon cache key per
+    key and page. Labels live in the deck's RAM and are forgotten on reboot;
+    icons are files in SPIFFS and survive it.
+    With a WriteBehind, save_data only marks the file dirty and it is written
+    on the persistence thread; without one it is written at once.
+    """
+    def __init__(self, data_dir, persistence=None):
+        self.file_path = os.path.join(data_dir, DECK_STATE_FILE)
+        self.persistence = persistence
+        self.lock = threading.Lock()
+        self.data = self.load_data()
+
+    def load_data(self):
+        if os.path.exists(self.file_path):
+            try:
+                with open(self.file_path, 'r') as f:
+                    return json.load(f)
+            except:
+                pass
+        return {}
+
+    def save_data(self):
+        if self.persistence:
+            self.persistence.mark("deck_state", self.write_data)
+        else:
+            self.write_data()
+
+    def write_data(self):
+        with self.lock:
+            snapshot = json.dumps(self.data, indent=2)
+        atomic_write(self.file_path, snapshot)
+
+    def slot(self, deck_id, page, key):
+        with self.lock:
+            return dict(self.data.get(deck_id, {}).get(page, {}).get(key, {}))
+
+    def update(self, deck_id, page, key, **fields):
+        with self.lock:
+            slot = self.data.setdefault(deck_id, {}).setdefault(page, {}).setdefault(key, {})
+            slot.update(fields)
+
+    def forget_labels(self, deck_id):
+        with self.lock:
+            for page in self.data.get(deck_id, {}).values():
+                for slot in page.values():
+                    slot.pop("label", None)
+
+    def keep_icons(self, deck_id, present_files):
+        """Drop icons the deck no longer has, given the file names it listed at boot"""
+        with self.lock:
+            for page, slots in self.data.get(deck_id, {}).items():
+                for key, slot in slots.items():
+                    if slot.get("icon") and f"{page}_{key}.raw" not in present_files:
+                        slot.pop("icon", None)
+
+class DeckSync:
+    """
+    Pushes labels and icons to a deck, sending only the slots whose state differs from the mirror.
+    With by_device_id the mirror entry follows the DECK_ID the connected deck
+    reported, so another deck plugged in under the same "auto" entry is synced
+    in full; deck_id is the key until then, and for firmware without an id.
+    """
+    def __init__(self, deck_id, serial_handler, mirror, mappings, icon_cache, on_mappings_changed=None, by_device_id=False):
+        self.fixed_id = deck_id
+        self.by_device_id = by_device_id
+        self.serial_handler = serial_handler
+        self.mirror = mirror
+        self.mappings = mappings
+        self.icon_cache = icon_cache
+        self.on_mappings_changed = on_mappings_changed
+        self.sync_lock = threading.Lock()
+        self.boot_files = None
+        # Latest IconUpload per (page, key); interrupted ones are resumed by the next sync
+        self.uploads = {}
+        # (page, key, label) sent but not yet acknowledged, in send order
+        self.pending_labels = collections.deque()
+        self.label_lock = threading.Lock()
+
+    @property
+    def deck_id(self):
+        """Key of this deck in the mirror"""
+        if self.by_device_id and self.serial_handler.device_id:
+            return self.serial_handler.device_id
+        return self.fixed_id
+
+    def desired_state(self):
+        """Label and icon cache key per page and key, from mappings.json"""
+        icons = self.mappings.get("icons", {})
+        desired = {}
+        for page, section in PAGES.items():
+            slots = {}
+            for key, label in self.mappings.get(section, {}).items():
+                if key in SKIP_KEYS:
+                    continue
+                slots[key] = {"label": label, "icon": icons.get(page, {}).get(key)}
+            desired[page] = slots
+        return desired
+
+    def diff(self):
+        """List of (page, key, field, value) that must be sent to bring the deck up to date"""
+        changes = []
+        for page, slots in self.desired_state().items():
+            for key, wanted in slots.items():
+                current = self.mirror.slot(self.deck_id, page, key)
+                if wanted["label"] != current.get("label") and not self._label_pending(page, key, wanted["label"]):
+                    changes.append((page, key, "label", wanted["label"]))
+                if wanted["icon"] and wanted["icon"] != current.get("icon"):
+                    changes.append((page, key, "icon", wanted["icon"]))
+        return changes
+
+    def sync(self):
+        """Send every differing slot; returns the number of slots pushed"""
+        with self.sync_lock:
+            if not self.serial_handler.connected:
+                return 0
+            start = time.perf_counter()
+            sent = 0
+            for page, key, field, value in self.diff():
+                if field == "label":
+                    ok = self._send_label(page, key, value)
+                else:
+                    data = self.icon_cache.get(value)
+                    if data is None:
+                        log.warning(f"Icon for {page} {key} is no longer cached; upload it again")
+                        continue
+                    try:
+                        ok = self._send_icon(page, key, value, data).future.result()
+                    except CancelledError:
+                        ok = False
+                if not ok:
+                    break
+                sent += 1
+            if sent:
+                self.mirror.save_data()
+            log.debug(f"Deck sync: {sent} slot(s) pushed in {(time.perf_counter() - start) * 1000:.1f} ms")
+            return sent
+
+    def sync_async(self):
+        threading.Thread(target=self.sync, daemon=True).start()
+
+    def interrupted_uploads(self):
+        return [upload for upload in self.uploads.values() if upload.state == IconUpload.INTERRUPTED]
+
+    def resume_uploads(self):
+        """After a reconnect: a sync re-sends the interrupted icons, continuing where the deck stopped"""
+        if self.interrupted_uploads():
+            self.sync_async()
+
+    def push_label(self, page, key, label):
+        if self.mirror.slot(self.deck_id, page, key).get("label") == label:
+            return True
+        return self._send_label(page, key, label)
+
+    def upload_icon_file(self, page, key, image_path, progress=None):
+        """
+        Convert (through the icon cache) and upload an icon, recording it as the slot's desired icon.
+        Returns the IconUpload; its future resolves to True once the deck confirms it.
+        """
+        cache_key, data = self.icon_cache.convert(image_path)
+        if data is None:
+            log.error("Failed to convert image")
+            upload = IconUpload(key, b"", page)
+            upload.finish(False)
+            return upload
+
+        page_icons = self.mappings.setdefault("icons", {}).setdefault(page, {})
+        previous = page_icons.get(key)
+        page_icons[key] = cache_key
+        if self.on_mappings_changed:
+            self.on_mappings_changed()
+
+        if self.mirror.slot(self.deck_id, page, key).get("icon") == cache_key:
+            upload = IconUpload(key, data, page)
+            upload.advance(upload.total)
+            upload.finish(True)
+            return upload
+        upload = self._send_icon(page, key, cache_key, data, progress)
+
+        def restore():
+            # A cancelled icon is not wanted any more, whether it is still sending or already
+            # interrupted; keep the previous one as the desired state so no sync resends it
+            if previous is None:
+                page_icons.pop(key, None)
+            else:
+                page_icons[key] = previous
+            if self.on_mappings_changed:
+                self.on_mappings_changed()
+
+        def done(f):
+            if not f.cancelled() and f.result():
+                self.mirror.save_data()
+
+        if upload.on_cancel is None:
+            # A resumed upload keeps the mapping it replaced first
+            upload.on_cancel = restore
+        upload.future.add_done_callback(done)
+        return upload
+
+    def _send_label(self, page, key, label):
+        """Queue a label; the mirror records it once the deck acknowledges it (handle_label_ack)"""
+        if not self.serial_handler.connected:
+            return False
+        entry = (page, key, label)
+        # Pending before it is written, so an ack cannot arrive first
+        with self.label_lock:
+            self.pending_labels.append(entry)
+        future = self.serial_handler.send(f"{LABEL_COMMANDS[page]}:{key}:{label}")
+
+        def written(f):
+            if f.cancelled() or not f.result():
+                self._drop_pending(entry)
+
+        future.add_done_callback(written)
+        return True
+
+    def _label_pending(self, page, key, label):
+        with self.label_lock:
+            return (page, key, label) in self.pending_labels
+
+    def _drop_pending(self, entry):
+        with self.label_lock:
+            try:
+                self.pending_labels.remove(entry)
+            except ValueError:
+                pass
+
+    def handle_label_ack(self, line):
+        """
+        Record a label as on the deck when it answers LABEL_APP_OK / LABEL_PASS_OK.
+        The key follows a colon; older firmware omits it, and its acks are matched in send order.
+        Returns True if line was a label ack.
+        """
+        name, _, key = line.partition(":")
+        page = next((page for page, command in LABEL_COMMANDS.items() if name == f"{command}_OK"), None)
+        if page is None:
+            return False
+        key = key.strip()
+        with self.label_lock:
+            entry = next((e for e in self.pending_labels if e[0] == page and (not key or e[1] == key)), None)
+            if entry is None:
+                return True
+            self.pending_labels.remove(entry)
+        self.mirror.update(self.deck_id, page, entry[1], label=entry[2])
+        self.mirror.save_data()
+        return True
+
+    def _send_icon(self, page, key, cache_key, data, progress=None):
+        upload = self.uploads.get((page, key))
+        if upload is not None and not upload.finished and upload.data == data:
+            # Already queued or sending
+            return upload
+        if upload is None or upload.state != IconUpload.INTERRUPTED or upload.data != data:
+            upload = IconUpload(key, data, page, progress)
+            self.uploads[(page, key)] = upload
+        self.serial_handler.upload_icon(upload)
+        # The deck this upload goes to, even if another one is connected by the time it finishes
+        deck_id = self.deck_id
+
+        def record(f):
+            if not f.cancelled() and f.result():
+                self.mirror.update(deck_id, page, key, icon=cache_key)
+            elif upload.clobbered:
+                # The deck's previous icon is gone; the next sync sends the desired one again
+                self.mirror.update(deck_id, page, key, icon=None)
+                self.mirror.save_data()
+
+        # Registered first, so the mirror is updated before any caller's callback runs
+        upload.future.add_done_callback(record)
+        return upload
+
+    def handle_boot_line(self, line):
+        """
+        Track the deck's boot banner. Returns True once the deck reports DECK_READY,
+        at which point labels are known to be reset and missing icon files dropped.
+        """
+        if line == "SPIFFS Mounted":
+            self.boot_files = set()
+        elif line.startswith("FILE: ") and self.boot_files is not None:
+            self.boot_files.add(line[6:].strip().lstrip("/"))
+        elif line == "DECK_READY":
+            # Labels sent before the reboot will not be acknowledged
+            with self.label_lock:
+                self.pending_labels.clear()
+            self.mirror.forget_labels(self.deck_id)
+            if self.boot_files is not None:
+                self.mirror.keep_icons(self.deck_id, self.boot_files)
+            self.boot_files = None
+            self.mirror.save_data()
+            return True
+        return False
@@ -1,8 +1,14 @@
 import json
 import base64
+import hashlib
+import logging
 import os
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
+from persistence import atomic_write
+from metrics import VAULT_CRYPTO
+
+log = logging.getLogger(__name__)
 
 class EncryptionManager:
     def __init__(self, key_file="master.key"):
@@ -21,8 +27,7 @@ class EncryptionManager:
             "key": base64.b64encode(self.master_key).decode('utf-8'),
             "salt": base64.b64encode(self.salt).decode('utf-8')
         }
-        with open(path, 'w') as f:
-            json.dump(data, f)
+        atomic_write(path, json.dumps(data))
 
     def load_key_from_file(self, path):
         if not os.path.exists(path): return False
@@ -44,8 +49,9 @@ class EncryptionManager:
         else:
             data_str = str(data)
 
-        cipher = AES.new(self.master_key, AES.MODE_GCM)
-        ciphertext, tag = cipher.encrypt_and_digest(data_str.encode('utf-8'))
+        with VAULT_CRYPTO.time(operation="encrypt"):
+            cipher = AES.new(self.master_key, AES.MODE_GCM)
+            ciphertext, tag = cipher.encrypt_and_digest(data_str.encode('utf-8'))
 
         return {
             "nonce": base64.b64encode(cipher.nonce).decode('utf-8'),
@@ -63,8 +69,9 @@ class EncryptionManager:
             tag = base64.b64decode(encrypted_package['tag'])
             ciphertext = base64.b64decode(encrypted_package['ciphertext'])
             
-            cipher = AES.new(self.master_key, AES.MODE_GCM, nonce=nonce)
-            decrypted_data = cipher.decrypt_and_verify(ciphertext, tag)
+            with VAULT_CRYPTO.time(operation="decrypt"):
+                cipher = AES.new(self.master_key, AES.MODE_GCM, nonce=nonce)
+                decrypted_data = cipher.decrypt_and_verify(ciphertext, tag)
             
             try:
                 return json.loads(decrypted_data.decode('utf-8'))
@@ -72,7 +79,42 @@ class EncryptionManager:
                 return decrypted_data.decode('utf-8')
                 
         except (ValueError, KeyError) as e:
-            print(f"Decryption failed: {e}")
+            log.error(f"Decryption failed: {e}")
+            return None
+
+    def key_id(self):
+        """Short fingerprint of the master key, stored in vault headers to detect a key mismatch"""
+        if not self.master_key:
+            return None
+        return hashlib.sha256(self.master_key).digest()[:8]
+
+    def encrypt_record(self, name, value):
+        """
+        Encrypt one vault entry with its own nonce; the entry name is bound in as associated data.
+        Returns raw (nonce, tag, ciphertext) bytes.
+        """
+        if not self.master_key:
+            raise ValueError("Master key not loaded.")
+
+        with VAULT_CRYPTO.time(operation="encrypt"):
+            cipher = AES.new(self.master_key, AES.MODE_GCM, nonce=get_random_bytes(16))
+            cipher.update(name.encode('utf-8'))
+            ciphertext, tag = cipher.encrypt_and_digest(json.dumps(value).encode('utf-8'))
+        return cipher.nonce, tag, ciphertext
+
+    def decrypt_record(self, name, record):
+        if not self.master_key:
+            raise ValueError("Master key not loaded.")
+
+        nonce, tag, ciphertext = record
+        try:
+            with VAULT_CRYPTO.time(operation="decrypt"):
+                cipher = AES.new(self.master_key, AES.MODE_GCM, nonce=bytes(nonce))
+                cipher.update(name.encode('utf-8'))
+                plaintext = cipher.decrypt_and_verify(bytes(ciphertext), bytes(tag))
+            return json.loads(plaintext.decode('utf-8'))
+        except ValueError as e:
+            log.error(f"Decryption failed for entry {name}: {e}")
             return None
 
     def clear_key(self):
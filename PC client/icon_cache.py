@@ -0,0 +1,131 @@
+import logging
+import os
+import io
+import hashlib
+import threading
+import collections
+from image_processor import ImageProcessor, ICON_SIZE
+from persistence import atomic_write
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR_NAME = "icon_cache"
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+class IconCache:
+    """
+    Content-addressed store of converted RGB565 icons.
+    Entries are keyed by a hash of the source image bytes plus the conversion
+    parameters, kept as <key>.raw files and evicted least-recently-used once
+    the directory grows past max_bytes.
+    """
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if not os.path.exists(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except Exception as e:
+                log.error(f"Error creating icon cache directory: {e}")
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from file modification times"""
+        found = []
+        try:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".raw"):
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                    found.append((st.st_mtime, name[:-4], st.st_size))
+        except OSError:
+            return
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def make_key(source_bytes, size=ICON_SIZE, byte_order="big", dither=False):
+        h = hashlib.sha256(source_bytes)
+        h.update(f"|{size[0]}x{size[1]}|{byte_order}|{int(bool(dither))}".encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.raw")
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                self.total_bytes -= self.entries.pop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return bytearray(data)
+
+    def put(self, key, data):
+        with self.lock:
+            try:
+                atomic_write(self._path(key), data)
+            except OSError as e:
+                log.error(f"Icon cache write failed: {e}")
+                return
+            self.total_bytes += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def convert(self, image_path, size=ICON_SIZE, byte_order="big", dither=False):
+        """
+        Return (key, rgb565 data) for an image file, decoding it only on a cache miss.
+        Returns (None, None) if the file cannot be read or converted.
+        """
+        try:
+            with open(image_path, 'rb') as f:
+                source = f.read()
+        except OSError as e:
+            log.error(f"Error reading image: {e}")
+            return None, None
+
+        key = self.make_key(source, size, byte_order, dither)
+        data = self.get(key)
+        if data is None:
+            data = ImageProcessor.convert_to_rgb565(io.BytesIO(source), size, byte_order, dither)
+            if data is None:
+                return None, None
+            self.put(key, data)
+        return key, data
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
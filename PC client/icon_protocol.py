@@ -0,0 +1,85 @@
+"""
+Binary framed icon transfer shared by the PC client and the deck firmware.
+
+The host asks "CAPS?" and a deck that supports frames answers "CAPS:BIN1".
+An upload then starts with the text line "ICON_BIN:<type>:<key>:<size>"; once
+the deck answers "UPLOAD_START_OK:<offset>" the payload from offset on is
+streamed as frames:
+
+    0xA5 | seq (1 byte) | len (1 byte) | payload (len bytes) | CRC16-CCITT (2 bytes, big-endian)
+
+The CRC covers seq, len and payload. The deck answers every frame it accepts
+with "ACK:<seq>" and the first out-of-order or corrupt frame with
+"NAK:<expected seq>" (go-back-N). When all bytes are written it sends UPLOAD_DONE.
+
+The deck writes to <type>_<key>.part and only renames it to .raw when the
+upload completes. Appending ":R" to the ICON_BIN line asks it to keep an
+existing .part; the offset in UPLOAD_START_OK is then the size of that file
+(0 when there is nothing to resume), and sequence numbers restart at 0.
+An empty frame cancels the upload: the deck deletes the .part and answers
+UPLOAD_ABORT, which it also sends (keeping the .part) after 2 s of silence.
+From UPLOAD_START_OK until UPLOAD_DONE or UPLOAD_ABORT the deck reads
+nothing but frames, so text lines must wait for the upload to end.
+
+Port discovery identifies a deck by sending "WHO?"; the deck answers
+"DECK_ID:<12 hex digits of its MAC>", and also prints that line first thing
+on boot, so a deck that resets when the port opens identifies itself too.
+"""
+
+FRAME_MAGIC = 0xA5
+FRAME_PAYLOAD = 64
+# Frames in flight; 3 * (64 + 5) bytes fits the ESP32's 256 byte UART RX buffer
+WINDOW_SIZE = 3
+# Silence after which the deck leaves binary mode on its own (BIN_UPLOAD_TIMEOUT_MS in the firmware)
+BIN_UPLOAD_TIMEOUT = 2.0
+
+CAPS_QUERY = "CAPS?"
+CAPS_REPLY = "CAPS:"
+CAP_BINARY = "BIN1"
+RESUME_FLAG = "R"
+START_OK = "UPLOAD_START_OK"
+WHO_QUERY = "WHO?"
+DECK_ID_REPLY = "DECK_ID:"
+
+# Deck replies the transfer code waits for instead of passing them to the app
+REPLY_PREFIXES = ("ACK:", "NAK:", "CAPS:", "UPLOAD_")
+INTERNAL_PREFIXES = ("ACK:", "NAK:", "CAPS:")
+
+def crc16_ccitt(data, crc=0xFFFF):
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+def build_frame(seq, payload):
+    header = bytes((seq & 0xFF, len(payload)))
+    crc = crc16_ccitt(header + payload)
+    return bytes((FRAME_MAGIC,)) + header + payload + bytes((crc >> 8, crc & 0xFF))
+
+def abort_frame(seq):
+    return build_frame(seq, b"")
+
+def parse_start_reply(reply):
+    """Resume offset from an UPLOAD_START_OK reply (older decks send no offset), or None on failure"""
+    if not reply or not reply.startswith(START_OK):
+        return None
+    try:
+        return int(reply[len(START_OK):].lstrip(":") or 0)
+    except ValueError:
+        return 0
+
+def parse_frame(frame):
+    """Return (seq, payload) for a well-formed frame, or None"""
+    if len(frame) < 5 or frame[0] != FRAME_MAGIC:
+        return None
+    length = frame[2]
+    if len(frame) != length + 5:
+        return None
+    crc = (frame[3 + length] << 8) | frame[4 + length]
+    if crc != crc16_ccitt(frame[1:3 + length]):
+        return None
+    return frame[1], bytes(frame[3:3 + length])
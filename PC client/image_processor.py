@@ -1,34 +1,77 @@
-from PIL import Image
+import logging
+from PIL import Image, ImageChops
+
+log = logging.getLogger(__name__)
+
+ICON_SIZE = (32, 32)
+
+# 4x4 Bayer matrix, used to spread the bits lost when truncating to 5/6 bits
+BAYER_4X4 = (
+    (0, 8, 2, 10),
+    (12, 4, 14, 6),
+    (3, 11, 1, 9),
+    (15, 7, 13, 5)
+)
+
+# Per-band lookup tables for the two output bytes, so Image.point never calls back into Python
+RED_HIGH = [v & 0xF8 for v in range(256)]
+GREEN_HIGH = [v >> 5 for v in range(256)]
+GREEN_LOW = [(v << 3) & 0xE0 for v in range(256)]
+BLUE_LOW = [v >> 3 for v in range(256)]
 
 class ImageProcessor:
+    _dither_tiles = {}
+
     @staticmethod
-    def convert_to_rgb565(image_path):
+    def convert_to_rgb565(image_path, size=ICON_SIZE, byte_order="big", dither=False):
         """Convert an image to RGB565 format for the display"""
         try:
-            # Open and resize image to 32x32
             img = Image.open(image_path)
-            img = img.resize((32, 32), Image.Resampling.LANCZOS)
-            img = img.convert('RGB')
-            
-            # Convert to RGB565 format
-            raw_data = bytearray()
-            for y in range(32):
-                for x in range(32):
-                    r, g, b = img.getpixel((x, y))
-                    
-                    # Convert to RGB565
-                    r5 = (r >> 3) & 0x1F
-                    g6 = (g >> 2) & 0x3F
-                    b5 = (b >> 3) & 0x1F
-                    
-                    # Combine into 16-bit value
-                    rgb565 = (r5 << 11) | (g6 << 5) | b5
-                    
-                    # Store as big-endian (MSB first)
-                    raw_data.append((rgb565 >> 8) & 0xFF)
-                    raw_data.append(rgb565 & 0xFF)
-            
-            return raw_data
+            img = img.resize(size, Image.Resampling.LANCZOS)
+            return ImageProcessor.image_to_rgb565(img, byte_order, dither)
         except Exception as e:
-            print(f"Error converting image: {e}")
+            log.error(f"Error converting image: {e}")
             return None
+
+    @staticmethod
+    def image_to_rgb565(img, byte_order="big", dither=False):
+        """
+        Pack an already sized image into RGB565 using whole-band Pillow operations.
+        byte_order: "big" (MSB first, what the deck expects) or "little"
+        dither: apply a 4x4 ordered dither before truncating each channel
+        """
+        r, g, b = img.convert('RGB').split()
+
+        if dither:
+            r = ImageChops.add(r, ImageProcessor._dither_tile(img.size, 8))
+            g = ImageChops.add(g, ImageProcessor._dither_tile(img.size, 4))
+            b = ImageChops.add(b, ImageProcessor._dither_tile(img.size, 8))
+
+        # RRRRRGGG GGGBBBBB: the bit ranges never overlap, so adding the bands is an OR
+        high = ImageChops.add(r.point(RED_HIGH), g.point(GREEN_HIGH))
+        low = ImageChops.add(g.point(GREEN_LOW), b.point(BLUE_LOW))
+
+        # An "LA" image stores its two bands interleaved, which is exactly the 16-bit pixel layout
+        if byte_order == "big":
+            packed = Image.merge('LA', (high, low))
+        elif byte_order == "little":
+            packed = Image.merge('LA', (low, high))
+        else:
+            raise ValueError(f"Unknown byte order: {byte_order}")
+
+        return bytearray(packed.tobytes())
+
+    @staticmethod
+    def _dither_tile(size, step):
+        """Ordered dither offsets (0..step-1) tiled to size, cached per size and step"""
+        key = (size, step)
+        tile = ImageProcessor._dither_tiles.get(key)
+        if tile is None:
+            pattern = Image.new('L', (4, 4))
+            pattern.putdata([BAYER_4X4[y][x] * step // 16 for y in range(4) for x in range(4)])
+            tile = Image.new('L', size)
+            for y in range(0, size[1], 4):
+                for x in range(0, size[0], 4):
+                    tile.paste(pattern, (x, y))
+            ImageProcessor._dither_tiles[key] = tile
+        return tile
@@ -0,0 +1,178 @@
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from serial_handler import LatencyTracker
+
+log = logging.getLogger(__name__)
+
+# key_delay: pause between characters; settle: pause after switching fields
+TimingProfile = namedtuple("TimingProfile", "key_delay settle")
+
+TIMING_PROFILES = {
+    "fast": TimingProfile(0.0, 0.02),
+    "normal": TimingProfile(0.005, 0.1),
+    # For remote desktops and slow login forms that drop keys
+    "compat": TimingProfile(0.03, 0.3)
+}
+DEFAULT_PROFILE = "normal"
+
+class KeyBackend:
+    """
+    Keystroke injection. Subclasses implement type_text (the whole string in
+    one call) and press (a named key: "tab", "enter", "win").
+    """
+    name = "base"
+
+    def __init__(self, profile=DEFAULT_PROFILE):
+        self.set_profile(profile)
+        self.fill_times = LatencyTracker()
+
+    def set_profile(self, profile):
+        self.profile = TIMING_PROFILES.get(profile, profile) if isinstance(profile, str) else profile
+        if not isinstance(self.profile, TimingProfile):
+            self.profile = TIMING_PROFILES[DEFAULT_PROFILE]
+
+    def type_text(self, text):
+        raise NotImplementedError
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def fill(self, username, password, submit=True, checkpoint=None, sleep=time.sleep):
+        """
+        Type a credential into the focused form: username, Tab, password, Enter.
+        The password is typed rather than pasted where the backend can, so it
+        stays off the clipboard. checkpoint is called between fields so the
+        caller can abort.
+        Returns the fill time in seconds.
+        """
+        started = time.perf_counter()
+        if username:
+            self.type_text(username)
+            self.press("tab")
+            sleep(self.profile.settle)
+        if checkpoint:
+            checkpoint()
+        if password:
+            self.type_text(password)
+            if submit:
+                self.press("enter")
+        elapsed = time.perf_counter() - started
+        self.fill_times.record(elapsed)
+        return elapsed
+
+    def stats(self):
+        return {"backend": self.name, "profile": self.profile._asdict(), "fill": self.fill_times.summary()}
+
+class PyAutoGuiBackend(KeyBackend):
+    """
+    Default backend; works on Windows, macOS and X11. pyautogui presses US
+    layout keys for plain ASCII only and skips anything else without a word,
+    so other text is pasted through the clipboard instead, which is then put back.
+    """
+    name = "pyautogui"
+    PASTE_KEYS = ("command", "v") if sys.platform == "darwin" else ("ctrl", "v")
+
+    def __init__(self, profile=DEFAULT_PROFILE):
+        super().__init__(profile)
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def can_type(self, text):
+        return all(char.isascii() and char in self.pyautogui.KEYBOARD_KEYS for char in text)
+
+    def type_text(self, text):
+        if not self.can_type(text):
+            self.paste_text(text)
+            return
+        # pyautogui.PAUSE (0.1 s by default) is added after every call; the profile sets the pace instead
+        self.pyautogui.write(text, interval=self.profile.key_delay, _pause=False)
+
+    def paste_text(self, text):
+        import pyperclip
+        try:
+            previous = pyperclip.paste()
+        except pyperclip.PyperclipException:
+            previous = ""
+        pyperclip.copy(text)
+        try:
+            self.pyautogui.hotkey(*self.PASTE_KEYS, _pause=False)
+            # The target reads the clipboard asynchronously; give it time before restoring
+            time.sleep(max(self.profile.settle, 0.1))
+        finally:
+            pyperclip.copy(previous)
+
+    def press(self, key):
+        self.pyautogui.press(key, _pause=False)
+
+class XdotoolBackend(KeyBackend):
+    """X11 via xdotool; text goes over stdin so it never shows up in the process list"""
+    name = "xdotool"
+    KEYS = {"tab": "Tab", "enter": "Return", "win": "super"}
+
+    def type_text(self, text):
+        delay_ms = str(int(self.profile.key_delay * 1000))
+        subprocess.run(["xdotool", "type", "--delay", delay_ms, "--file", "-"], input=text.encode('utf-8'), check=True)
+
+    def press(self, key):
+        subprocess.run(["xdotool", "key", self.KEYS.get(key, key)], check=True)
+
+class UinputBackend(KeyBackend):
+    """Kernel uinput via ydotool, for Wayland sessions where X11 injection is blocked"""
+    name = "uinput"
+    # Linux input-event keycodes
+    KEYS = {"tab": 15, "enter": 28, "win": 125}
+
+    def type_text(self, text):
+        delay_ms = str(int(self.profile.key_delay * 1000))
+        subprocess.run(["ydotool", "type", "--key-delay", delay_ms, "--file", "-"], input=text.encode('utf-8'), check=True)
+
+    def press(self, key):
+        code = self.KEYS[key]
+        subprocess.run(["ydotool", "key", f"{code}:1", f"{code}:0"], check=True)
+
+class RecordingBackend(KeyBackend):
+    """Records what would have been typed, with timestamps; for tests and benchmarks"""
+    name = "recording"
+
+    def __init__(self, profile=DEFAULT_PROFILE):
+        super().__init__(profile)
+        self.events = []
+
+    def type_text(self, text):
+        self.events.append((time.perf_counter(), "type", text))
+
+    def press(self, key):
+        self.events.append((time.perf_counter(), "press", key))
+
+    def typed(self):
+        return [(kind, value) for _, kind, value in self.events]
+
+BACKENDS = {
+    "pyautogui": PyAutoGuiBackend,
+    "xdotool": XdotoolBackend,
+    "uinput": UinputBackend,
+    "recording": RecordingBackend
+}
+
+def select_backend(name="auto", profile=DEFAULT_PROFILE):
+    """
+    Build the named backend. "auto" picks uinput on Wayland and xdotool on X11
+    when the tool is installed, and pyautogui otherwise.
+    """
+    if name == "auto":
+        name = "pyautogui"
+        if sys.platform.startswith("linux"):
+            if os.environ.get("WAYLAND_DISPLAY") and shutil.which("ydotool"):
+                name = "uinput"
+            elif os.environ.get("DISPLAY") and shutil.which("xdotool"):
+                name = "xdotool"
+    try:
+        return BACKENDS[name](profile)
+    except Exception as e:
+        log.warning(f"Keystroke backend {name} unavailable ({e}); recording only")
+        return RecordingBackend(profile)
@@ -0,0 +1,36 @@
+import logging
+import os
+import re
+import sys
+from uid_allowlist import uid_hint
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+LEVEL_ENV = "ORCA_LOG_LEVEL"
+# Deck lines that carry a badge UID
+UID_LINE = re.compile(r"(RFID_READ:\s*)([0-9A-Fa-f][0-9A-Fa-f: ]*)")
+
+def redact_line(line):
+    """Mask badge UIDs in a deck line down to their last digits, as the allowlist shows them"""
+    return UID_LINE.sub(lambda m: m.group(1) + uid_hint(m.group(2)), line)
+
+class RedactFilter(logging.Filter):
+    """Last line of defence: masks badge UIDs in anything that reaches the log"""
+    def filter(self, record):
+        message = record.getMessage()
+        redacted = redact_line(message)
+        if redacted != message:
+            record.msg, record.args = redacted, None
+        return True
+
+def configure_logging(level=None):
+    """Leveled logging to stderr; the level comes from ORCA_LOG_LEVEL (INFO by default)"""
+    level = (level or os.environ.get(LEVEL_ENV) or "INFO").upper()
+    if hasattr(sys.stderr, "reconfigure"):
+        # Masked UIDs use a bullet, which not every Windows console code page has
+        sys.stderr.reconfigure(errors="replace")
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RedactFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level if level in logging._nameToLevel else "INFO")
@@ -0,0 +1,197 @@
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds; +Inf is implied
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TEXTFILE_INTERVAL = 15.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(tuple(labels.get(name, "") for name in self.labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (last is +Inf), sum, count]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def time(self, **labels):
+        """Context manager that observes the time spent in its block"""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        series = self.series.get(tuple(labels.get(name, "") for name in self.labels))
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((key, ([*series[0]], series[1], series[2])) for key, series in self.series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket
+                labels = _label_text(self.labels + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _add(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+SERIAL_BYTES = REGISTRY.counter("orca_serial_bytes_total", "Bytes read from and written to deck serial ports", ("port", "direction"))
+MESSAGES = REGISTRY.counter("orca_deck_messages_total", "Deck lines handled by the app, by command", ("command",))
+RFID_AUTH = REGISTRY.histogram("orca_rfid_auth_seconds", "RFID_READ received to the AUTH_OK/AUTH_FAIL reply written", ("result",))
+ICON_UPLOAD = REGISTRY.histogram("orca_icon_upload_seconds", "Icon upload duration", ("outcome",),
+                                 buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+VAULT_CRYPTO = REGISTRY.histogram("orca_vault_crypto_seconds", "Vault entry encryption and decryption", ("operation",))
+SAVE_SECONDS = REGISTRY.histogram("orca_save_seconds", "Background save of one piece of state", ("name",))
+SAVE_FAILURES = REGISTRY.counter("orca_save_failures_total", "Background saves that raised", ("name",))
+TK_STALLS = REGISTRY.counter("orca_tk_stalls_total", "Tk callbacks that blocked the main loop past the watchdog threshold")
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would drown the app's own log
+        pass
+
+class MetricsExporter:
+    """
+    Publishes a registry for Prometheus: over HTTP on localhost:port (/metrics),
+    and/or as a text file rewritten every TEXTFILE_INTERVAL for node_exporter's
+    textfile collector. Either may be left off.
+    """
+    def __init__(self, registry=REGISTRY, port=None, textfile=None, interval=TEXTFILE_INTERVAL):
+        self.registry = registry
+        self.port = port
+        self.textfile = textfile
+        self.interval = interval
+        self.server = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        if self.port:
+            handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"registry": self.registry})
+            # Loopback only: the metrics say when cards are tapped and decks are used
+            self.server = ThreadingHTTPServer(("127.0.0.1", int(self.port)), handler)
+            self.port = self.server.server_address[1]
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        if self.textfile:
+            threading.Thread(target=self._textfile_loop, daemon=True).start()
+        return self
+
+    def _textfile_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.write_textfile()
+
+    def write_textfile(self):
+        # persistence reports its save times here, so it is imported late
+        from persistence import atomic_write
+        directory = os.path.dirname(self.textfile)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomic_write(self.textfile, self.registry.render())
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.textfile:
+            self.write_textfile()
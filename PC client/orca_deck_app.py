@@ -1,25 +1,45 @@
 import customtkinter as ctk
+import argparse
 import threading
 import time
-import json
+import collections
+import logging
 import os
 import sys
-import pyautogui
-import pyperclip
 from PIL import Image
 import pystray
 from pystray import MenuItem as item
-from serial_handler import SerialHandler
+from serial_handler import PRIORITY_URGENT
 from encryption_manager import EncryptionManager
 from security_manager import SecurityManager
 from password_manager import PasswordManager
 from app_launcher import AppLauncher
 from settings_panel import SettingsPanel
+from icon_cache import IconCache, CACHE_DIR_NAME
+from device_state import DeviceMirror
+from deck_manager import DeckManager
+from port_discovery import AUTO_PORT
+from command_dispatcher import CommandDispatcher, parse_command
+from vault import PasswordVault
+from storage import Storage, VaultTable, DEFAULT_DECK
+from persistence import WriteBehind
+from action_executor import ActionExecutor
+from app_index import AppIndex
+from keystroke import select_backend, DEFAULT_PROFILE
+from uid_allowlist import open_allowlist, uid_hint
+from log_config import configure_logging
+from metrics import MetricsExporter, MESSAGES, RFID_AUTH
+from profiling import Profiling, FEATURES
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")
 
 APP_NAME = "ORCA DECK"
+# Metrics are off unless a port or text file is given here or in the config
+METRICS_PORT_ENV = "ORCA_METRICS_PORT"
+METRICS_FILE_ENV = "ORCA_METRICS_FILE"
+
+log = logging.getLogger(__name__)
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -45,14 +65,13 @@ if not os.path.exists(ASSETS_DIR):
     try:
         os.makedirs(ASSETS_DIR)
     except Exception as e:
-        print(f"Error creating assets directory: {e}")
+        log.error(f"Error creating assets directory: {e}")
 
 PASSWORDS_FILE = os.path.join(ASSETS_DIR, "passwords.json")
-CONFIG_FILE = os.path.join(ASSETS_DIR, "config.json")
-APPS_FILE = os.path.join(ASSETS_DIR, "apps.json")
 KEY_FILE = os.path.join(ASSETS_DIR, "master.key")
 UIDS_FILE = os.path.join(ASSETS_DIR, "authorized_uids.json")
-MAPPINGS_FILE = os.path.join(ASSETS_DIR, "mappings.json")
+TRAFFIC_DIR = os.path.join(ASSETS_DIR, "traffic")
+PROFILE_DIR = os.path.join(ASSETS_DIR, "profiles")
 
 DEFAULT_MAPPINGS = {
     "passwords": {
@@ -70,7 +89,7 @@ DEFAULT_MAPPINGS = {
 }
 
 class OrcaDeckApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, profile=None, stall_ms=None):
         super().__init__()
 
         self.title(APP_NAME)
@@ -79,44 +98,57 @@ class OrcaDeckApp(ctk.CTk):
         
         self.protocol('WM_DELETE_WINDOW', self.quit_app)
 
+        # Opt-in profiling hooks; started first so memory tracing covers startup
+        self.profiling = Profiling.from_env(PROFILE_DIR, profile, stall_ms).start(self)
+
         self.is_locked = True
         self.in_rfid_setup = False
         self.encryption_manager = EncryptionManager()
-        self.security_manager = SecurityManager(ASSETS_DIR)
+
+        # All state lives in one SQLite database; the old JSON files are imported on first run
+        self.storage = Storage(ASSETS_DIR)
+        self.storage.import_json_assets(ASSETS_DIR, DEFAULT_MAPPINGS)
+        # Saves are queued here and written off the Tk thread
+        self.persistence = WriteBehind()
+        # App launches and password typing run here, one ordered lane per deck
+        self.actions = ActionExecutor()
+        self.security_manager = SecurityManager(ASSETS_DIR, self.storage)
         
         # Load encryption key
         if os.path.exists(KEY_FILE):
             self.encryption_manager.load_key_from_file(KEY_FILE)
         
-        # Load and decrypt passwords
-        self.passwords = {}
-        encrypted_passwords = self.load_json(PASSWORDS_FILE)
-        if encrypted_passwords:
-            try:
-                # If it's a dictionary with ciphertext, try to decrypt
-                if "ciphertext" in encrypted_passwords:
-                    decrypted = self.encryption_manager.decrypt_data(encrypted_passwords)
-                    if decrypted:
-                        self.passwords = decrypted
-                else:
-                    # Fallback for legacy plain text (if any)
-                    self.passwords = encrypted_passwords
-            except Exception as e:
-                print(f"Error loading passwords: {e}")
-
-        self.apps_config = self.load_json(APPS_FILE)
-        self.config = self.load_json(CONFIG_FILE, {"com_port": "COM3", "auto_lock_minutes": 15})
-        self.authorized_uids = self.load_json(UIDS_FILE, [])
-        self.mappings = self.load_json(MAPPINGS_FILE, DEFAULT_MAPPINGS)
-        
-        if "passwords" not in self.mappings: self.mappings["passwords"] = DEFAULT_MAPPINGS["passwords"]
-        if "apps" not in self.mappings: self.mappings["apps"] = DEFAULT_MAPPINGS["apps"]
-        
-        self.serial_handler = SerialHandler(
-            port=self.config.get("com_port", "COM3"),
-            on_message=self.handle_serial_message
-        )
-        self.serial_handler.start()
+        # Load the vault's encrypted records; entries are decrypted on first use
+        self.passwords = PasswordVault(self.encryption_manager, VaultTable(self.storage), legacy_path=PASSWORDS_FILE)
+
+        self.apps_config = self.storage.load_apps()
+        self.config = self.storage.load_config({"com_port": AUTO_PORT, "auto_lock_minutes": 15})
+        self.authorized_uids = open_allowlist(self.storage, UIDS_FILE)
+        self.mappings = self.storage.load_mappings()
+        self.icon_cache = IconCache(os.path.join(ASSETS_DIR, CACHE_DIR_NAME))
+        
+        # apps.json values resolved to launch commands ahead of time; rebuilt when the index refreshes
+        self.app_commands = {}
+        self.app_index = AppIndex()
+        self.app_index.start(on_refresh=self.resolve_apps)
+        self.keystrokes = select_backend(self.config.get("keystroke_backend", "auto"), self.config.get("typing_profile", DEFAULT_PROFILE))
+        
+        if not self.mappings["passwords"]: self.mappings["passwords"] = dict(DEFAULT_MAPPINGS["passwords"])
+        if not self.mappings["apps"]: self.mappings["apps"] = dict(DEFAULT_MAPPINGS["apps"])
+        self.storage.set_deck(DEFAULT_DECK, self.config.get("com_port", AUTO_PORT))
+        
+        self.serial_inbox = collections.deque()
+        self.serial_inbox_lock = threading.Lock()
+        self.serial_drain_scheduled = False
+        self.shown_connected = None
+        self.register_commands()
+
+        # One serial link and sync per deck; their lines arrive tagged with the deck's id
+        self.device_mirror = DeviceMirror(ASSETS_DIR, self.persistence)
+        self.decks = DeckManager(self.device_mirror, self.icon_cache, self.handle_serial_message, on_mappings_changed=self.save_icons)
+        self.decks.configure(self.deck_entries())
+        self.decks.record_to(TRAFFIC_DIR if self.config.get("record_traffic") else None)
+        self.metrics = self.start_metrics()
 
         self.grid_columnconfigure(1, weight=1)
         self.grid_rowconfigure(0, weight=1)
@@ -128,17 +160,11 @@ class OrcaDeckApp(ctk.CTk):
         self.create_sidebar()
         self.create_main_area()
         
-        # Debug: Check security setup status
-        setup_status = self.security_manager.is_setup()
-        print(f"DEBUG: Security setup status: {setup_status}")
-        print(f"DEBUG: Security data file: {self.security_manager.file_path}")
-        print(f"DEBUG: Security data content: {self.security_manager.data}")
-        
-        if not setup_status:
-            print("DEBUG: Showing security setup screen")
+        if not self.security_manager.is_setup():
+            log.debug("Security is not set up yet; showing the setup screen")
             self.show_security_setup()
         else:
-            print("DEBUG: Showing lock screen")
+            log.debug("Showing lock screen")
             self.show_lock_screen()
         
         self.setup_tray()
@@ -146,20 +172,6 @@ class OrcaDeckApp(ctk.CTk):
         self.last_activity = time.time()
         self.check_auto_lock()
 
-    def load_json(self, path, default=None):
-        if default is None: default = {}
-        if os.path.exists(path):
-            try:
-                with open(path, 'r') as f:
-                    return json.load(f)
-            except:
-                pass
-        return default
-
-    def save_json(self, path, data):
-        with open(path, 'w') as f:
-            json.dump(data, f, indent=2)
-
     def create_sidebar(self):
         self.sidebar_frame = ctk.CTkFrame(self, width=220, corner_radius=0, fg_color="#1a1a1a")
         self.sidebar_frame.grid(row=0, column=0, sticky="nsew")
@@ -213,6 +225,11 @@ class OrcaDeckApp(ctk.CTk):
     def create_main_area(self):
         self.main_frame = ctk.CTkFrame(self, corner_radius=0, fg_color="#222222")
         self.main_frame.grid(row=0, column=1, sticky="nsew")
+        # Panels are built once and stacked in one grid cell; switching tabs raises one
+        self.view_stack = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        self.view_stack.grid_rowconfigure(0, weight=1)
+        self.view_stack.grid_columnconfigure(0, weight=1)
+        self.views = {}
 
     def show_security_setup(self):
         self.clear_main_frame()
@@ -251,15 +268,13 @@ class OrcaDeckApp(ctk.CTk):
         self.encryption_manager.generate_key()
         self.encryption_manager.save_key_to_file(KEY_FILE)
         
-        if os.path.exists(PASSWORDS_FILE):
-             try:
-                 with open(PASSWORDS_FILE, 'r') as f:
-                     old_data = json.load(f)
-                 if "encrypted_data" not in old_data:
-                     self.passwords = old_data
-                     self.save_passwords(self.passwords)
-             except:
-                 pass
+        # Encrypt any legacy plaintext entries under the new key
+        try:
+            self.passwords.load()
+            if self.passwords.migrating:
+                self.save_passwords(self.passwords)
+        except Exception as e:
+            log.error(f"Error migrating passwords: {e}")
         
         self.show_rfid_setup()
 
@@ -286,6 +301,8 @@ class OrcaDeckApp(ctk.CTk):
     def show_lock_screen(self):
         self.clear_main_frame()
         self.is_locked = True
+        self.actions.cancel_all()
+        self.passwords.lock()
         self.encryption_manager.clear_key()
         
         lock_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
@@ -326,18 +343,10 @@ class OrcaDeckApp(ctk.CTk):
 
     def perform_unlock(self):
         if self.encryption_manager.load_key_from_file(KEY_FILE):
-            if os.path.exists(PASSWORDS_FILE):
-                with open(PASSWORDS_FILE, 'r') as f:
-                    data = json.load(f)
-                    if "encrypted_data" in data:
-                        decrypted = self.encryption_manager.decrypt_data(data)
-                        if decrypted:
-                            self.passwords = decrypted
-            
             self.is_locked = False
             self.show_dashboard()
         else:
-            print("Error: Master key file missing or corrupted.")
+            log.error("Master key file missing or corrupted")
 
     def show_dashboard(self):
         if self.is_locked: return
@@ -354,12 +363,34 @@ class OrcaDeckApp(ctk.CTk):
         
         ctk.CTkLabel(status_card, text="System Status", font=ctk.CTkFont(size=16, weight="bold")).pack(pady=15, padx=20, anchor="w")
         
-        conn_color = "#2ecc71" if self.serial_handler.connected else "#e74c3c"
-        conn_text = "Connected" if self.serial_handler.connected else "Disconnected"
-        ctk.CTkLabel(status_card, text=f"• {conn_text}", text_color=conn_color, font=self.font_norm).pack(pady=5, padx=20, anchor="w")
-        ctk.CTkLabel(status_card, text=f"• Port: {self.config.get('com_port')}", font=self.font_norm).pack(pady=5, padx=20, anchor="w")
+        for deck in self.decks.stats():
+            conn_color = "#2ecc71" if deck["connected"] else "#e74c3c"
+            conn_text = "Connected" if deck["connected"] else "Disconnected"
+            name = deck["port"] if deck["deck_id"] in (DEFAULT_DECK, deck["port"]) else f"{deck['deck_id']} ({deck['port']})"
+            detail = ""
+            if not deck["connected"] and deck["reconnect_attempts"]:
+                detail = f", retry {deck['reconnect_attempts']}"
+            if deck["connected"] and deck["latency"]["count"]:
+                detail += f", p99 {deck['latency']['p99_ms']:.2f} ms"
+            if deck["queue"]["depth"]:
+                detail += f", {deck['queue']['depth']} pending"
+            if deck["recording"]:
+                detail += f", recording ({deck['recording']['records']} records)"
+            ctk.CTkLabel(status_card, text=f"• {name}: {conn_text}{detail}", text_color=conn_color, font=self.font_norm).pack(pady=5, padx=20, anchor="w")
         ctk.CTkLabel(status_card, text=f"• Vault: Unlocked", text_color="#2ecc71", font=self.font_norm).pack(pady=5, padx=20, anchor="w")
 
+        actions = self.actions.stats()
+        if actions["queue_wait"]["count"]:
+            ctk.CTkLabel(status_card, text=f"• Actions: {actions['queue_wait']['count']} run, p99 wait {actions['queue_wait']['p99_ms']:.1f} ms", font=self.font_norm).pack(pady=5, padx=20, anchor="w")
+
+        fill = self.keystrokes.stats()["fill"]
+        if fill["count"]:
+            ctk.CTkLabel(status_card, text=f"• Credential fill ({self.keystrokes.name}): p50 {fill['p50_ms']:.0f} ms", font=self.font_norm).pack(pady=5, padx=20, anchor="w")
+
+        cache = self.icon_cache.stats()
+        ctk.CTkLabel(status_card, text=f"• Icon cache: {cache['hits']} hits / {cache['misses']} misses ({cache['entries']} icons)", font=self.font_norm).pack(pady=5, padx=20, anchor="w")
+        ctk.CTkButton(status_card, text="Sync Decks" if len(self.decks) > 1 else "Sync Deck", width=100, command=self.decks.sync_all_async).pack(pady=(5, 15), padx=20, anchor="w")
+
         uid_card = ctk.CTkFrame(cards_frame, fg_color="#2b2b2b", corner_radius=10)
         uid_card.pack(side="left", fill="both", expand=True, padx=(10, 0))
         
@@ -376,162 +407,307 @@ class OrcaDeckApp(ctk.CTk):
 
     def add_uid(self):
         uid = self.uid_entry.get().strip().upper()
-        if uid and uid not in self.authorized_uids:
-            self.authorized_uids.append(uid)
-            self.save_json(UIDS_FILE, self.authorized_uids)
+        if uid and self.authorized_uids.add(uid):
+            self.persistence.mark("uids", self.write_uids)
             self.show_dashboard()
-            print(f"Added UID: {uid}")
+            log.info(f"Added UID: {uid_hint(uid)}")
+
+    def show_view(self, name, build):
+        """Raise the cached panel for name, building it on first use"""
+        view = self.views.get(name)
+        if view is None:
+            view = self.views[name] = build()
+            view.grid(row=0, column=0, sticky="nsew")
+        if not self.view_stack.winfo_manager():
+            # Coming from a transient screen such as the dashboard
+            self.clear_main_frame()
+            self.view_stack.pack(fill="both", expand=True, padx=20, pady=20)
+        view.tkraise()
+        return view
 
     def show_passwords(self):
         if self.is_locked: return
-        self.clear_main_frame()
         self.set_active_nav("Passwords")
         
-        pm = PasswordManager(self.main_frame, self.passwords, self.mappings["passwords"], self.save_passwords, self.serial_handler)
-        pm.pack(fill="both", expand=True, padx=20, pady=20)
+        # The panels edit the first deck; the others pick the changes up through their own sync
+        deck = self.decks.primary
+        pm = self.show_view("passwords", lambda: PasswordManager(self.view_stack, self.passwords, self.mappings["passwords"], self.save_passwords, deck.serial_handler, deck.sync))
+        pm.serial_handler = deck.serial_handler
+        pm.deck_sync = deck.sync
+        # Labels may have changed while the cached panel was hidden
+        pm.refresh()
 
     def show_apps(self):
         if self.is_locked: return
-        self.clear_main_frame()
         self.set_active_nav("App Launcher")
         
-        al = AppLauncher(self.main_frame, self.apps_config, self.mappings["apps"], self.save_apps_config, self.serial_handler)
-        al.pack(fill="both", expand=True, padx=20, pady=20)
+        deck = self.decks.primary
+        al = self.show_view("apps", lambda: AppLauncher(self.view_stack, self.apps_config, self.mappings["apps"], self.save_apps_config, deck.serial_handler, deck.sync))
+        al.serial_handler = deck.serial_handler
+        al.deck_sync = deck.sync
+        al.refresh()
 
     def show_settings(self):
-        self.clear_main_frame()
         self.set_active_nav("Settings")
         
-        sp = SettingsPanel(
-            self.main_frame, 
+        # The locked variant hides access control, so it is cached separately
+        serial_handler = self.decks.primary.serial_handler
+        sp = self.show_view("settings_locked" if self.is_locked else "settings", lambda: SettingsPanel(
+            self.view_stack, 
             self.config, 
             self.authorized_uids, 
             self.save_config, 
             self.save_uids,
-            self.serial_handler,
+            serial_handler,
             self.is_locked
-        )
-        sp.pack(fill="both", expand=True, padx=20, pady=20)
+        ))
+        sp.config = self.config
+        sp.authorized_uids = self.authorized_uids
+        sp.serial_handler = serial_handler
+        # Both variants are cached, and a save in one must not be undone by stale fields in the other
+        sp.load_config()
+        # The allowlist can change from the dashboard or an RFID setup scan
+        sp.refresh_uid_list()
 
     def save_uids(self, new_uids):
         self.authorized_uids = new_uids
-        self.save_json(UIDS_FILE, self.authorized_uids)
-        print(f"Saved {len(new_uids)} UIDs")
+        self.persistence.mark("uids", self.write_uids)
+        log.info(f"Saved {len(new_uids)} UIDs")
 
     def save_passwords(self, new_passwords, new_mappings=None):
-        self.passwords = new_passwords
-        encrypted = self.encryption_manager.encrypt_data(self.passwords)
-        self.save_json(PASSWORDS_FILE, encrypted)
+        if new_passwords is not self.passwords:
+            self.passwords.clear()
+            self.passwords.update(new_passwords)
+        # Only entries edited since the last save are re-encrypted
+        self.persistence.mark("vault", self.passwords.save)
         
         if new_mappings:
             self.mappings["passwords"] = new_mappings
-            self.save_json(MAPPINGS_FILE, self.mappings)
+            self.persistence.mark("pass_labels", lambda: self.storage.save_labels("pass", dict(self.mappings["passwords"])))
+            self.sync_other_decks()
 
     def save_apps_config(self, new_config, new_mappings=None):
         self.apps_config = new_config
-        self.save_json(APPS_FILE, self.apps_config)
+        self.resolve_apps()
+        self.persistence.mark("apps", lambda: self.storage.save_apps(dict(self.apps_config)))
         
         if new_mappings:
             self.mappings["apps"] = new_mappings
-            self.save_json(MAPPINGS_FILE, self.mappings)
+            self.persistence.mark("app_labels", lambda: self.storage.save_labels("app", dict(self.mappings["apps"])))
+            self.sync_other_decks()
+
+    def resolve_apps(self):
+        self.app_commands = {key: self.app_index.resolve(value) for key, value in list(self.apps_config.items())}
+
+    def save_icons(self):
+        self.persistence.mark("icons", self.write_icons)
+        self.sync_other_decks()
+
+    def sync_other_decks(self):
+        """The panels push edits to the first deck themselves; every other deck catches up by diff"""
+        if len(self.decks) > 1:
+            self.decks.sync_all_async(exclude=self.decks.primary)
+
+    def deck_entries(self):
+        """
+        (deck_id, port, mappings, apps) for every configured deck, the first one
+        from com_port. Extra decks with no slots of their own in storage show
+        the first deck's mappings and apps.
+        """
+        entries = [(DEFAULT_DECK, self.config.get("com_port", AUTO_PORT), self.mappings, self.apps_config)]
+        for deck in self.config.get("decks", []):
+            deck_id, port = deck.get("id") or deck.get("port"), deck.get("port")
+            if not port or deck_id == DEFAULT_DECK:
+                continue
+            mappings = self.storage.load_mappings(deck_id)
+            if not mappings["passwords"] and not mappings["apps"]:
+                mappings = self.mappings
+            apps = self.storage.load_apps(deck_id) or self.apps_config
+            entries.append((deck_id, port, mappings, apps))
+        return entries
 
     def save_config(self, new_config):
         self.config = new_config
-        self.save_json(CONFIG_FILE, self.config)
-        self.serial_handler.stop()
-        self.serial_handler = SerialHandler(port=self.config["com_port"], on_message=self.handle_serial_message)
-        self.serial_handler.start()
+        self.keystrokes.set_profile(self.config.get("typing_profile", DEFAULT_PROFILE))
+        self.persistence.mark("config", self.write_config)
+        # Only decks that were added or moved to another port reconnect
+        self.decks.configure(self.deck_entries())
+        self.decks.record_to(TRAFFIC_DIR if self.config.get("record_traffic") else None)
+
+    # Writers run on the persistence thread and read the latest state when they fire
+
+    def write_uids(self):
+        self.storage.save_allowlist(self.authorized_uids.snapshot())
+
+    def write_icons(self):
+        for page, icons in list(self.mappings.get("icons", {}).items()):
+            self.storage.save_icons(page, dict(icons))
+
+    def write_config(self):
+        config = dict(self.config)
+        self.storage.save_config(config)
+        self.storage.set_deck(DEFAULT_DECK, config["com_port"])
+        for deck in config.get("decks", []):
+            if deck.get("port"):
+                self.storage.set_deck(deck.get("id") or deck["port"], deck["port"])
 
     def clear_main_frame(self):
+        """Destroy the current transient screen; the cached panels are only hidden"""
         for widget in self.main_frame.winfo_children():
-            widget.destroy()
-
-    def handle_serial_message(self, message):
-        self.after(0, self._process_serial_message, message)
+            if widget is self.view_stack:
+                widget.pack_forget()
+            else:
+                widget.destroy()
+
+    def register_commands(self):
+        self.dispatcher = CommandDispatcher()
+        self.dispatcher.register("RFID_UNLOCK_OK", self._on_rfid_unlock_ok)
+        self.dispatcher.register("RFID_READ", self._on_rfid_read)
+        self.dispatcher.register("APP_LAUNCH", self._on_app_launch)
+        self.dispatcher.register("PASS_LAUNCH", self._on_pass_launch)
+
+    def handle_serial_message(self, deck_id, message):
+        # Called on a deck's serial thread: queue the line and schedule at most one UI tick for the batch
+        with self.serial_inbox_lock:
+            self.serial_inbox.append((deck_id, message, time.perf_counter()))
+            if self.serial_drain_scheduled:
+                return
+            self.serial_drain_scheduled = True
+        self.after(0, self._drain_serial_inbox)
+
+    def _drain_serial_inbox(self):
+        with self.serial_inbox_lock:
+            messages = list(self.serial_inbox)
+            self.serial_inbox.clear()
+            self.serial_drain_scheduled = False
+
+        for deck_id, message, received_at in messages:
+            self._process_serial_message(message, deck_id, received_at)
+        self.update_connection_status()
+
+    def start_metrics(self):
+        port = os.environ.get(METRICS_PORT_ENV) or self.config.get("metrics_port")
+        textfile = os.environ.get(METRICS_FILE_ENV) or self.config.get("metrics_textfile")
+        if not port and not textfile:
+            return None
+        try:
+            exporter = MetricsExporter(port=port, textfile=textfile).start()
+        except (OSError, ValueError) as e:
+            log.error(f"Cannot start metrics exporter: {e}")
+            return None
+        if exporter.port:
+            log.info(f"Metrics on http://127.0.0.1:{exporter.port}/metrics")
+        return exporter
+
+    def update_connection_status(self):
+        for deck in self.decks.connection_changes():
+            if deck.connected:
+                deck.sync.resume_uploads()
+
+        connected, total = self.decks.connected_count(), len(self.decks)
+        if (connected, total) == self.shown_connected:
+            return
+        self.shown_connected = (connected, total)
+        count = f" ({connected}/{total})" if total > 1 else ""
+        if connected:
+             self.status_label.configure(text=f"🟢 Connected{count}", text_color="#2ecc71")
+        else:
+             self.status_label.configure(text=f"🔴 Disconnected{count}", text_color="#ff5555")
 
-    def _process_serial_message(self, message):
-        print(f"Serial: {message}")
+    def _process_serial_message(self, message, deck_id=DEFAULT_DECK, received_at=None):
+        log.debug(f"Serial {deck_id}: {message}")
         self.last_activity = time.time()
+
+        # The deck forgets its labels on every boot; bring it back in line once it is ready
+        deck = self.decks.get(deck_id)
+        if deck is not None and deck.sync.handle_boot_line(message):
+            deck.sync.sync_async()
+        if deck is not None and deck.sync.handle_label_ack(message):
+            return
         
         if not self.security_manager.is_setup():
             return
 
-        if self.serial_handler.connected:
-             self.status_label.configure(text="🟢 Connected", text_color="#2ecc71")
-        else:
-             self.status_label.configure(text="🔴 Disconnected", text_color="#ff5555")
+        command = parse_command(message, deck_id, received_at)
+        # Anything the deck prints that is not a command is counted together
+        MESSAGES.inc(command=command.name if command.name in self.dispatcher.handlers else "other")
+        self.dispatcher.dispatch(command)
 
-        if message == "RFID_UNLOCK_OK":
-            if self.is_locked:
-                self.perform_unlock()
-        
-        elif message.startswith("RFID_READ:"):
-            try:
-                uid = message.split(":")[1].strip().upper()
-                print(f"DEBUG: Scanned UID: '{uid}'")
-                
-                # Handle RFID setup mode
-                if self.in_rfid_setup:
-                    print(f"DEBUG: RFID Setup - Registering UID: {uid}")
-                    self.authorized_uids.append(uid)
-                    self.save_json(UIDS_FILE, self.authorized_uids)
-                    
-                    if hasattr(self, 'rfid_status_label'):
-                        self.rfid_status_label.configure(text="✅ Card registered successfully!", text_color="#2ecc71")
-                    
-                    self.in_rfid_setup = False
-                    self.after(1500, self.complete_setup)
-                    return
-                
-                # Normal RFID unlock flow
-                print(f"DEBUG: Authorized UIDs: {self.authorized_uids}")
+    def _on_rfid_unlock_ok(self, command):
+        if self.is_locked:
+            self.perform_unlock()
+
+    def _on_rfid_read(self, command):
+        try:
+            uid = command.arg.upper()
+            
+            # Handle RFID setup mode
+            if self.in_rfid_setup:
+                log.info(f"Registering card {uid_hint(uid)}")
+                self.authorized_uids.add(uid)
+                self.persistence.mark("uids", self.write_uids)
                 
-                if uid in self.authorized_uids:
-                    print("DEBUG: Access Granted. Sending AUTH_OK")
-                    self.serial_handler.send("AUTH_OK")
-                    if self.is_locked:
-                        self.perform_unlock()
-                else:
-                    print("DEBUG: Access Denied. Sending AUTH_FAIL")
-                    self.serial_handler.send("AUTH_FAIL")
-            except Exception as e:
-                print(f"Error processing RFID: {e}")
+                if hasattr(self, 'rfid_status_label'):
+                    self.rfid_status_label.configure(text="✅ Card registered successfully!", text_color="#2ecc71")
                 
-        elif message.startswith("APP_LAUNCH:"):
-            key = message.split(":")[1].strip()
-            self.launch_app(key)
+                self.in_rfid_setup = False
+                self.after(1500, self.complete_setup)
+                return
             
-        elif message.startswith("PASS_LAUNCH:"):
-            if not self.is_locked:
-                key = message.split(":")[1].strip()
-                self.type_password(key)
+            # Normal RFID unlock flow
+            if uid in self.authorized_uids:
+                log.info(f"Card {uid_hint(uid)} accepted")
+                self.send_auth_reply(command, "AUTH_OK")
+                if self.is_locked:
+                    self.perform_unlock()
+            else:
+                log.warning(f"Card {uid_hint(uid)} refused")
+                self.send_auth_reply(command, "AUTH_FAIL")
+        except Exception as e:
+            log.exception(f"Error processing RFID: {e}")
+
+    def send_auth_reply(self, command, reply):
+        future = self.decks.send(command.deck, reply, priority=PRIORITY_URGENT)
+        if future is None or command.received_at is None:
+            return
+        # Tap to reply: time from the line arriving until the writer thread has sent the answer
+        result = "ok" if reply == "AUTH_OK" else "fail"
+        future.add_done_callback(lambda _: RFID_AUTH.observe(time.perf_counter() - command.received_at, result=result))
 
-    def launch_app(self, key):
-        app_path = self.apps_config.get(key)
+    def _on_app_launch(self, command):
+        self.actions.submit(command.deck, "launch_app", self.launch_app, command.arg, command.deck, timeout=10, keyboard=True)
+
+    def _on_pass_launch(self, command):
+        if not self.is_locked:
+            self.actions.submit(command.deck, "type_password", self.type_password, command.arg, timeout=15, keyboard=True)
+
+    # Actions below run on the action executor's workers, not the Tk thread
+
+    def launch_app(self, key, deck_id=DEFAULT_DECK):
+        deck = self.decks.get(deck_id)
+        apps = deck.apps if deck else self.apps_config
+        app_path = apps.get(key)
         if not app_path:
-            print(f"No app found for key {key}")
+            log.warning(f"No app found for key {key}")
             return
             
-        print(f"Launching: {app_path}")
+        log.info(f"Launching: {app_path}")
         
-        if os.path.exists(app_path):
+        # app_commands is resolved ahead of time for the shared apps only
+        argv = (self.app_commands.get(key) if apps is self.apps_config else None) or self.app_index.resolve(app_path)
+        if argv:
             try:
-                os.startfile(app_path)
+                self.app_index.launch(argv)
                 return
-            except:
-                pass
-                
-        if app_path.startswith("http"):
-            import webbrowser
-            webbrowser.open(app_path)
-            return
+            except OSError as e:
+                log.warning(f"Could not start {argv[0]}: {e}")
             
         # Fallback to typing the name (e.g. for Windows search)
-        pyautogui.press('win')
-        time.sleep(0.1)
-        pyautogui.write(app_path)
-        time.sleep(0.5)
-        pyautogui.press('enter')
+        self.keystrokes.press('win')
+        self.actions.sleep(0.1)
+        self.keystrokes.type_text(app_path)
+        self.actions.sleep(0.5)
+        self.keystrokes.press('enter')
 
 
     def type_password(self, key):
@@ -542,17 +718,12 @@ class OrcaDeckApp(ctk.CTk):
         username = creds.get("username", "")
         password = creds.get("password", "")
         
-        if username:
-            pyautogui.write(username)
-            pyautogui.press('tab')
-            time.sleep(0.1)
-        
-        if password:
-            pyperclip.copy(password)
-            pyautogui.hotkey('ctrl', 'v')
-            pyautogui.press('enter')
+        # Locking cancels queued and running actions; the checkpoint stops before the password
+        elapsed = self.keystrokes.fill(username, password, checkpoint=self.actions.checkpoint, sleep=self.actions.sleep)
+        log.info(f"Filled credential {key} in {elapsed * 1000:.0f} ms")
 
     def check_auto_lock(self):
+        self.update_connection_status()
         if not self.is_locked:
             elapsed = (time.time() - self.last_activity) / 60
             if elapsed > self.config.get("auto_lock_minutes", 15):
@@ -564,9 +735,19 @@ class OrcaDeckApp(ctk.CTk):
 
     def setup_tray(self):
         image = Image.new('RGB', (64, 64), color = (73, 109, 137))
-        menu = (item('Show', self.show_window), item('Exit', self.quit_app))
-        self.tray_icon = pystray.Icon("name", image, "ORCA DECK", menu)
-        threading.Thread(target=self.tray_icon.run, daemon=True).start()
+        menu = [item('Show', self.show_window)]
+        if self.profiling.memory:
+            menu.append(item('Memory snapshot', self.take_memory_snapshot))
+        menu.append(item('Exit', self.quit_app))
+        self.tray_icon = pystray.Icon("name", image, "ORCA DECK", tuple(menu))
+        threading.Thread(target=self.tray_icon.run, name="tray", daemon=True).start()
+
+    def take_memory_snapshot(self):
+        # Runs on the tray thread; tracemalloc snapshots do not need Tk
+        try:
+            self.profiling.memory.snapshot()
+        except Exception as e:
+            log.error(f"Memory snapshot failed: {e}")
 
     def show_window(self):
         self.deiconify()
@@ -577,9 +758,21 @@ class OrcaDeckApp(ctk.CTk):
 
     def quit_app(self):
         try:
-            self.serial_handler.stop()
+            self.decks.stop()
         except:
             pass
+
+        # Write out anything still waiting in the coalesce window, deck state included
+        try:
+            self.persistence.stop()
+        except Exception as e:
+            log.error(f"Error flushing saves: {e}")
+        
+        self.actions.shutdown()
+        self.app_index.stop()
+        if self.metrics:
+            self.metrics.stop()
+        self.profiling.stop()
         
         try:
             self.tray_icon.stop()
@@ -593,5 +786,12 @@ class OrcaDeckApp(ctk.CTk):
         self.mainloop()
 
 if __name__ == "__main__":
-    app = OrcaDeckApp()
+    parser = argparse.ArgumentParser(description=APP_NAME)
+    parser.add_argument("--profile", nargs="?", const="all", metavar="PARTS",
+                        help=f"turn on profiling: all, or any of {','.join(FEATURES)} (also ORCA_PROFILE)")
+    parser.add_argument("--stall-ms", type=float, help="watchdog threshold for blocking Tk callbacks (also ORCA_STALL_MS)")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING... (also ORCA_LOG_LEVEL)")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    app = OrcaDeckApp(profile=args.profile, stall_ms=args.stall_ms)
     app.run()
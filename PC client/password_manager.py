@@ -1,15 +1,16 @@
 import customtkinter as ctk
 from tkinter import filedialog
+from upload_progress import UploadProgress
 import os
-from image_processor import ImageProcessor
 
 class PasswordManager(ctk.CTkFrame):
-    def __init__(self, parent, passwords, mappings, on_save, serial_handler):
+    def __init__(self, parent, passwords, mappings, on_save, serial_handler, deck_sync=None):
         super().__init__(parent)
         self.passwords = passwords
         self.mappings = mappings
         self.on_save = on_save
         self.serial_handler = serial_handler
+        self.deck_sync = deck_sync
         
         self.grid_columnconfigure((0,1,2,3), weight=1)
         
@@ -23,22 +24,18 @@ class PasswordManager(ctk.CTkFrame):
         self.create_grid()
         
     def create_grid(self):
-        for widget in self.winfo_children():
-            widget.destroy()
-            
+        """Build the 16 key buttons once; later edits only patch a button's text"""
+        self.buttons = {}
         ctk.CTkLabel(self, text="Password Manager", font=("Arial", 20)).grid(row=0, column=0, columnspan=4, pady=10)
         
         for r in range(4):
             for c in range(4):
                 key = self.keys[r][c]
-                
-                label = self.mappings.get(key, f"Item {key}")
-                if key == '*': label = "Back"
 
                 if key == '*':
                     btn = ctk.CTkButton(
                         self, 
-                        text=f"{label}\n({key})",
+                        text=self.button_text(key),
                         width=120,
                         height=80,
                         fg_color="#444444",
@@ -47,17 +44,33 @@ class PasswordManager(ctk.CTkFrame):
                 else:
                     btn = ctk.CTkButton(
                         self, 
-                        text=f"{label}\n({key})",
+                        text=self.button_text(key),
                         width=120,
                         height=80,
                         command=lambda k=key: self.edit_password(k)
                     )
                 btn.grid(row=r+1, column=c, padx=10, pady=10)
+                self.buttons[key] = btn
+
+    def button_text(self, key):
+        label = "Back" if key == '*' else self.mappings.get(key, f"Item {key}")
+        return f"{label}\n({key})"
+
+    def update_button(self, key):
+        text = self.button_text(key)
+        btn = self.buttons[key]
+        if btn.cget("text") != text:
+            btn.configure(text=text)
+
+    def refresh(self):
+        """Re-sync every button with the mappings after they changed outside this panel"""
+        for key in self.buttons:
+            self.update_button(key)
 
     def edit_password(self, key):
         dialog = ctk.CTkToplevel(self)
         dialog.title(f"Edit Item {key}")
-        dialog.geometry("400x450")
+        dialog.geometry("400x550")
         
         dialog.transient(self)
         dialog.grab_set()
@@ -87,19 +100,18 @@ class PasswordManager(ctk.CTkFrame):
         password_entry.pack(pady=5)
         password_entry.insert(0, current_creds.get("password", ""))
         
+        progress_holder = ctk.CTkFrame(dialog, fg_color="transparent")
+        
         def upload():
             file_path = filedialog.askopenfilename(filetypes=[("Images", "*.png;*.jpg;*.jpeg")])
-            if file_path:
-                raw_data = ImageProcessor.convert_to_rgb565(file_path)
-                if raw_data:
-                    if self.serial_handler.send_icon_data(key, raw_data, icon_type="pass"):
-                        print(f"Password icon sent for key {key}")
-                    else:
-                        print("Failed to send icon")
-                else:
-                    print("Failed to convert image")
+            if file_path and self.deck_sync:
+                job = self.deck_sync.upload_icon_file("pass", key, file_path)
+                for widget in progress_holder.winfo_children():
+                    widget.destroy()
+                UploadProgress(progress_holder, job).pack()
 
-        ctk.CTkButton(dialog, text="Upload Icon", command=upload, fg_color="#e67e22", hover_color="#d35400").pack(pady=20)
+        ctk.CTkButton(dialog, text="Upload Icon", command=upload, fg_color="#e67e22", hover_color="#d35400").pack(pady=(20, 5))
+        progress_holder.pack()
         
         def save():
             new_name = name_entry.get()
@@ -112,12 +124,12 @@ class PasswordManager(ctk.CTkFrame):
             
             self.passwords[key] = new_creds
             
-            if self.serial_handler and self.serial_handler.serial_conn:
-                self.serial_handler.send(f"LABEL_PASS:{key}:{new_name}")
+            if self.deck_sync:
+                self.deck_sync.push_label("pass", key, new_name)
             
             self.on_save(self.passwords, self.mappings)
             
-            self.create_grid()
+            self.update_button(key)
             dialog.destroy()
             
         ctk.CTkButton(dialog, text="Save", command=save).pack(pady=10)
@@ -0,0 +1,110 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from metrics import SAVE_SECONDS, SAVE_FAILURES
+
+log = logging.getLogger(__name__)
+
+COALESCE_WINDOW = 0.3
+
+def atomic_write(path, data):
+    """Write via a temp file, fsync and rename so a crash leaves either the old or the new file"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    # A temp name of its own, so concurrent writers of the same path cannot rename each other's half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        # mkstemp files are owner-only; keep the mode the file had, or the usual 0644 for a new one
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class WriteBehind:
+    """
+    Runs save callbacks on a background thread.
+    mark(name, writer) records that `name` is dirty; marks for the same name
+    arriving within the coalesce window collapse into a single call of the
+    latest writer, so the Tk thread never waits on the disk.
+    """
+    def __init__(self, window=COALESCE_WINDOW):
+        self.window = window
+        self.pending = {}
+        self.first_marked = None
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.running = True
+        self.writes = 0
+        self.coalesced = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def mark(self, name, writer):
+        with self.condition:
+            if name in self.pending:
+                self.coalesced += 1
+            self.pending[name] = writer
+            if self.first_marked is None:
+                self.first_marked = time.monotonic()
+            self.condition.notify()
+
+    def _take(self):
+        pending, self.pending = self.pending, {}
+        self.first_marked = None
+        return pending
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                remaining = self.first_marked + self.window - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+                pending = self._take()
+            self._write(pending)
+
+    def _write(self, pending):
+        with self.write_lock:
+            for name, writer in pending.items():
+                try:
+                    with SAVE_SECONDS.time(name=name):
+                        writer()
+                    self.writes += 1
+                except Exception as e:
+                    SAVE_FAILURES.inc(name=name)
+                    log.error(f"Background save of {name} failed: {e}")
+
+    def flush(self):
+        """Run everything still pending on the calling thread"""
+        with self.condition:
+            pending = self._take()
+        self._write(pending)
+
+    def stop(self):
+        self.flush()
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout=2)
+
+    def stats(self):
+        with self.condition:
+            return {"pending": len(self.pending), "writes": self.writes, "coalesced": self.coalesced}
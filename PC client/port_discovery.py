@@ -0,0 +1,241 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import serial
+import serial.tools.list_ports
+import icon_protocol
+
+log = logging.getLogger(__name__)
+
+AUTO_PORT = "auto"
+SCAN_INTERVAL = 0.25
+# A deck that resets when the port opens prints DECK_ID first thing in setup()
+IDENTIFY_TIMEOUT = 1.5
+IDENTIFY_RESEND = 0.25
+MAX_PROBES = 4
+# USB-UART bridges on ESP32 boards: Silicon Labs CP210x, WCH CH340, FTDI, Espressif native USB
+DECK_VIDS = {0x10C4, 0x1A86, 0x0403, 0x303A}
+# Boot banner of firmware too old to answer WHO?
+LEGACY_BANNER = ("SPIFFS Mounted", "DECK_READY")
+
+def is_auto(port):
+    """True for "auto" (any deck) and "auto:<DECK_ID>" (that deck wherever it is plugged in)"""
+    return not port or port == AUTO_PORT or port.startswith(AUTO_PORT + ":")
+
+def wanted_device(port):
+    if port and port.startswith(AUTO_PORT + ":"):
+        return port[len(AUTO_PORT) + 1:].upper()
+    return None
+
+def list_deck_ports():
+    return [p.device for p in serial.tools.list_ports.comports() if p.vid in DECK_VIDS]
+
+class Backoff:
+    """Exponential reconnect delay with jitter, so decks that drop together do not retry in lockstep"""
+    def __init__(self, base=0.1, cap=5.0):
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def next_delay(self):
+        delay = min(self.cap, self.base * (2 ** self.attempt))
+        self.attempt += 1
+        # Half fixed, half random: never zero, never more than the ceiling
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self):
+        self.attempt = 0
+
+class Candidate:
+    """An identified deck on an open port, waiting for a SerialHandler to claim it"""
+    def __init__(self, port, conn, device_id, lines, tail, identify_seconds):
+        self.port = port
+        self.conn = conn
+        # "" for legacy firmware that only showed its boot banner
+        self.device_id = device_id
+        # What the deck printed during the handshake, handed on to the handler
+        self.lines = lines
+        self.tail = tail
+        self.identify_seconds = identify_seconds
+
+class PortDiscovery:
+    """
+    Watches the serial ports for decks being plugged in and out.
+    The port list is polled every SCAN_INTERVAL (pyserial has no hot-plug
+    events). While some "auto" SerialHandler is disconnected, USB serial
+    ports are probed in parallel: the probe sends WHO? and waits for
+    DECK_ID:<id>. An identified deck stays open until a handler claims it,
+    so it is not reset a second time. A port that answers nothing is not
+    opened again until it is unplugged and plugged back in, since opening
+    a port toggles DTR and resets whatever is on it. Handlers with a fixed
+    port reserve it (it is never probed) and are woken as soon as it appears.
+    """
+    def __init__(self, lister=list_deck_ports, baud_rate=115200, scan_interval=SCAN_INTERVAL):
+        self.lister = lister
+        self.baud_rate = baud_rate
+        self.scan_interval = scan_interval
+        self.lock = threading.Lock()
+        self.ports = set()
+        self.reserved = set()
+        self.probing = set()
+        # Ports that were probed and are not decks, until they are unplugged
+        self.rejected = set()
+        self.candidates = {}
+        self.watchers = set()
+        self.pool = ThreadPoolExecutor(max_workers=MAX_PROBES, thread_name_prefix="probe")
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats_counts = {"scans": 0, "probes": 0, "decks_found": 0, "last_identify_ms": None}
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        with self.lock:
+            candidates = list(self.candidates.values())
+            self.candidates.clear()
+        for candidate in candidates:
+            candidate.conn.close()
+        self.pool.shutdown(wait=False)
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                log.error(f"Port scan failed: {e}")
+            self.stop_event.wait(self.scan_interval)
+
+    # Handlers
+
+    def watch(self, handler):
+        """handler needs .port, .connected and a .wake Event; fixed ports are reserved for it"""
+        with self.lock:
+            self.watchers.add(handler)
+            if not is_auto(handler.port):
+                self.reserved.add(handler.port)
+
+    def unwatch(self, handler):
+        with self.lock:
+            self.watchers.discard(handler)
+            if not is_auto(handler.port):
+                self.reserved.discard(handler.port)
+
+    def claim(self, handler):
+        """Hand an identified deck to an auto handler; None if there is none for it"""
+        wanted = wanted_device(handler.port)
+        with self.lock:
+            # A plain "auto" handler leaves decks alone that another handler asked for by id
+            spoken_for = {wanted_device(other.port) for other in self.watchers if other is not handler} - {None}
+            for port, candidate in self.candidates.items():
+                if wanted is not None and candidate.device_id != wanted:
+                    continue
+                if wanted is None and candidate.device_id in spoken_for:
+                    continue
+                del self.candidates[port]
+                self.reserved.add(port)
+                return candidate
+        return None
+
+    def release(self, port):
+        """An auto handler closed port; it may be probed again"""
+        with self.lock:
+            self.reserved.discard(port)
+
+    # Scanning and probing
+
+    def scan(self):
+        ports = set(self.lister())
+        with self.lock:
+            self.stats_counts["scans"] += 1
+            appeared = ports - self.ports
+            gone = self.ports - ports
+            self.ports = ports
+            unplugged = [self.candidates.pop(port) for port in gone if port in self.candidates]
+            for port in gone:
+                # Plugged back in later means a fresh probe
+                self.rejected.discard(port)
+            probe = []
+            if any(is_auto(handler.port) and not handler.connected for handler in self.watchers):
+                busy = self.reserved | self.probing | self.rejected | set(self.candidates)
+                probe = [port for port in ports if port not in busy]
+                self.probing.update(probe)
+        for candidate in unplugged:
+            candidate.conn.close()
+        for port in probe:
+            self.pool.submit(self._probe, port)
+        if appeared:
+            self._wake(appeared)
+
+    def _wake(self, ports=(), auto=False):
+        with self.lock:
+            watchers = list(self.watchers)
+        for handler in watchers:
+            if handler.port in ports or (auto and is_auto(handler.port)):
+                handler.wake.set()
+
+    def _probe(self, port):
+        started = time.monotonic()
+        candidate = None
+        try:
+            conn = serial.Serial(port, self.baud_rate, timeout=0.05)
+        except Exception:
+            conn = None
+        if conn is not None:
+            try:
+                device_id, lines, tail = self._identify(conn)
+            except Exception:
+                device_id, lines, tail = None, [], b""
+            if device_id is None:
+                conn.close()
+            else:
+                candidate = Candidate(port, conn, device_id, lines, tail, time.monotonic() - started)
+
+        with self.lock:
+            self.probing.discard(port)
+            self.stats_counts["probes"] += 1
+            if candidate is None:
+                self.rejected.add(port)
+            elif port not in self.ports:
+                # Unplugged while we were asking
+                candidate.conn.close()
+                candidate = None
+            else:
+                self.candidates[port] = candidate
+                self.stats_counts["decks_found"] += 1
+                self.stats_counts["last_identify_ms"] = round(candidate.identify_seconds * 1000, 1)
+        if candidate is not None:
+            log.info(f"Found deck {candidate.device_id or '(legacy)'} on {port} in {candidate.identify_seconds * 1000:.0f} ms")
+            self._wake(auto=True)
+
+    def _identify(self, conn):
+        """Returns (device_id, lines, tail); device_id is None when nothing deck-like answered"""
+        lines = []
+        buffer = bytearray()
+        deadline = time.monotonic() + IDENTIFY_TIMEOUT
+        next_query = 0.0
+        while time.monotonic() < deadline and not self.stop_event.is_set():
+            if time.monotonic() >= next_query:
+                conn.write(f"{icon_protocol.WHO_QUERY}\n".encode())
+                next_query = time.monotonic() + IDENTIFY_RESEND
+            buffer += conn.read(max(1, conn.in_waiting))
+            while b"\n" in buffer:
+                raw, _, rest = buffer.partition(b"\n")
+                buffer = bytearray(rest)
+                line = raw.decode('utf-8', errors='ignore').strip()
+                if line.startswith(icon_protocol.DECK_ID_REPLY):
+                    return line[len(icon_protocol.DECK_ID_REPLY):].upper(), lines, bytes(buffer)
+                if line:
+                    lines.append(line)
+                if line.startswith(LEGACY_BANNER):
+                    return "", lines, bytes(buffer)
+        return None, lines, bytes(buffer)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.stats_counts, ports=sorted(self.ports), waiting=sorted(self.candidates))
@@ -0,0 +1,218 @@
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from persistence import atomic_write
+from metrics import TK_STALLS
+
+PROFILE_ENV = "ORCA_PROFILE"
+STALL_ENV = "ORCA_STALL_MS"
+FEATURES = ("sample", "watchdog", "memory")
+SAMPLE_INTERVAL = 0.005
+DEFAULT_STALL_MS = 200
+# Tk (the main thread), serial reader/writer, tray and action workers, matched by name prefix
+PROFILED_THREADS = ("MainThread", "serial", "tray", "action")
+SNAPSHOT_FRAMES = 10
+SNAPSHOT_TOP = 15
+
+log = logging.getLogger(__name__)
+
+def parse_features(text):
+    """"1" or "all" turns everything on; otherwise a comma list of FEATURES"""
+    words = {word.strip().lower() for word in (text or "").split(",") if word.strip()}
+    if words & {"1", "all", "on", "yes", "true"}:
+        return set(FEATURES)
+    unknown = words - set(FEATURES)
+    if unknown:
+        log.warning(f"Unknown profiling options: {', '.join(sorted(unknown))}")
+    return words & set(FEATURES)
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Statistical profiler for a few named threads. Every interval the current
+    stack of each is read from sys._current_frames() and counted, so nothing
+    is traced per call and it can stay on while a stall is reproduced.
+    Results are folded stacks ("thread;outer;inner count"), which
+    flamegraph.pl and speedscope read directly.
+    """
+    def __init__(self, path, thread_prefixes=PROFILED_THREADS, interval=SAMPLE_INTERVAL):
+        self.path = path
+        self.thread_prefixes = tuple(thread_prefixes)
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate() if thread.name.startswith(self.thread_prefixes)}
+        frames = sys._current_frames()
+        stacks = []
+        for ident, name in names.items():
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                stacks.append(";".join([name] + stack[::-1]))
+        with self.lock:
+            self.stacks.update(stacks)
+            self.samples += 1
+
+    def write(self):
+        with self.lock:
+            lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+            samples = self.samples
+        atomic_write(self.path, "\n".join(lines) + "\n")
+        log.info(f"Profile of {samples} samples written to {self.path}")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+        self.write()
+
+class TkWatchdog:
+    """
+    Logs the Tk thread's stack whenever a callback keeps the main loop busy
+    for longer than threshold_ms. A heartbeat scheduled with after() stamps
+    the time whenever the loop is free; a watcher thread notices when the
+    stamp gets old and captures the stack while the callback is still stuck.
+    Create it on the Tk thread.
+    """
+    def __init__(self, root, threshold_ms=DEFAULT_STALL_MS):
+        self.root = root
+        self.threshold = threshold_ms / 1000
+        self.beat_interval = self.threshold / 2
+        self.tk_ident = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.reported = False
+        self.stalls = 0
+        self.stop_event = threading.Event()
+
+    def start(self):
+        self._beat()
+        threading.Thread(target=self._watch, name="tk-watchdog", daemon=True).start()
+        return self
+
+    def _beat(self):
+        now = time.monotonic()
+        if self.reported:
+            blocked = now - self.last_beat - self.beat_interval
+            log.warning(f"Tk main loop was blocked for {blocked * 1000:.0f} ms")
+            self.reported = False
+        self.last_beat = now
+        if not self.stop_event.is_set():
+            self.root.after(max(1, int(self.beat_interval * 1000)), self._beat)
+
+    def _watch(self):
+        while not self.stop_event.wait(self.threshold / 4):
+            # The next beat is due beat_interval after the last one; anything beyond that is a callback
+            blocked = time.monotonic() - self.last_beat - self.beat_interval
+            if blocked < self.threshold or self.reported:
+                continue
+            frame = sys._current_frames().get(self.tk_ident)
+            if frame is None:
+                return
+            self.reported = True
+            self.stalls += 1
+            TK_STALLS.inc()
+            stack = "".join(traceback.format_stack(frame))
+            log.warning(f"Tk callback blocking the main loop for {blocked * 1000:.0f} ms so far:\n{stack}")
+
+    def stop(self):
+        self.stop_event.set()
+
+class MemorySnapshots:
+    """tracemalloc from start() on; snapshot() dumps one and logs what grew since the last"""
+    def __init__(self, directory, frames=SNAPSHOT_FRAMES):
+        self.directory = directory
+        self.frames = frames
+        self.previous = None
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        return self
+
+    def snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"memory_{time.strftime('%Y%m%d-%H%M%S')}.tracemalloc")
+        snapshot.dump(path)
+
+        if self.previous is None:
+            stats = snapshot.statistics("lineno")
+        else:
+            stats = snapshot.compare_to(self.previous, "lineno")
+        self.previous = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        top = "\n".join(str(stat) for stat in stats[:SNAPSHOT_TOP])
+        log.info(f"Memory snapshot {path}: {current / 2**20:.1f} MB traced, peak {peak / 2**20:.1f} MB\n{top}")
+        return path
+
+    def stop(self):
+        tracemalloc.stop()
+
+class Profiling:
+    """
+    The opt-in hooks, chosen by ORCA_PROFILE or --profile ("all", or any of
+    sample,watchdog,memory). Output goes to directory; parts that are off are None.
+    """
+    def __init__(self, features, directory, stall_ms=DEFAULT_STALL_MS):
+        self.features = set(features)
+        self.directory = directory
+        self.stall_ms = stall_ms
+        self.sampler = None
+        self.watchdog = None
+        self.memory = None
+
+    @classmethod
+    def from_env(cls, directory, features=None, stall_ms=None):
+        features = parse_features(features if features is not None else os.environ.get(PROFILE_ENV))
+        stall_ms = stall_ms or float(os.environ.get(STALL_ENV) or DEFAULT_STALL_MS)
+        return cls(features, directory, stall_ms)
+
+    @property
+    def enabled(self):
+        return bool(self.features)
+
+    def start(self, root):
+        if not self.enabled:
+            return self
+        os.makedirs(self.directory, exist_ok=True)
+        if "memory" in self.features:
+            self.memory = MemorySnapshots(self.directory).start()
+        if "sample" in self.features:
+            path = os.path.join(self.directory, f"profile_{time.strftime('%Y%m%d-%H%M%S')}.folded")
+            self.sampler = SamplingProfiler(path).start()
+        if "watchdog" in self.features:
+            self.watchdog = TkWatchdog(root, self.stall_ms).start()
+        log.info(f"Profiling on: {', '.join(sorted(self.features))}")
+        return self
+
+    def stop(self):
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.sampler:
+            self.sampler.stop()
+        if self.memory:
+            self.memory.stop()
@@ -1,12 +1,14 @@
 import json
 import hashlib
 import os
+from persistence import atomic_write
 
 SECURITY_FILE = "security_data.json"
 
 class SecurityManager:
-    def __init__(self, data_dir):
+    def __init__(self, data_dir, storage=None):
         self.file_path = os.path.join(data_dir, SECURITY_FILE)
+        self.storage = storage
         self.questions = [
             "What was the name of your first pet?",
             "What is your mother's maiden name?",
@@ -15,6 +17,8 @@ class SecurityManager:
         self.data = self.load_data()
 
     def load_data(self):
+        if self.storage:
+            return self.storage.load_security()
         if os.path.exists(self.file_path):
             try:
                 with open(self.file_path, 'r') as f:
@@ -24,8 +28,10 @@ class SecurityManager:
         return {}
 
     def save_data(self):
-        with open(self.file_path, 'w') as f:
-            json.dump(self.data, f)
+        if self.storage:
+            self.storage.save_security(self.data)
+            return
+        atomic_write(self.file_path, json.dumps(self.data))
 
     def is_setup(self):
         return bool(self.data.get("answers"))
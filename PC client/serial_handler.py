@@ -1,90 +1,636 @@
 import serial
 import serial.tools.list_ports
+import logging
 import threading
 import time
+import queue
+import itertools
+import collections
+import math
+from concurrent.futures import Future
+import icon_protocol
+from port_discovery import Backoff, is_auto
+from metrics import SERIAL_BYTES, ICON_UPLOAD
+
+log = logging.getLogger(__name__)
+
+# Upper bound on a single buffered line; anything longer is line noise
+MAX_LINE_LENGTH = 4096
+
+PROBE_TIMEOUT = 0.3
+ACK_TIMEOUT = 0.5
+# The text protocol writes to flash as hex lines arrive, so ICON_END can take a while to confirm
+TEXT_DONE_TIMEOUT = 2.0
+MAX_RETRIES = 5
+
+# Outbound priorities: lower values are written first
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 10
+PRIORITY_BULK = 20
+
+# Longest a transfer holds the writer thread before urgent lines get a turn
+WRITER_SLICE = 0.01
+
+class LatencyTracker:
+    """Keeps a rolling window of latency samples and summarizes them"""
+    def __init__(self, window=1024):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        with self.lock:
+            ordered = sorted(self.samples)
+            count = self.count
+        if not ordered:
+            return {"count": count, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        return {
+            "count": count,
+            "p50_ms": round(_percentile(ordered, 50) * 1000, 3),
+            "p99_ms": round(_percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3)
+        }
+
+def _percentile(ordered, pct):
+    index = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[min(len(ordered) - 1, index)]
+
+class IconUpload:
+    """
+    One icon upload, shared between the writer thread and whoever watches it
+    (the edit dialogs poll it for their progress bar).
+    acked counts bytes the deck has confirmed. An upload that was cut off
+    after some progress is INTERRUPTED and can be passed to upload_icon again,
+    which continues from what the deck reports it kept.
+    """
+    QUEUED = "queued"
+    SENDING = "sending"
+    DONE = "done"
+    FAILED = "failed"
+    INTERRUPTED = "interrupted"
+    CANCELLED = "cancelled"
+
+    def __init__(self, key, data, icon_type="app", progress=None):
+        self.key = key
+        self.data = bytes(data)
+        self.icon_type = icon_type
+        self.progress = progress
+        self.total = len(self.data)
+        self.acked = 0
+        self.resumed_from = 0
+        # The text protocol overwrites the slot's icon as it goes, so a failed upload leaves a partial one
+        self.clobbered = False
+        self.attempts = 0
+        self.state = self.QUEUED
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        # Called once by cancel(), whatever state the upload is in
+        self.on_cancel = None
+        self.future = None
+
+    def reset(self):
+        self.attempts += 1
+        self.state = self.QUEUED
+        self.cancel_event.clear()
+        self.started_at = None
+        self.finished_at = None
+
+    def advance(self, acked):
+        self.acked = acked
+        if self.progress:
+            self.progress(acked, self.total)
+
+    def cancel(self):
+        """Stop at the next frame; the deck drops the partial file"""
+        if self.state in (self.DONE, self.CANCELLED) or self.cancel_event.is_set():
+            return
+        self.cancel_event.set()
+        if self.state == self.INTERRUPTED:
+            self.state = self.CANCELLED
+        elif self.future is not None and self.future.cancel():
+            self.finish(False, resolve=False)
+        if self.on_cancel:
+            self.on_cancel()
+
+    def finish(self, ok, resolve=True):
+        if ok:
+            self.state = self.DONE
+        elif self.cancel_event.is_set():
+            self.state = self.CANCELLED
+        elif self.acked > 0:
+            self.state = self.INTERRUPTED
+        else:
+            self.state = self.FAILED
+        self.finished_at = time.monotonic()
+        if resolve:
+            self.future = Future()
+            self.future.set_result(ok)
+
+    @property
+    def finished(self):
+        return self.state in (self.DONE, self.FAILED, self.INTERRUPTED, self.CANCELLED)
+
+    def bytes_per_second(self):
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return (self.acked - self.resumed_from) / elapsed if elapsed > 0 else 0.0
 
 class SerialHandler:
-    def __init__(self, port=None, baud_rate=115200, on_message=None):
+    """
+    One deck's serial link. port is a device name, or "auto" / "auto:<DECK_ID>"
+    to take a deck found by discovery (a PortDiscovery). Between connection
+    attempts the reader waits with exponential backoff, and discovery wakes
+    it early when its port (or, for auto, a deck) shows up.
+    """
+    def __init__(self, port=None, baud_rate=115200, on_message=None, discovery=None):
         self.port = port
         self.baud_rate = baud_rate
         self.on_message = on_message
+        self.discovery = discovery
         self.serial_conn = None
         self.running = False
+        self.stopped = False
         self.thread = None
         self.connected = False
+        # Port and DECK_ID of the current connection
+        self.device_port = None
+        self.device_id = None
+        self.wake = threading.Event()
+        self.backoff = Backoff()
+        # Optional TrafficRecorder; both directions are logged while it is set
+        self.recorder = None
+        # Time from bytes leaving the port to the line being handed to on_message
+        self.rx_latency = LatencyTracker()
+        # Deck capabilities from the CAPS? probe, None until probed on this connection
+        self.capabilities = None
+        # While a transfer runs, deck replies are routed here instead of on_message
+        self.replies = queue.Queue()
+        self.capture_replies = False
+        # Outbound work: (priority, order, job, future, queued_at)
+        self.tx_queue = queue.PriorityQueue()
+        self.tx_order = itertools.count()
+        self.tx_latency = LatencyTracker()
+        self.writer_thread = None
+        # Only one transfer owns the link at a time; jobs that cannot go yet wait here
+        self.active_transfer = None
+        self.held = []
+        # The deck discards text lines until this (monotonic) time: inf while it is in binary upload mode
+        self.text_blocked_until = 0.0
 
     def start(self):
         self.running = True
-        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.stopped = False
+        if self.discovery:
+            self.discovery.watch(self)
+        # Named so the profiler can pick them out
+        self.thread = threading.Thread(target=self._read_loop, name=f"serial-reader-{self.port}", daemon=True)
         self.thread.start()
+        self.writer_thread = threading.Thread(target=self._write_loop, name=f"serial-writer-{self.port}", daemon=True)
+        self.writer_thread.start()
 
     def stop(self):
         self.running = False
+        self.stopped = True
+        self.wake.set()
+        if self.discovery:
+            self.discovery.unwatch(self)
+        self._enqueue(PRIORITY_URGENT, None)
         if self.serial_conn:
             self.serial_conn.close()
+            self._release()
+        if not (self.writer_thread and self.writer_thread.is_alive()):
+            self._fail_pending()
 
     def _read_loop(self):
+        buffer = bytearray()
         while self.running:
             if not self.serial_conn or not self.serial_conn.is_open:
-                self._connect()
-            
-            if self.serial_conn and self.serial_conn.is_open:
-                try:
-                    if self.serial_conn.in_waiting > 0:
-                        line = self.serial_conn.readline().decode('utf-8', errors='ignore').strip()
-                        if line and self.on_message:
-                            self.on_message(line)
-                except Exception as e:
-                    print(f"Serial read error: {e}")
-                    self.connected = False
-                    self.serial_conn.close()
-            
-            time.sleep(0.1)
+                buffer.clear()
+                if not self._connect(buffer):
+                    self.wake.wait(self.backoff.next_delay())
+                    self.wake.clear()
+                continue
 
-    def _connect(self):
-        try:
-            if self.port:
-                self.serial_conn = serial.Serial(self.port, self.baud_rate, timeout=1)
-                self.connected = True
-                print(f"Connected to {self.port}")
-            else:
-                pass
-        except Exception as e:
-            self.connected = False
-            time.sleep(2)
+            try:
+                # Block until at least one byte arrives (or the port timeout expires),
+                # then take everything else that is already waiting in the same read
+                chunk = self.serial_conn.read(max(1, self.serial_conn.in_waiting))
+            except Exception as e:
+                if not self.running:
+                    break
+                log.warning(f"Serial read error: {e}")
+                self.connected = False
+                self.serial_conn.close()
+                self._release()
+                continue
+
+            if not chunk:
+                continue
+
+            received_at = time.perf_counter()
+            SERIAL_BYTES.inc(len(chunk), port=self.device_port, direction="rx")
+            buffer += chunk
+            self._dispatch_lines(buffer, received_at)
+
+    def _dispatch_lines(self, buffer, received_at):
+        """Hand every complete line in buffer to on_message and keep the partial tail"""
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = buffer[start:end].decode('utf-8', errors='ignore').strip()
+            start = end + 1
+            if line and self.recorder:
+                self.recorder.record_line(line)
+            if line.startswith(icon_protocol.DECK_ID_REPLY):
+                # Printed on boot and in answer to WHO?; not a command for the app
+                self.device_id = line[len(icon_protocol.DECK_ID_REPLY):].upper()
+                continue
+            if line and self.capture_replies and line.startswith(icon_protocol.REPLY_PREFIXES):
+                self.replies.put(line)
+                if line.startswith(icon_protocol.INTERNAL_PREFIXES):
+                    continue
+            if line and self.on_message:
+                self.rx_latency.record(time.perf_counter() - received_at)
+                self.on_message(line)
+
+        if start:
+            del buffer[:start]
+        if len(buffer) > MAX_LINE_LENGTH:
+            buffer.clear()
+
+    def latency_stats(self):
+        return self.rx_latency.summary()
+
+    def _connect(self, buffer):
+        """Open the port, or claim a deck from discovery; returns False to back off and retry"""
+        lines = []
+        if is_auto(self.port):
+            candidate = self.discovery.claim(self) if self.discovery else None
+            if candidate is None:
+                return False
+            conn = candidate.conn
+            conn.timeout = 1
+            self.device_port = candidate.port
+            self.device_id = candidate.device_id
+            # Boot lines the deck printed during the handshake still belong to the app
+            lines = candidate.lines
+            buffer += candidate.tail
+        else:
+            try:
+                conn = serial.Serial(self.port, self.baud_rate, timeout=1)
+            except Exception:
+                self.connected = False
+                return False
+            self.device_port = self.port
+            self.device_id = None
+
+        self.serial_conn = conn
+        self.capabilities = None
+        self.connected = True
+        # A fresh connection may be a reset deck, which starts out in text mode
+        self.text_blocked_until = 0.0
+        self.backoff.reset()
+        log.info(f"Connected to {self.device_port}" + (f" (deck {self.device_id})" if self.device_id else ""))
+        if self.on_message:
+            for line in lines:
+                self.on_message(line)
+        return True
+
+    def _release(self):
+        if self.discovery and is_auto(self.port) and self.device_port:
+            self.discovery.release(self.device_port)
+
+    def _enqueue(self, priority, job):
+        future = Future()
+        if self.stopped and job is not None:
+            future.set_result(False)
+            return future
+        self.tx_queue.put((priority, next(self.tx_order), job, future, time.perf_counter()))
+        return future
+
+    def _write_loop(self):
+        """
+        Single owner of serial writes. Lines go out in priority order; transfers are
+        generators stepped one slice at a time and re-queued, so an urgent line queued
+        mid-transfer is written before the transfer's next frame. Two exceptions wait
+        in held until they can go: lines and new transfers while the deck only reads
+        binary frames, and other transfers while one is running.
+        """
+        while self.running:
+            released = [entry for entry in self.held if not self._must_hold(entry[2])]
+            if released:
+                self.held = [entry for entry in self.held if self._must_hold(entry[2])]
+                for entry in released:
+                    self.tx_queue.put(entry)
+            try:
+                entry = self.tx_queue.get(timeout=WRITER_SLICE if self.held else None)
+            except queue.Empty:
+                continue
+            priority, _, job, future, queued_at = entry
+            if job is None:
+                continue
+            if self._must_hold(job):
+                self.held.append(entry)
+                continue
+            if not future.running() and not future.set_running_or_notify_cancel():
+                if hasattr(job, "close"):
+                    job.close()
+                continue
 
-    def send(self, message):
+            if isinstance(job, bytes):
+                ok = self.write_bytes(job)
+                self.tx_latency.record(time.perf_counter() - queued_at)
+                future.set_result(ok)
+                continue
+
+            self.active_transfer = job
+            try:
+                next(job)
+            except StopIteration as done:
+                self.active_transfer = None
+                future.set_result(bool(done.value))
+                continue
+            except Exception as e:
+                self.active_transfer = None
+                log.error(f"Transfer error: {e}")
+                future.set_result(False)
+                continue
+            # Keep the original queued_at; the transfer resumes at the back of its priority level
+            self.tx_queue.put((priority, next(self.tx_order), job, future, queued_at))
+        self._fail_pending()
+
+    def _fail_pending(self):
+        """Resolve everything still queued or held to False, so nobody waits on a stopped handler"""
+        entries, self.held = self.held, []
+        while True:
+            try:
+                entries.append(self.tx_queue.get_nowait())
+            except queue.Empty:
+                break
+        for _, _, job, future, _ in entries:
+            if hasattr(job, "close"):
+                # Runs the transfer's finally blocks, which mark its upload as finished
+                job.close()
+            if future is not None and not future.done():
+                future.set_result(False)
+
+    def _must_hold(self, job):
+        if isinstance(job, bytes):
+            return time.monotonic() < self.text_blocked_until
+        if job is self.active_transfer:
+            return False
+        # A new transfer starts with a text line too, and any byte would restart the deck's silence timeout
+        return self.active_transfer is not None or time.monotonic() < self.text_blocked_until
+
+    def send(self, message, priority=PRIORITY_NORMAL):
+        """Queue a text line for the writer thread; the returned future resolves to True once written"""
+        return self._enqueue(priority, f"{message}\n".encode())
+
+    def write_bytes(self, data):
         if self.serial_conn and self.serial_conn.is_open:
             try:
-                self.serial_conn.write(f"{message}\n".encode())
+                self.serial_conn.write(data)
+                SERIAL_BYTES.inc(len(data), port=self.device_port, direction="tx")
+                if self.recorder:
+                    self.recorder.record_tx(data)
+                return True
             except Exception as e:
-                print(f"Send Error: {e}")
+                log.error(f"Send Error: {e}")
+        return False
+
+    def _write_line(self, message):
+        return self.write_bytes(f"{message}\n".encode())
+
+    def queue_stats(self):
+        return {"depth": self.tx_queue.qsize(), "write_latency": self.tx_latency.summary()}
 
-    def send_icon_data(self, key, data, icon_type="app"):
+    def _begin_replies(self):
+        while not self.replies.empty():
+            self.replies.get_nowait()
+        self.capture_replies = True
+
+    def _await_reply(self, timeout, prefixes=icon_protocol.REPLY_PREFIXES):
+        """Generator: wait for a deck reply in short slices, yielding to the writer between them"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                line = self.replies.get(timeout=min(remaining, WRITER_SLICE))
+            except queue.Empty:
+                yield
+                continue
+            if line.startswith(prefixes):
+                return line
+
+    def _pause(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            time.sleep(min(WRITER_SLICE, max(0.0, deadline - time.monotonic())))
+            yield
+
+    def _probe_capabilities(self):
+        """Ask the deck which transfer modes it supports; decks without an answer get an empty set"""
+        if self.capabilities is None:
+            self._begin_replies()
+            try:
+                self._write_line(icon_protocol.CAPS_QUERY)
+                reply = yield from self._await_reply(PROBE_TIMEOUT, (icon_protocol.CAPS_REPLY,))
+            finally:
+                self.capture_replies = False
+            if reply:
+                self.capabilities = set(reply[len(icon_protocol.CAPS_REPLY):].split(","))
+            else:
+                self.capabilities = set()
+        return self.capabilities
+
+    def send_icon_data(self, key, data, icon_type="app", progress=None):
         """
-        Send icon data to Arduino
+        Send icon data to Arduino without blocking; the frames go out from the writer thread
         icon_type: "app" or "pass" to differentiate between app and password icons
+        progress: optional callable(sent_bytes, total_bytes), called from the writer thread
+        Returns a future that resolves to True once the deck has the icon
         """
+        return self.upload_icon(IconUpload(key, data, icon_type, progress)).future
+
+    def upload_icon(self, upload):
+        """Queue an IconUpload; an interrupted one continues from what the deck already has"""
         if not self.serial_conn or not self.serial_conn.is_open:
-            return False
-            
-        total_size = len(data)
-        print(f"Sending {icon_type} icon for key {key}, size: {total_size} bytes")
-        
-        self.send(f"ICON_START:{icon_type}:{key}:{total_size}")
-        time.sleep(0.5)
-        
-        chunk_size = 32
-        for i in range(0, total_size, chunk_size):
-            chunk = data[i:i+chunk_size]
-            hex_chunk = chunk.hex().upper()
-            self.send(f"ICON_DATA:{hex_chunk}")
-            time.sleep(0.1)
+            upload.finish(False)
+            return upload
+
+        upload.reset()
+        upload.future = self._enqueue(PRIORITY_BULK, self._icon_transfer(upload))
+        return upload
+
+    def _icon_transfer(self, upload):
+        log.info(f"Sending {upload.icon_type} icon for key {upload.key}, size: {upload.total} bytes")
+        upload.state = IconUpload.SENDING
+        upload.started_at = time.monotonic()
+
+        ok = False
+        try:
+            capabilities = yield from self._probe_capabilities()
+            if icon_protocol.CAP_BINARY in capabilities:
+                ok = yield from self._send_icon_frames(upload)
+            else:
+                ok = yield from self._send_icon_text(upload)
+        finally:
+            upload.finish(ok, resolve=False)
+            ICON_UPLOAD.observe(upload.finished_at - upload.started_at, outcome=upload.state)
+
+        log.info(f"Icon upload {upload.state} at {upload.acked}/{upload.total} bytes")
+        return ok
+
+    def _send_icon_frames(self, upload):
+        """Stream the icon as CRC-checked frames with a go-back-N window of acknowledgements"""
+        size = icon_protocol.FRAME_PAYLOAD
+
+        self._begin_replies()
+        try:
+            start_line = f"ICON_BIN:{upload.icon_type}:{upload.key}:{upload.total}"
+            if upload.acked:
+                start_line += ":" + icon_protocol.RESUME_FLAG
+            self.text_blocked_until = math.inf
+            self._write_line(start_line)
+            reply = yield from self._await_reply(ACK_TIMEOUT, ("UPLOAD_START_",))
+            start = icon_protocol.parse_start_reply(reply)
+            if start is None:
+                if reply is not None:
+                    # Refused: the deck never left text mode
+                    self.text_blocked_until = 0.0
+                return False
+
+            # The deck says how much it kept; sequence numbers restart at 0 from there
+            upload.resumed_from = start
+            upload.advance(start)
+            data = upload.data
+            frames = [icon_protocol.build_frame(i, data[off:off + size])
+                      for i, off in enumerate(range(start, len(data), size))]
+
+            base = 0
+            next_frame = 0
+            retries = 0
+            # Once the last frame is out the deck may have finished and be back in text mode
+            last_sent = False
+            while base < len(frames):
+                if upload.cancel_event.is_set():
+                    self.write_bytes(icon_protocol.abort_frame(base))
+                    if (yield from self._await_reply(ACK_TIMEOUT, ("UPLOAD_ABORT",))):
+                        self.text_blocked_until = 0.0
+                    return False
+
+                while next_frame < len(frames) and next_frame < base + icon_protocol.WINDOW_SIZE:
+                    if not self.write_bytes(frames[next_frame]):
+                        return False
+                    next_frame += 1
+                    last_sent = next_frame == len(frames)
+
+                reply = yield from self._await_reply(ACK_TIMEOUT, ("ACK:", "NAK:", "UPLOAD_DONE", "UPLOAD_ABORT"))
+                if reply == "UPLOAD_DONE":
+                    # Sent only once every byte is written, so it stands for any ACKs lost on the way
+                    self.text_blocked_until = 0.0
+                    upload.advance(len(data))
+                    return True
+                if reply == "UPLOAD_ABORT":
+                    self.text_blocked_until = 0.0
+                    return False
+                if reply is None:
+                    if last_sent:
+                        # Resent frames would reach a finished deck's line parser; wait for it to
+                        # confirm, or to give up after its silence timeout and keep the .part
+                        reply = yield from self._await_reply(icon_protocol.BIN_UPLOAD_TIMEOUT + ACK_TIMEOUT,
+                                                             ("UPLOAD_DONE", "UPLOAD_ABORT"))
+                        if reply is not None:
+                            self.text_blocked_until = 0.0
+                        if reply == "UPLOAD_DONE":
+                            upload.advance(len(data))
+                        return reply == "UPLOAD_DONE"
+                    retries += 1
+                    if retries > MAX_RETRIES:
+                        return False
+                    next_frame = base
+                    continue
+
+                try:
+                    seq = int(reply[4:])
+                except ValueError:
+                    continue
+                # Sequence numbers wrap at 256; map them back onto the window
+                offset = (seq - base) & 0xFF
+                if reply.startswith("ACK:"):
+                    if offset >= next_frame - base:
+                        continue
+                    base += offset + 1
+                    retries = 0
+                    upload.advance(min(start + base * size, len(data)))
+                else:
+                    if offset > next_frame - base:
+                        continue
+                    retries += 1
+                    if retries > MAX_RETRIES:
+                        return False
+                    base += offset
+                    next_frame = base
+                    # The deck drops every frame after the one it asked for, so it cannot have finished
+                    last_sent = False
+
+            # Only the deck's confirmation counts; the rename to .raw happens there
+            reply = yield from self._await_reply(ACK_TIMEOUT, ("UPLOAD_DONE", "UPLOAD_ABORT"))
+            if reply is not None:
+                self.text_blocked_until = 0.0
+            return reply == "UPLOAD_DONE"
+        finally:
+            self.capture_replies = False
+            if self.text_blocked_until == math.inf:
+                # Gave up without hearing the deck leave binary mode; it does on its own after a silence
+                self.text_blocked_until = time.monotonic() + icon_protocol.BIN_UPLOAD_TIMEOUT
+
+    def _send_icon_text(self, upload):
+        """Legacy hex line protocol for decks that do not answer the capability probe; it cannot resume"""
+        data = upload.data
+        total_size = upload.total
+        upload.advance(0)
+
+        self._begin_replies()
+        try:
+            self._write_line(f"ICON_START:{upload.icon_type}:{upload.key}:{total_size}")
+            reply = yield from self._await_reply(ACK_TIMEOUT, ("UPLOAD_START_",))
+            if icon_protocol.parse_start_reply(reply) is None:
+                return False
+            upload.clobbered = True
             
-        time.sleep(0.5)
-        self.send("ICON_END")
-        print("Icon upload complete")
-        return True
+            chunk_size = 32
+            for i in range(0, total_size, chunk_size):
+                if upload.cancel_event.is_set():
+                    # There is no abort in this protocol; close the file so stray lines cannot extend it
+                    if self._write_line("ICON_END"):
+                        yield from self._await_reply(TEXT_DONE_TIMEOUT, ("UPLOAD_DONE",))
+                    return False
+                chunk = data[i:i+chunk_size]
+                hex_chunk = chunk.hex().upper()
+                if not self._write_line(f"ICON_DATA:{hex_chunk}"):
+                    return False
+                upload.advance(min(i + chunk_size, total_size))
+                yield from self._pause(0.1)
+                
+            if not self._write_line("ICON_END"):
+                return False
+            reply = yield from self._await_reply(TEXT_DONE_TIMEOUT, ("UPLOAD_DONE",))
+            return reply is not None
+        finally:
+            self.capture_replies = False
 
     def get_ports(self):
         return [p.device for p in serial.tools.list_ports.comports()]
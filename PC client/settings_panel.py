@@ -1,5 +1,12 @@
 import customtkinter as ctk
 import tkinter.messagebox as messagebox
+import tkinter.filedialog as filedialog
+import time
+from uid_allowlist import parse_expiry, format_expiry, normalize_uid
+from virtual_list import VirtualList
+from keystroke import TIMING_PROFILES, DEFAULT_PROFILE
+from deck_manager import parse_deck_list, format_deck_list
+from port_discovery import AUTO_PORT
 
 class SettingsPanel(ctk.CTkFrame):
     def __init__(self, parent, config, authorized_uids, on_save_config, on_save_uids, serial_handler=None, is_locked=False):
@@ -10,6 +17,9 @@ class SettingsPanel(ctk.CTkFrame):
         self.on_save_uids = on_save_uids
         self.serial_handler = serial_handler
         self.is_locked = is_locked
+        self.uid_query = ""
+        self.query_digest = None
+        self.uid_matches = []
         
         self.create_ui()
         
@@ -26,14 +36,31 @@ class SettingsPanel(ctk.CTkFrame):
         ctk.CTkLabel(port_frame, text="COM Port:", width=120, anchor="w").pack(side="left")
         self.port_entry = ctk.CTkEntry(port_frame, width=150)
         self.port_entry.pack(side="left", padx=10)
-        self.port_entry.insert(0, self.config.get("com_port", "COM3"))
+        
+        decks_frame = ctk.CTkFrame(sys_frame, fg_color="transparent")
+        decks_frame.pack(fill="x", padx=20, pady=5)
+        ctk.CTkLabel(decks_frame, text="Extra decks:", width=120, anchor="w").pack(side="left")
+        self.decks_entry = ctk.CTkEntry(decks_frame, width=300, placeholder_text="COM5, kiosk2=COM6")
+        self.decks_entry.pack(side="left", padx=10)
         
         lock_frame = ctk.CTkFrame(sys_frame, fg_color="transparent")
         lock_frame.pack(fill="x", padx=20, pady=5)
         ctk.CTkLabel(lock_frame, text="Auto-lock (minutes):", width=120, anchor="w").pack(side="left")
         self.autolock_entry = ctk.CTkEntry(lock_frame, width=150)
         self.autolock_entry.pack(side="left", padx=10)
-        self.autolock_entry.insert(0, str(self.config.get("auto_lock_minutes", 15)))
+        
+        typing_frame = ctk.CTkFrame(sys_frame, fg_color="transparent")
+        typing_frame.pack(fill="x", padx=20, pady=5)
+        ctk.CTkLabel(typing_frame, text="Typing speed:", width=120, anchor="w").pack(side="left")
+        self.typing_menu = ctk.CTkOptionMenu(typing_frame, values=list(TIMING_PROFILES), width=150)
+        self.typing_menu.pack(side="left", padx=10)
+        
+        record_frame = ctk.CTkFrame(sys_frame, fg_color="transparent")
+        record_frame.pack(fill="x", padx=20, pady=5)
+        ctk.CTkLabel(record_frame, text="Diagnostics:", width=120, anchor="w").pack(side="left")
+        self.record_switch = ctk.CTkSwitch(record_frame, text="Record serial traffic")
+        self.record_switch.pack(side="left", padx=10)
+        self.load_config()
         
         if not self.is_locked:
             access_frame = ctk.CTkFrame(self)
@@ -41,7 +68,15 @@ class SettingsPanel(ctk.CTkFrame):
             
             ctk.CTkLabel(access_frame, text="Access Control (Authorized UIDs)", font=("Arial", 16, "bold")).pack(pady=10)
             
-            self.uid_listbox = ctk.CTkScrollableFrame(access_frame, height=150)
+            self.uid_search = ctk.CTkEntry(access_frame, placeholder_text="Search by last digits or full UID")
+            self.uid_search.pack(fill="x", padx=20, pady=(0, 5))
+            self.uid_search.bind("<KeyRelease>", self.filter_uids)
+            
+            self.uid_count_label = ctk.CTkLabel(access_frame, text="", text_color="gray")
+            self.uid_count_label.pack(padx=20, anchor="w")
+            
+            # Only the visible rows get widgets, so thousands of badges open instantly
+            self.uid_listbox = VirtualList(access_frame, self.render_uid_row, self.delete_uid, rows=6)
             self.uid_listbox.pack(fill="x", padx=20, pady=5)
             
             self.refresh_uid_list()
@@ -52,7 +87,15 @@ class SettingsPanel(ctk.CTkFrame):
             self.uid_entry = ctk.CTkEntry(add_frame, placeholder_text="Enter UID (e.g. 52A77A5C)")
             self.uid_entry.pack(side="left", fill="x", expand=True, padx=(0, 10))
             
+            self.expiry_entry = ctk.CTkEntry(add_frame, placeholder_text="Expires (YYYY-MM-DD, optional)", width=200)
+            self.expiry_entry.pack(side="left", padx=(0, 10))
+            
             ctk.CTkButton(add_frame, text="Add UID", width=100, command=self.add_uid).pack(side="right")
+            
+            csv_frame = ctk.CTkFrame(access_frame, fg_color="transparent")
+            csv_frame.pack(fill="x", padx=20, pady=(0, 10))
+            ctk.CTkButton(csv_frame, text="Import CSV", width=120, command=self.import_csv).pack(side="left")
+            ctk.CTkButton(csv_frame, text="Export CSV", width=120, command=self.export_csv).pack(side="left", padx=10)
         else:
             locked_frame = ctk.CTkFrame(self, fg_color="#2b2b2b")
             locked_frame.pack(fill="x", padx=20, pady=10)
@@ -63,20 +106,63 @@ class SettingsPanel(ctk.CTkFrame):
         
         ctk.CTkButton(self, text="Save Settings", command=self.save_all, fg_color="#2ecc71", hover_color="#27ae60", height=40).pack(pady=30)
 
+    def load_config(self):
+        """Fill the system fields from self.config"""
+        self.port_entry.delete(0, "end")
+        self.port_entry.insert(0, self.config.get("com_port", AUTO_PORT))
+        self.decks_entry.delete(0, "end")
+        decks = [(deck.get("id") or deck.get("port"), deck.get("port")) for deck in self.config.get("decks", [])]
+        if decks:
+            self.decks_entry.insert(0, format_deck_list(decks))
+        self.autolock_entry.delete(0, "end")
+        self.autolock_entry.insert(0, str(self.config.get("auto_lock_minutes", 15)))
+        self.typing_menu.set(self.config.get("typing_profile", DEFAULT_PROFILE))
+        if self.config.get("record_traffic"):
+            self.record_switch.select()
+        else:
+            self.record_switch.deselect()
+
     def refresh_uid_list(self):
         if self.is_locked:
             return
-            
-        for widget in self.uid_listbox.winfo_children():
-            widget.destroy()
-            
-        for uid in self.authorized_uids:
-            row = ctk.CTkFrame(self.uid_listbox, fg_color="transparent")
-            row.pack(fill="x", pady=2)
-            
-            ctk.CTkLabel(row, text=uid, anchor="w").pack(side="left", padx=10)
-            ctk.CTkButton(row, text="Delete", width=60, fg_color="#c0392b", hover_color="#e74c3c",
-                        command=lambda u=uid: self.delete_uid(u)).pack(side="right", padx=10)
+        self.uid_matches = [digest for digest in self.authorized_uids if self.uid_matches_query(digest, self.uid_query)]
+        self.uid_listbox.set_items(self.uid_matches)
+        self.update_uid_count()
+
+    def uid_matches_query(self, digest, query):
+        if not query:
+            return True
+        entry = self.authorized_uids.entries[digest]
+        return query in (entry.hint or "") or digest == self.query_digest
+
+    def filter_uids(self, event=None):
+        query = normalize_uid(self.uid_search.get())
+        if query == self.uid_query:
+            return
+        self.query_digest = self.authorized_uids.digest(query) if query else None
+        # A longer query can only narrow the matches, so filter the current ones
+        narrowing = self.uid_query and query.startswith(self.uid_query)
+        candidates = self.uid_matches if narrowing else list(self.authorized_uids)
+        self.uid_query = query
+        self.uid_matches = [digest for digest in candidates if self.uid_matches_query(digest, query)]
+        if narrowing and self.query_digest in self.authorized_uids.entries and self.query_digest not in self.uid_matches:
+            self.uid_matches.append(self.query_digest)
+        self.uid_listbox.set_items(self.uid_matches)
+        self.update_uid_count()
+
+    def update_uid_count(self):
+        shown = len(self.uid_matches)
+        total = len(self.authorized_uids)
+        self.uid_count_label.configure(text=f"{total} UIDs" if shown == total else f"{shown} of {total} UIDs")
+
+    def render_uid_row(self, digest):
+        # Only the masked hint is known; the raw UID is never stored
+        entry = self.authorized_uids.entries[digest]
+        if entry.expires_at is None:
+            return entry.hint or digest[:12], "", "gray"
+        if entry.expires_at <= time.time():
+            return entry.hint or digest[:12], "Expired " + format_expiry(entry.expires_at), "#c0392b"
+        return entry.hint or digest[:12], "Expires " + format_expiry(entry.expires_at), "gray"
 
     def add_uid(self):
         if self.is_locked:
@@ -85,27 +171,70 @@ class SettingsPanel(ctk.CTkFrame):
         uid = self.uid_entry.get().strip().upper()
         if not uid: return
         
-        if uid in self.authorized_uids:
-            messagebox.showwarning("Duplicate", "This UID is already authorized.")
+        try:
+            expires_at = parse_expiry(self.expiry_entry.get())
+        except ValueError:
+            messagebox.showerror("Invalid Input", "Expiry must be a date like 2025-12-31.")
             return
-            
-        self.authorized_uids.append(uid)
-        self.refresh_uid_list()
+        
+        digest = self.authorized_uids.digest(uid)
+        if self.authorized_uids.add(uid, expires_at):
+            # Newest entries sort last, so the row goes on the end of the view
+            if self.uid_matches_query(digest, self.uid_query):
+                self.uid_listbox.append(digest)
+        else:
+            messagebox.showinfo("Updated", "This UID was already authorized; its expiry was updated.")
+            self.uid_listbox.refresh(digest)
+        self.update_uid_count()
+        
         self.uid_entry.delete(0, "end")
+        self.expiry_entry.delete(0, "end")
         self.on_save_uids(self.authorized_uids)
 
-    def delete_uid(self, uid):
+    def delete_uid(self, digest):
         if self.is_locked:
             return
             
-        if uid in self.authorized_uids:
-            self.authorized_uids.remove(uid)
-            self.refresh_uid_list()
+        if self.authorized_uids.remove(digest):
+            self.uid_listbox.remove(digest)
+            self.update_uid_count()
             self.on_save_uids(self.authorized_uids)
 
+    def import_csv(self):
+        if self.is_locked:
+            return
+        path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path: return
+        
+        try:
+            added, skipped = self.authorized_uids.import_csv(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Import Failed", str(e))
+            return
+            
+        self.refresh_uid_list()
+        self.on_save_uids(self.authorized_uids)
+        messagebox.showinfo("Imported", f"Added {added} UIDs ({skipped} skipped).")
+
+    def export_csv(self):
+        if self.is_locked:
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
+        if not path: return
+        
+        try:
+            count = self.authorized_uids.export_csv(path)
+        except OSError as e:
+            messagebox.showerror("Export Failed", str(e))
+            return
+        messagebox.showinfo("Exported", f"Exported {count} UID hashes.")
+
     def save_all(self):
         new_config = self.config.copy()
         new_config["com_port"] = self.port_entry.get().strip()
+        new_config["typing_profile"] = self.typing_menu.get()
+        new_config["record_traffic"] = bool(self.record_switch.get())
+        new_config["decks"] = [{"id": deck_id, "port": port} for deck_id, port in parse_deck_list(self.decks_entry.get())]
         
         try:
             new_config["auto_lock_minutes"] = int(self.autolock_entry.get().strip())
@@ -114,6 +243,7 @@ class SettingsPanel(ctk.CTkFrame):
             return
             
         self.on_save_config(new_config)
+        self.config = new_config
         
         if not self.is_locked:
             self.on_save_uids(self.authorized_uids)
@@ -0,0 +1,334 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from vault_file import VaultFile
+from uid_allowlist import UidAllowlist, AllowEntry, make_pepper, read_pepper, write_pepper, PEPPER_FILE
+
+log = logging.getLogger(__name__)
+
+DATABASE_FILE = "orca_deck.db"
+SCHEMA_VERSION = 2
+DEFAULT_DECK = "default"
+
+# Page names as the deck knows them, and the mappings.json section that holds their labels
+PAGE_SECTIONS = {"app": "apps", "pass": "passwords"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS decks (deck_id TEXT PRIMARY KEY, port TEXT);
+CREATE TABLE IF NOT EXISTS slots (
+    deck_id TEXT NOT NULL,
+    page TEXT NOT NULL,
+    key TEXT NOT NULL,
+    label TEXT,
+    icon TEXT,
+    PRIMARY KEY (deck_id, page, key)
+);
+CREATE TABLE IF NOT EXISTS apps (
+    deck_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    target TEXT NOT NULL,
+    PRIMARY KEY (deck_id, key)
+);
+-- Plaintext UIDs from schema version 1; emptied by migrate_plain_uids
+CREATE TABLE IF NOT EXISTS uids (uid TEXT PRIMARY KEY, added_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS allowlist (
+    digest TEXT PRIMARY KEY,
+    hint TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS security (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS vault (
+    name TEXT PRIMARY KEY,
+    nonce BLOB NOT NULL,
+    tag BLOB NOT NULL,
+    ciphertext BLOB NOT NULL
+);
+"""
+
+class Storage:
+    """
+    Repository over a single SQLite database (WAL mode) holding config, deck
+    slot labels and icons, app targets, authorized UIDs, security answers and
+    vault records. Every edit is its own short transaction.
+    """
+    def __init__(self, data_dir, file_name=DATABASE_FILE):
+        self.path = os.path.join(data_dir, file_name)
+        self.pepper_path = os.path.join(data_dir, PEPPER_FILE)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('schema_version', ?) "
+                              "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (str(SCHEMA_VERSION),))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _query(self, sql, args=()):
+        with self.lock:
+            return self.conn.execute(sql, args).fetchall()
+
+    def _write(self, sql, args=()):
+        with self.lock, self.conn:
+            self.conn.execute(sql, args)
+
+    def _write_many(self, sql, rows):
+        with self.lock, self.conn:
+            self.conn.executemany(sql, rows)
+
+    # Meta
+
+    def get_meta(self, key, default=None):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0][0] if rows else default
+
+    def set_meta(self, key, value):
+        self._write("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def delete_meta(self, key):
+        self._write("DELETE FROM meta WHERE key = ?", (key,))
+
+    # Config
+
+    def load_config(self, default=None):
+        config = dict(default or {})
+        for key, value in self._query("SELECT key, value FROM config"):
+            config[key] = json.loads(value)
+        return config
+
+    def save_config(self, config):
+        """Upsert only the settings whose value changed"""
+        self._write_many(
+            "INSERT INTO config (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value WHERE value != excluded.value",
+            [(key, json.dumps(value)) for key, value in config.items()]
+        )
+
+    # Decks, slots and apps
+
+    def set_deck(self, deck_id, port):
+        self._write("INSERT INTO decks (deck_id, port) VALUES (?, ?) ON CONFLICT(deck_id) DO UPDATE SET port = excluded.port", (deck_id, port))
+
+    def list_decks(self):
+        return self._query("SELECT deck_id, port FROM decks ORDER BY deck_id")
+
+    def load_mappings(self, deck_id=DEFAULT_DECK):
+        """Labels and icons for a deck, shaped like mappings.json"""
+        mappings = {section: {} for section in PAGE_SECTIONS.values()}
+        mappings["icons"] = {page: {} for page in PAGE_SECTIONS}
+        for page, key, label, icon in self._query("SELECT page, key, label, icon FROM slots WHERE deck_id = ?", (deck_id,)):
+            if label is not None:
+                mappings[PAGE_SECTIONS[page]][key] = label
+            if icon:
+                mappings["icons"][page][key] = icon
+        return mappings
+
+    def save_labels(self, page, labels, deck_id=DEFAULT_DECK):
+        self._write_many(
+            "INSERT INTO slots (deck_id, page, key, label) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(deck_id, page, key) DO UPDATE SET label = excluded.label WHERE label IS NOT excluded.label",
+            [(deck_id, page, key, label) for key, label in labels.items()]
+        )
+
+    def save_icons(self, page, icons, deck_id=DEFAULT_DECK):
+        self._write_many(
+            "INSERT INTO slots (deck_id, page, key, icon) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(deck_id, page, key) DO UPDATE SET icon = excluded.icon WHERE icon IS NOT excluded.icon",
+            [(deck_id, page, key, icon) for key, icon in icons.items()]
+        )
+
+    def load_apps(self, deck_id=DEFAULT_DECK):
+        return dict(self._query("SELECT key, target FROM apps WHERE deck_id = ?", (deck_id,)))
+
+    def save_apps(self, apps, deck_id=DEFAULT_DECK):
+        self._write_many(
+            "INSERT INTO apps (deck_id, key, target) VALUES (?, ?, ?) "
+            "ON CONFLICT(deck_id, key) DO UPDATE SET target = excluded.target WHERE target != excluded.target",
+            [(deck_id, key, target) for key, target in apps.items()]
+        )
+
+    # UID allowlist
+
+    def uid_pepper(self):
+        """
+        Per-install HMAC key for UID hashes, created on first use. It lives in
+        its own key file, not in the database next to the digests; older
+        databases that kept it in meta have it moved out.
+        """
+        pepper = read_pepper(self.pepper_path)
+        legacy = self.get_meta("uid_pepper")
+        if pepper is None:
+            pepper = bytes.fromhex(legacy) if legacy else make_pepper()
+            write_pepper(self.pepper_path, pepper)
+        if legacy is not None:
+            with self.lock:
+                # Overwrite the freed page rather than leave the old value in the file
+                self.conn.execute("PRAGMA secure_delete = ON")
+            self.delete_meta("uid_pepper")
+        return pepper
+
+    def load_allowlist(self):
+        return {digest: AllowEntry(hint, added_at, expires_at)
+                for digest, hint, added_at, expires_at in self._query("SELECT digest, hint, added_at, expires_at FROM allowlist")}
+
+    def save_allowlist(self, entries):
+        """Make the table match entries, touching only rows that were added, changed or removed"""
+        current = self.load_allowlist()
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM allowlist WHERE digest = ?", [(digest,) for digest in current if digest not in entries])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO allowlist (digest, hint, added_at, expires_at) VALUES (?, ?, ?, ?)",
+                [(digest,) + tuple(entry) for digest, entry in entries.items() if current.get(digest) != entry]
+            )
+
+    def migrate_plain_uids(self, allowlist):
+        """Hash the plaintext uids rows into allowlist and the allowlist table, then delete them"""
+        rows = self._query("SELECT uid, added_at FROM uids")
+        if not rows:
+            return 0
+        for uid, added_at in rows:
+            allowlist.add(uid, added_at=added_at)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO allowlist (digest, hint, added_at, expires_at) VALUES (?, ?, ?, ?)",
+                [(digest,) + tuple(entry) for digest, entry in allowlist.entries.items()]
+            )
+            self.conn.execute("DELETE FROM uids")
+        return len(rows)
+
+    # Security answers
+
+    def load_security(self):
+        return {key: json.loads(value) for key, value in self._query("SELECT key, value FROM security")}
+
+    def save_security(self, data):
+        self._write_many(
+            "INSERT INTO security (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(key, json.dumps(value)) for key, value in data.items()]
+        )
+
+    # One-shot import of the JSON assets
+
+    def import_json_assets(self, data_dir, default_mappings=None):
+        """
+        Copy config.json, apps.json, mappings.json, authorized_uids.json,
+        security_data.json and passwords.vault into the database, in one transaction.
+        Runs once; the JSON files are left in place as a backup.
+        """
+        if self.get_meta("json_imported"):
+            return False
+
+        def read(name, default):
+            path = os.path.join(data_dir, name)
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r') as f:
+                        return json.load(f)
+                except:
+                    pass
+            return default
+
+        config = read("config.json", {})
+        apps = read("apps.json", {})
+        mappings = read("mappings.json", default_mappings or {})
+        uids = read("authorized_uids.json", [])
+        if isinstance(uids, dict) and uids.get("pepper") and read_pepper(self.pepper_path) is None and self.get_meta("uid_pepper") is None:
+            # Already-hashed file from a previous install; its hashes need its pepper
+            write_pepper(self.pepper_path, bytes.fromhex(uids["pepper"]))
+        allowlist = UidAllowlist(self.uid_pepper())
+        if isinstance(uids, dict):
+            for entry in uids.get("entries", []):
+                allowlist.add_digest(entry["hash"], entry.get("hint", ""), entry.get("expires_at"), entry.get("added_at"))
+        else:
+            for uid in uids:
+                allowlist.add(uid)
+        security = read("security_data.json", {})
+
+        vault_path = os.path.join(data_dir, "passwords.vault")
+        vault_records = {}
+        vault_key_id = None
+        if os.path.exists(vault_path):
+            source = VaultFile(vault_path)
+            try:
+                source.open()
+                vault_records = source.read_all()
+                vault_key_id = source.key_id
+            except ValueError as e:
+                log.warning(f"Skipping vault import: {e}")
+            finally:
+                source.close()
+
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)",
+                                  [(key, json.dumps(value)) for key, value in config.items()])
+            self.conn.executemany("INSERT OR REPLACE INTO apps (deck_id, key, target) VALUES (?, ?, ?)",
+                                  [(DEFAULT_DECK, key, target) for key, target in apps.items()])
+            for page, section in PAGE_SECTIONS.items():
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO slots (deck_id, page, key, label, icon) VALUES (?, ?, ?, ?, ?)",
+                    [(DEFAULT_DECK, page, key, label, mappings.get("icons", {}).get(page, {}).get(key))
+                     for key, label in mappings.get(section, {}).items()]
+                )
+            self.conn.executemany("INSERT OR IGNORE INTO allowlist (digest, hint, added_at, expires_at) VALUES (?, ?, ?, ?)",
+                                  [(digest,) + tuple(entry) for digest, entry in allowlist.entries.items()])
+            self.conn.executemany("INSERT OR REPLACE INTO security (key, value) VALUES (?, ?)",
+                                  [(key, json.dumps(value)) for key, value in security.items()])
+            self.conn.executemany("INSERT OR REPLACE INTO vault (name, nonce, tag, ciphertext) VALUES (?, ?, ?, ?)",
+                                  [(name, bytes(n), bytes(t), bytes(c)) for name, (n, t, c) in vault_records.items()])
+            if vault_key_id:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('vault_key_id', ?)", (vault_key_id.hex(),))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)", (str(now),))
+        log.info("Imported JSON assets into the database")
+        return True
+
+class VaultTable:
+    """Vault record store backed by the vault table; same interface PasswordVault uses on VaultFile"""
+    def __init__(self, storage):
+        self.storage = storage
+        self.index = {}
+        self.key_id = None
+
+    def exists(self):
+        return bool(self.index) or self.key_id is not None
+
+    def open(self):
+        self.index = {name: None for (name,) in self.storage._query("SELECT name FROM vault")}
+        key_id = self.storage.get_meta("vault_key_id")
+        self.key_id = bytes.fromhex(key_id) if key_id else None
+
+    def close(self):
+        pass
+
+    def read(self, name):
+        rows = self.storage._query("SELECT nonce, tag, ciphertext FROM vault WHERE name = ?", (name,))
+        if not rows:
+            raise KeyError(name)
+        return rows[0]
+
+    def read_all(self):
+        return {name: (nonce, tag, ct) for name, nonce, tag, ct in self.storage._query("SELECT name, nonce, tag, ciphertext FROM vault")}
+
+    def append(self, puts, deletes, key_id):
+        storage = self.storage
+        with storage.lock, storage.conn:
+            storage.conn.executemany("DELETE FROM vault WHERE name = ?", [(name,) for name in deletes])
+            storage.conn.executemany("INSERT OR REPLACE INTO vault (name, nonce, tag, ciphertext) VALUES (?, ?, ?, ?)",
+                                     [(name, bytes(n), bytes(t), bytes(c)) for name, (n, t, c) in puts.items()])
+            if key_id and key_id != self.key_id:
+                storage.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('vault_key_id', ?)", (key_id.hex(),))
+        for name in deletes:
+            self.index.pop(name, None)
+        for name in puts:
+            self.index[name] = None
+        if key_id:
+            self.key_id = key_id
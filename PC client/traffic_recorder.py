@@ -0,0 +1,115 @@
+import collections
+import json
+import os
+import struct
+import threading
+import time
+from log_config import redact_line
+
+TRACE_MAGIC = b"ORCATRC1"
+TRACE_EXTENSION = ".orcatrace"
+RING_SIZE = 65536
+FLUSH_INTERVAL = 0.5
+# Record header: wall-clock time, direction, payload length
+RECORD = struct.Struct("<dBI")
+RX = 0
+TX = 1
+
+Record = collections.namedtuple("Record", "time direction data")
+
+class TrafficRecorder:
+    """
+    Timestamped log of one serial link. Received lines and written bytes go
+    into a bounded ring buffer (a deque append on the serial threads) and a
+    background thread packs and appends them to the file every FLUSH_INTERVAL.
+    If the flusher falls behind, the oldest records are dropped and counted,
+    so recording never blocks the link.
+
+    File layout: TRACE_MAGIC, a 2-byte length and JSON metadata, then records
+    of RECORD followed by the payload. Received data is stored per line (UIDs
+    redacted); written data is stored as sent, frames included.
+    """
+    def __init__(self, path, meta=None, ring_size=RING_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.ring = collections.deque(maxlen=ring_size)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.stop_event = threading.Event()
+
+        header = json.dumps(dict(meta or {}, started_at=time.time())).encode('utf-8')
+        self.file = open(path, 'wb')
+        self.file.write(TRACE_MAGIC + struct.pack("<H", len(header)) + header)
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def record_line(self, line):
+        # Badge UIDs are masked as in the log; only the last digits are kept
+        self._append(RX, redact_line(line).encode('utf-8'))
+
+    def record_tx(self, data):
+        self._append(TX, bytes(data))
+
+    def _append(self, direction, data):
+        if len(self.ring) == self.ring.maxlen:
+            self.dropped += 1
+        self.ring.append((time.time(), direction, data))
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+        self.file.close()
+
+    def flush(self):
+        chunk = bytearray()
+        count = 0
+        while True:
+            try:
+                stamp, direction, data = self.ring.popleft()
+            except IndexError:
+                break
+            chunk += RECORD.pack(stamp, direction, len(data)) + data
+            count += 1
+        if chunk:
+            self.file.write(chunk)
+            self.file.flush()
+            self.written += count
+            self.bytes_written += len(chunk)
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+
+    def stats(self):
+        return {"path": self.path, "records": self.written, "bytes": self.bytes_written,
+                "pending": len(self.ring), "dropped": self.dropped}
+
+def read_trace(path):
+    """Returns (metadata, list of Record)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(TRACE_MAGIC):
+        raise ValueError(f"{os.path.basename(path)} is not a traffic trace")
+    offset = len(TRACE_MAGIC)
+    (header_len,) = struct.unpack_from("<H", data, offset)
+    offset += 2
+    meta = json.loads(data[offset:offset + header_len])
+    offset += header_len
+
+    records = []
+    while offset + RECORD.size <= len(data):
+        stamp, direction, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + length > len(data):
+            # Cut off mid-record by a crash; keep what is whole
+            break
+        records.append(Record(stamp, direction, data[offset:offset + length]))
+        offset += length
+    return meta, records
+
+def trace_path(directory, deck_id):
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in deck_id)
+    return os.path.join(directory, f"traffic_{safe_id}_{stamp}{TRACE_EXTENSION}")
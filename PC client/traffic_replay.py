@@ -0,0 +1,115 @@
+"""
+Replay a recorded serial session (see traffic_recorder.py) into the PC client.
+
+Run from the PC client folder:
+    python traffic_replay.py capture.orcatrace               # original timing
+    python traffic_replay.py capture.orcatrace --fast -n 20  # as fast as possible, 20 times over
+    python traffic_replay.py capture.orcatrace --dump        # print the session
+
+Received lines are fed to OrcaDeckApp.handle_serial_message from a background
+thread, as the serial reader would, and the run reports how long the app
+took to work through them. Bursts replay with their original spacing unless
+--fast or --speed is given. Anything the app sends in reply goes to the
+configured decks, so replay with no deck attached. Badge UIDs are redacted
+in traces, so replayed card taps are always refused.
+"""
+import sys
+import time
+import argparse
+import threading
+from traffic_recorder import read_trace, RX
+from log_config import configure_logging
+
+def received_lines(records):
+    return [(record.time, record.data.decode('utf-8', errors='ignore')) for record in records if record.direction == RX]
+
+def replay(lines, handle, deck_id, speed=1.0):
+    """
+    Feed (time, line) pairs to handle(deck_id, line). speed scales the original
+    gaps (2.0 is twice as fast); 0 sends without waiting.
+    Returns the seconds spent feeding.
+    """
+    started = time.perf_counter()
+    if not lines:
+        return 0.0
+    first = lines[0][0]
+    for stamp, line in lines:
+        if speed:
+            delay = (stamp - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        handle(deck_id, line)
+    return time.perf_counter() - started
+
+def dump(meta, records):
+    print(f"# deck {meta.get('deck_id')} on {meta.get('port')}, {len(records)} records")
+    if not records:
+        return
+    first = records[0].time
+    for record in records:
+        arrow = "<" if record.direction == RX else ">"
+        try:
+            text = record.data.decode('utf-8').rstrip("\n")
+            if not text.isprintable():
+                raise ValueError
+        except ValueError:
+            text = f"[{len(record.data)} bytes] {record.data[:16].hex()}"
+        print(f"{record.time - first:10.3f} {arrow} {text}")
+
+def replay_into_app(lines, deck_id, speed, repeat):
+    from orca_deck_app import OrcaDeckApp
+    app = OrcaDeckApp()
+    fed = threading.Event()
+    result = {}
+
+    def feed():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            replay(lines, app.handle_serial_message, deck_id, speed)
+        result["feed_seconds"] = time.perf_counter() - started
+        result["started"] = started
+        fed.set()
+
+    def check():
+        # Done once everything was fed and the Tk side has drained its inbox
+        with app.serial_inbox_lock:
+            drained = not app.serial_inbox and not app.serial_drain_scheduled
+        if fed.is_set() and drained:
+            total = time.perf_counter() - result["started"]
+            count = len(lines) * repeat
+            print(f"Replayed {count} lines in {total:.3f} s ({count / total:.0f} lines/s, feeding took {result['feed_seconds']:.3f} s)")
+            app.quit_app()
+            return
+        app.after(10, check)
+
+    threading.Thread(target=feed, daemon=True).start()
+    app.after(10, check)
+    app.run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an ORCA DECK traffic trace")
+    parser.add_argument("trace")
+    parser.add_argument("--speed", type=float, default=1.0, help="multiplier on the original timing")
+    parser.add_argument("--fast", action="store_true", help="no waiting between lines")
+    parser.add_argument("-n", "--repeat", type=int, default=1, help="replay the session this many times")
+    parser.add_argument("--deck", help="deck id to attribute the lines to (default: the recorded one)")
+    parser.add_argument("--dump", action="store_true", help="print the trace instead of replaying it")
+    args = parser.parse_args()
+
+    try:
+        meta, records = read_trace(args.trace)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    if args.dump:
+        dump(meta, records)
+        return 0
+
+    configure_logging()
+    lines = received_lines(records)
+    replay_into_app(lines, args.deck or meta.get("deck_id", "default"), 0 if args.fast else args.speed, args.repeat)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
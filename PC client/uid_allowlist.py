@@ -0,0 +1,234 @@
+import csv
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import datetime
+from persistence import atomic_write
+
+log = logging.getLogger(__name__)
+
+PEPPER_BYTES = 32
+# Kept apart from the digests: with the pepper beside them, the hint's known digits leave little to guess
+PEPPER_FILE = "uid_pepper.key"
+# Two hex digits: enough to tell badges apart in a list, too few to narrow a 4-byte UID down much
+HINT_CHARS = 2
+CSV_FIELDS = ("uid", "uid_hash", "hint", "expires")
+
+AllowEntry = namedtuple("AllowEntry", "hint added_at expires_at")
+
+def normalize_uid(uid):
+    """Upper-case hex with separators removed, as the deck prints it"""
+    return "".join(uid.split()).replace(":", "").upper()
+
+def uid_hint(uid):
+    """Masked form for display: only the last few characters are kept"""
+    uid = normalize_uid(uid)
+    return "•" * max(len(uid) - HINT_CHARS, 0) + uid[-HINT_CHARS:]
+
+def make_pepper():
+    return os.urandom(PEPPER_BYTES)
+
+def read_pepper(path):
+    """The pepper in path, or None if there is no (complete) key file"""
+    try:
+        with open(path, 'rb') as f:
+            pepper = f.read()
+    except OSError:
+        return None
+    return pepper if len(pepper) == PEPPER_BYTES else None
+
+def write_pepper(path, pepper):
+    atomic_write(path, pepper)
+    try:
+        os.chmod(path, 0o600)
+    except OSError:
+        pass
+
+def shorten_hint(hint):
+    """Re-mask a hint stored when hints kept more digits"""
+    if not hint:
+        return hint
+    masked = len(hint) - len(hint.lstrip("•"))
+    visible = len(hint) - masked
+    if visible <= HINT_CHARS:
+        return hint
+    return "•" * (len(hint) - HINT_CHARS) + hint[-HINT_CHARS:]
+
+def parse_expiry(text):
+    """'' -> None, otherwise an ISO date or datetime -> unix time"""
+    text = (text or "").strip()
+    if not text:
+        return None
+    return datetime.fromisoformat(text).timestamp()
+
+def format_expiry(expires_at):
+    if expires_at is None:
+        return ""
+    return datetime.fromtimestamp(expires_at).isoformat(sep=" ", timespec="minutes")
+
+class UidAllowlist:
+    """
+    Authorized badge UIDs kept as HMAC-SHA256 digests keyed with a per-install
+    pepper, so raw UIDs are never stored. Lookup is one HMAC and a dict probe.
+    Entries may carry an expiry; expired entries stop matching but stay listed
+    until removed.
+    """
+    def __init__(self, pepper, entries=None):
+        self.pepper = pepper
+        self.entries = dict(entries or {})
+
+    def digest(self, uid):
+        return hmac.new(self.pepper, normalize_uid(uid).encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def is_authorized(self, uid, now=None):
+        entry = self.entries.get(self.digest(uid))
+        if entry is None:
+            return False
+        return entry.expires_at is None or entry.expires_at > (now or time.time())
+
+    def __contains__(self, uid):
+        return self.is_authorized(uid)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.sorted_digests())
+
+    def sorted_digests(self):
+        return sorted(self.entries, key=lambda digest: (self.entries[digest].added_at, digest))
+
+    def add(self, uid, expires_at=None, added_at=None):
+        """Returns False if the UID was already listed (its expiry is still updated)"""
+        uid = normalize_uid(uid)
+        if not uid:
+            return False
+        digest = self.digest(uid)
+        existing = self.entries.get(digest)
+        if existing:
+            added_at = existing.added_at
+        self.entries[digest] = AllowEntry(uid_hint(uid), added_at or time.time(), expires_at)
+        return existing is None
+
+    def add_digest(self, digest, hint, expires_at=None, added_at=None):
+        if digest in self.entries:
+            return False
+        self.entries[digest] = AllowEntry(hint, added_at or time.time(), expires_at)
+        return True
+
+    def remove(self, digest):
+        return self.entries.pop(digest, None) is not None
+
+    def remove_uid(self, uid):
+        return self.remove(self.digest(uid))
+
+    def expired(self, now=None):
+        now = now or time.time()
+        return [digest for digest, entry in self.entries.items()
+                if entry.expires_at is not None and entry.expires_at <= now]
+
+    def snapshot(self):
+        return dict(self.entries)
+
+    # CSV bulk import/export
+
+    def import_csv(self, path):
+        """
+        Rows may give a raw `uid` or a `uid_hash` exported from this install,
+        plus an optional `expires` date. A header row is optional; without one
+        the columns are uid, expires.
+        Returns (added, skipped).
+        """
+        added = skipped = 0
+        with open(path, newline='') as f:
+            rows = list(csv.reader(f))
+        if not rows:
+            return 0, 0
+
+        header = [cell.strip().lower() for cell in rows[0]]
+        if set(header) & set(CSV_FIELDS):
+            rows = rows[1:]
+        else:
+            header = ["uid", "expires"]
+
+        for row in rows:
+            record = dict(zip(header, (cell.strip() for cell in row)))
+            try:
+                expires_at = parse_expiry(record.get("expires"))
+            except ValueError:
+                skipped += 1
+                continue
+            if record.get("uid"):
+                is_new = self.add(record["uid"], expires_at)
+            elif record.get("uid_hash"):
+                is_new = self.add_digest(record["uid_hash"].lower(), record.get("hint", ""), expires_at)
+            else:
+                is_new = False
+            if is_new:
+                added += 1
+            else:
+                skipped += 1
+        return added, skipped
+
+    def export_csv(self, path):
+        """Writes hashes and hints only; the hashes are only valid with this install's pepper"""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(("uid_hash", "hint", "expires"))
+            for digest in self.sorted_digests():
+                entry = self.entries[digest]
+                writer.writerow((digest, entry.hint, format_expiry(entry.expires_at)))
+        return len(self.entries)
+
+    # JSON form used for authorized_uids.json once it has been migrated
+
+    def to_json(self):
+        # The pepper stays in its key file
+        return {
+            "entries": [{"hash": digest, "hint": self.entries[digest].hint,
+                         "added_at": self.entries[digest].added_at, "expires_at": self.entries[digest].expires_at}
+                        for digest in self.sorted_digests()]
+        }
+
+def open_allowlist(storage, json_path=None):
+    """
+    Load the allowlist from storage, hashing any plaintext UIDs left by older
+    versions (the uids table and authorized_uids.json) in place.
+    """
+    allowlist = UidAllowlist(storage.uid_pepper(), storage.load_allowlist())
+
+    migrated = storage.migrate_plain_uids(allowlist)
+
+    shortened = 0
+    for digest, entry in list(allowlist.entries.items()):
+        hint = shorten_hint(entry.hint)
+        if hint != entry.hint:
+            allowlist.entries[digest] = entry._replace(hint=hint)
+            shortened += 1
+    if shortened:
+        storage.save_allowlist(allowlist.snapshot())
+
+    if json_path and os.path.exists(json_path):
+        try:
+            with open(json_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if isinstance(data, list):
+            for uid in data:
+                if isinstance(uid, str) and allowlist.add(uid):
+                    migrated += 1
+            storage.save_allowlist(allowlist.snapshot())
+            atomic_write(json_path, json.dumps(allowlist.to_json()))
+            log.info(f"Hashed {len(data)} UIDs in {os.path.basename(json_path)}")
+        elif isinstance(data, dict) and ("pepper" in data or shortened):
+            # Written by a version that kept the pepper and longer hints in this file
+            atomic_write(json_path, json.dumps(allowlist.to_json()))
+
+    if migrated:
+        log.info(f"Migrated {migrated} plaintext UIDs to the hashed allowlist")
+    return allowlist
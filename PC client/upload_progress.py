@@ -0,0 +1,55 @@
+import customtkinter as ctk
+
+POLL_MS = 100
+
+class UploadProgress(ctk.CTkFrame):
+    """
+    Progress bar, transfer rate and Cancel button for an IconUpload.
+    The upload runs on the serial writer thread, so this polls it from the Tk
+    loop instead of taking callbacks from that thread.
+    """
+    def __init__(self, parent, upload, **kwargs):
+        super().__init__(parent, fg_color="transparent", **kwargs)
+        self.upload = upload
+
+        self.bar = ctk.CTkProgressBar(self, width=250)
+        self.bar.set(0)
+        self.bar.pack(pady=(0, 5))
+        self.status_label = ctk.CTkLabel(self, text="Queued...", text_color="gray")
+        self.status_label.pack()
+        self.cancel_button = ctk.CTkButton(self, text="Cancel", width=80, fg_color="#c0392b", hover_color="#e74c3c",
+                                           command=self.cancel)
+        self.cancel_button.pack(pady=5)
+
+        self.poll()
+
+    def cancel(self):
+        self.upload.cancel()
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text="Cancelling...")
+
+    def poll(self):
+        if not self.winfo_exists():
+            return
+        upload = self.upload
+        if upload.total:
+            self.bar.set(upload.acked / upload.total)
+
+        if upload.state == upload.DONE:
+            self.bar.set(1)
+            self.status_label.configure(text="✅ Icon on deck", text_color="#2ecc71")
+        elif upload.state == upload.CANCELLED:
+            self.status_label.configure(text="Upload cancelled", text_color="gray")
+        elif upload.state == upload.FAILED:
+            self.status_label.configure(text="❌ Upload failed", text_color="#c0392b")
+        else:
+            if upload.state == upload.INTERRUPTED:
+                # The same upload object is resumed after a reconnect, so keep watching it
+                self.status_label.configure(text=f"Interrupted at {upload.acked}/{upload.total} bytes; resumes on reconnect",
+                                            text_color="#e67e22")
+            elif upload.state == upload.SENDING:
+                rate = upload.bytes_per_second() / 1024
+                self.status_label.configure(text=f"{upload.acked}/{upload.total} bytes · {rate:.1f} KB/s", text_color="gray")
+            self.after(POLL_MS, self.poll)
+            return
+        self.cancel_button.pack_forget()
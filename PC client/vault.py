@@ -0,0 +1,159 @@
+import base64
+import json
+import logging
+import os
+import threading
+from collections.abc import MutableMapping
+
+log = logging.getLogger(__name__)
+
+class PasswordVault(MutableMapping):
+    """
+    Password store where every entry is its own AES-GCM record.
+    store holds the encrypted records: a binary vault_file.VaultFile or a
+    storage.VaultTable, both exposing index/read/append.
+    Records are indexed without decrypting; an entry is decrypted the first time
+    it is read, and a save writes only the entries changed since the last one.
+    A JSON vault at legacy_path (per-entry records, the old single-blob package,
+    or plaintext) is imported on first save and renamed to *.migrated.
+    """
+    def __init__(self, encryption_manager, store, legacy_path=None):
+        self.encryption_manager = encryption_manager
+        self.legacy_path = legacy_path
+        self.store = store
+        # save() may run on the write-behind thread while the UI edits entries
+        self.mutex = threading.RLock()
+        self.load()
+
+    def load(self):
+        self.cache = {}
+        self.dirty = set()
+        self.deleted = set()
+        self.imported = {}
+        self.legacy_package = None
+        self.migrating = False
+
+        try:
+            self.store.open()
+        except ValueError as e:
+            log.error(f"Error loading vault: {e}")
+
+        if not self.store.exists() and self.legacy_path and os.path.exists(self.legacy_path):
+            self._load_legacy_json()
+
+        key_id = self.encryption_manager.key_id()
+        if self.store.exists() and key_id and key_id != self.store.key_id:
+            log.warning("Vault was written with a different master key")
+
+    def _load_legacy_json(self):
+        try:
+            with open(self.legacy_path, 'r') as f:
+                data = json.load(f)
+        except:
+            return
+        if not data:
+            return
+
+        self.migrating = True
+        if "records" in data:
+            for name, record in data["records"].items():
+                self.imported[name] = tuple(base64.b64decode(record[field]) for field in ("nonce", "tag", "ciphertext"))
+        elif "ciphertext" in data:
+            # Whole-dict blob from before per-entry records; decrypted once the key is available
+            self.legacy_package = data
+        else:
+            # Legacy plaintext file
+            self.cache = dict(data)
+            self.dirty = set(data)
+
+    def _migrate_legacy(self):
+        if self.legacy_package is None or not self.encryption_manager.master_key:
+            return
+        decrypted = self.encryption_manager.decrypt_data(self.legacy_package)
+        self.legacy_package = None
+        if isinstance(decrypted, dict):
+            self.cache.update(decrypted)
+            self.dirty.update(decrypted)
+
+    def _record(self, key):
+        if key in self.imported:
+            return self.imported[key]
+        if key in self.store.index:
+            return self.store.read(key)
+        return None
+
+    def __getitem__(self, key):
+        if key in self.cache:
+            return self.cache[key]
+        self._migrate_legacy()
+        if key in self.cache:
+            return self.cache[key]
+        record = self._record(key)
+        if record is None or not self.encryption_manager.master_key:
+            raise KeyError(key)
+
+        value = self.encryption_manager.decrypt_record(key, record)
+        if value is None:
+            raise KeyError(key)
+        self.cache[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        with self.mutex:
+            self.cache[key] = value
+            self.dirty.add(key)
+            self.deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        with self.mutex:
+            self.cache.pop(key, None)
+            self.imported.pop(key, None)
+            self.dirty.discard(key)
+            self.deleted.add(key)
+
+    def _keys(self):
+        self._migrate_legacy()
+        return (set(self.store.index) | set(self.imported) | set(self.cache)) - self.deleted
+
+    def __contains__(self, key):
+        if key in self.deleted:
+            return False
+        self._migrate_legacy()
+        return key in self.cache or key in self.imported or key in self.store.index
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def lock(self):
+        """Forget every decrypted entry; unsaved changes are encrypted first"""
+        with self.mutex:
+            if self.dirty and self.encryption_manager.master_key:
+                self.save()
+            self.cache = {key: value for key, value in self.cache.items() if key in self.dirty}
+
+    def save(self):
+        """Encrypt the entries changed since the last save and append them to the vault file"""
+        with self.mutex:
+            self._migrate_legacy()
+            puts = dict(self.imported)
+            for key in self.dirty:
+                puts[key] = self.encryption_manager.encrypt_record(key, self.cache[key])
+            deletes = {key for key in self.deleted if key in self.store.index}
+
+            if puts or deletes or self.migrating:
+                self.store.append(puts, deletes, self.encryption_manager.key_id())
+            self.dirty.clear()
+            self.deleted.clear()
+            self.imported.clear()
+
+            if self.migrating:
+                self.migrating = False
+                try:
+                    os.replace(self.legacy_path, self.legacy_path + ".migrated")
+                except OSError as e:
+                    log.warning(f"Could not rename migrated vault: {e}")
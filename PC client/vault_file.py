@@ -0,0 +1,149 @@
+import mmap
+import os
+import struct
+
+# Layout of passwords.vault:
+#   header:  magic "ORCV" | version (u8) | flags (u8) | key id (8 bytes)
+#   records: op (u8) | name length (u16) | ciphertext length (u32) | name | [nonce (16) | tag (16) | ciphertext]
+# Records are appended; the last PUT for a name wins and a DELETE removes it.
+MAGIC = b"ORCV"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBB8s")
+RECORD = struct.Struct("<BHI")
+OP_PUT = 1
+OP_DELETE = 2
+NONCE_SIZE = 16
+TAG_SIZE = 16
+
+# Rewrite the file once superseded records make up more than this share of it
+COMPACT_RATIO = 0.5
+
+class VaultFile:
+    """Append-only binary container for encrypted vault records, read through a memory map"""
+    def __init__(self, path):
+        self.path = path
+        self.map = None
+        self.index = {}
+        self.key_id = None
+        self.size = 0
+        self.live_bytes = 0
+
+    def exists(self):
+        return self.size > 0
+
+    def open(self):
+        self.close()
+        self.index = {}
+        self.key_id = None
+        self.size = 0
+        self.live_bytes = 0
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < HEADER.size:
+            return
+
+        self._map()
+        magic, version, _, key_id = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{self.path} is not a version {FORMAT_VERSION} vault file")
+        self.key_id = key_id
+
+        offset = HEADER.size
+        end_of_file = len(self.map)
+        while offset + RECORD.size <= end_of_file:
+            op, name_len, ct_len = RECORD.unpack_from(self.map, offset)
+            body = offset + RECORD.size
+            end = body + name_len
+            if op == OP_PUT:
+                end += NONCE_SIZE + TAG_SIZE + ct_len
+            if end > end_of_file or op not in (OP_PUT, OP_DELETE):
+                # Torn tail from an interrupted append; it is cut off by the next write
+                break
+            self._index_record(op, self.map[body:body + name_len].decode('utf-8'), body + name_len, ct_len, end - offset)
+            offset = end
+        self.size = offset
+
+    def _map(self):
+        self.close()
+        with open(self.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _index_record(self, op, name, data_offset, ct_len, length):
+        if name in self.index:
+            self.live_bytes -= self.index[name][2]
+        if op == OP_PUT:
+            self.index[name] = (data_offset, ct_len, length)
+            self.live_bytes += length
+        else:
+            self.index.pop(name, None)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def read(self, name):
+        """Return (nonce, tag, ciphertext) for name, sliced straight out of the map"""
+        offset, ct_len, _ = self.index[name]
+        tag_at = offset + NONCE_SIZE
+        ct_at = tag_at + TAG_SIZE
+        return self.map[offset:tag_at], self.map[tag_at:ct_at], self.map[ct_at:ct_at + ct_len]
+
+    def read_all(self):
+        return {name: self.read(name) for name in self.index}
+
+    @staticmethod
+    def _encode(op, name, record=None):
+        name_bytes = name.encode('utf-8')
+        if op == OP_DELETE:
+            return RECORD.pack(op, len(name_bytes), 0) + name_bytes
+        nonce, tag, ciphertext = record
+        return RECORD.pack(op, len(name_bytes), len(ciphertext)) + name_bytes + bytes(nonce) + bytes(tag) + bytes(ciphertext)
+
+    def append(self, puts, deletes, key_id):
+        """Append changed and deleted entries; the rest of the file is not touched"""
+        if not self.exists() or key_id != self.key_id:
+            records = self.read_all() if self.exists() else {}
+            records.update(puts)
+            for name in deletes:
+                records.pop(name, None)
+            self.rewrite(records, key_id)
+            return
+
+        entries = [(OP_DELETE, name, None) for name in deletes]
+        entries.extend((OP_PUT, name, record) for name, record in puts.items())
+        chunks = [self._encode(op, name, record) for op, name, record in entries]
+        self.close()
+        with open(self.path, 'r+b') as f:
+            f.seek(self.size)
+            f.truncate()
+            f.write(b"".join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Index only what was just written instead of rescanning the whole file
+        offset = self.size
+        for (op, name, record), chunk in zip(entries, chunks):
+            data_offset = offset + RECORD.size + len(name.encode('utf-8'))
+            ct_len = len(record[2]) if record else 0
+            self._index_record(op, name, data_offset, ct_len, len(chunk))
+            offset += len(chunk)
+        self.size = offset
+        self._map()
+
+        if self.size - HEADER.size > 0 and self.live_bytes < (self.size - HEADER.size) * (1 - COMPACT_RATIO):
+            self.rewrite(self.read_all(), key_id)
+
+    def rewrite(self, records, key_id):
+        """Write a compacted file holding exactly records, replacing the old one atomically"""
+        chunks = [HEADER.pack(MAGIC, FORMAT_VERSION, 0, key_id or bytes(8))]
+        chunks.extend(self._encode(OP_PUT, name, record) for name, record in records.items())
+        payload = b"".join(chunks)
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(temp_path, self.path)
+        self.open()
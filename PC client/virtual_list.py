@@ -0,0 +1,116 @@
+import customtkinter as ctk
+
+class VirtualList(ctk.CTkFrame):
+    """
+    Scrollable list that only has widgets for the rows on screen.
+    A fixed pool of rows is re-bound to whichever items are in view, so the
+    cost of showing or scrolling does not depend on how many items there are.
+    render_row(item) returns (text, detail, detail_color); on_delete(item) is
+    called from a row's Delete button.
+    """
+    def __init__(self, parent, render_row, on_delete, rows=8, row_height=32, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.render_row = render_row
+        self.on_delete = on_delete
+        self.row_count = rows
+        self.items = []
+        self.top = 0
+
+        self.body = ctk.CTkFrame(self, fg_color="transparent", height=rows * row_height)
+        self.body.pack(side="left", fill="both", expand=True)
+        self.body.pack_propagate(False)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.empty_label = ctk.CTkLabel(self.body, text="No entries", text_color="gray")
+        self.pool = [self._make_row(row_height) for _ in range(rows)]
+
+        for widget in [self, self.body] + [part for row in self.pool for part in row[:3]]:
+            widget.bind("<MouseWheel>", self._on_wheel)
+            widget.bind("<Button-4>", lambda e: self.scroll_by(-1))
+            widget.bind("<Button-5>", lambda e: self.scroll_by(1))
+
+    def _make_row(self, row_height):
+        frame = ctk.CTkFrame(self.body, fg_color="transparent", height=row_height)
+        text = ctk.CTkLabel(frame, text="", anchor="w")
+        text.pack(side="left", padx=10)
+        detail = ctk.CTkLabel(frame, text="", text_color="gray")
+        detail.pack(side="left", padx=10)
+        button = ctk.CTkButton(frame, text="Delete", width=60, fg_color="#c0392b", hover_color="#e74c3c")
+        button.pack(side="right", padx=10)
+        # Last item bound to the row, so unchanged rows are not reconfigured
+        return [frame, text, detail, button, None]
+
+    # Item updates
+
+    def set_items(self, items):
+        self.items = items
+        self._render()
+
+    def append(self, item):
+        self.items.append(item)
+        self._render()
+
+    def remove(self, item):
+        try:
+            self.items.remove(item)
+        except ValueError:
+            return
+        self._render()
+
+    def refresh(self, item):
+        """Re-render an item whose contents changed, if it is on screen"""
+        for row in self.pool:
+            if row[4] == item:
+                row[4] = None
+        self._render()
+
+    # Scrolling
+
+    def scroll_by(self, rows):
+        self.top += rows
+        self._render()
+
+    def _on_wheel(self, event):
+        self.scroll_by(-1 if event.delta > 0 else 1)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = int(float(amount) * len(self.items))
+        elif unit == "pages":
+            self.top += int(amount) * self.row_count
+        else:
+            self.top += int(amount)
+        self._render()
+
+    def _render(self):
+        self.top = max(0, min(self.top, len(self.items) - self.row_count))
+        if self.items:
+            self.empty_label.place_forget()
+        else:
+            self.empty_label.place(relx=0.5, rely=0.5, anchor="center")
+
+        for index, row in enumerate(self.pool):
+            frame, text, detail, button, bound = row
+            position = self.top + index
+            if position >= len(self.items):
+                if bound is not None:
+                    frame.pack_forget()
+                    row[4] = None
+                continue
+
+            item = self.items[position]
+            if bound == item:
+                continue
+            label, detail_text, detail_color = self.render_row(item)
+            text.configure(text=label)
+            detail.configure(text=detail_text, text_color=detail_color)
+            button.configure(command=lambda i=item: self.on_delete(i))
+            if bound is None:
+                frame.pack(fill="x", pady=2)
+            row[4] = item
+
+        if self.items:
+            self.scrollbar.set(self.top / len(self.items), min(1.0, (self.top + self.row_count) / len(self.items)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
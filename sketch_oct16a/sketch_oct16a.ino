@@ -138,6 +138,7 @@ void drawRFIDScreen(const char* msg);
 void checkRFID();
 void handleKey(char key);
 void handleSerialIconUpload();
+extern bool binUploadActive;
 
 void initializeLabels() {
   if (labelsInitialized) return;
@@ -151,8 +152,16 @@ void initializeLabels() {
   labelsInitialized = true;
 }
 
+// Identity for host-side port discovery: the factory MAC, stable across reflashes
+void printDeckId() {
+  uint64_t mac = ESP.getEfuseMac();
+  Serial.printf("DECK_ID:%04X%08X\n", (uint16_t)(mac >> 32), (uint32_t)mac);
+}
+
 void setup() {
   Serial.begin(115200);
+  // First line on boot, so a host that reset us by opening the port knows who we are
+  printDeckId();
   
   if(!SPIFFS.begin(true)){
     Serial.println("SPIFFS Mount Failed");
@@ -194,6 +203,7 @@ void setup() {
   nfc.SAMConfig();
 
   drawMainMenu();
+  Serial.println("DECK_READY");
 }
 
 void loop() {
@@ -202,36 +212,166 @@ void loop() {
   char key = keypad.getKey();
   if (key) handleKey(key);
 
-  if (menuState == RFID_UNLOCK || menuState == RFID_VERIFY) checkRFID();
+  if (!binUploadActive && (menuState == RFID_UNLOCK || menuState == RFID_VERIFY)) checkRFID();
   yield();
 }
 
 File uploadFile;
 int uploadRemaining = 0;
 String uploadKey = "";
+// Uploads are written to <name>.part and renamed when complete, so an
+// interrupted upload can be resumed and never leaves a half icon behind
+String uploadPartName = "";
+String uploadFinalName = "";
+
+// Binary framed icon upload (protocol described in PC client/icon_protocol.py)
+#define FRAME_MAGIC 0xA5
+#define FRAME_IDLE_RESET_MS 200
+#define BIN_UPLOAD_TIMEOUT_MS 2000
+bool binUploadActive = false;
+bool binNakSent = false;
+uint8_t binExpectedSeq = 0;
+unsigned long binLastByte = 0;
+uint8_t frameBuf[260];
+int frameLen = 0;
+
+uint16_t crc16Ccitt(const uint8_t* data, int len) {
+  uint16_t crc = 0xFFFF;
+  for (int i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int b = 0; b < 8; b++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+    }
+  }
+  return crc;
+}
+
+void finishIconUpload() {
+  uploadFile.close();
+  if (SPIFFS.exists(uploadFinalName)) SPIFFS.remove(uploadFinalName);
+  SPIFFS.rename(uploadPartName, uploadFinalName);
+  Serial.println("UPLOAD_DONE");
+  if (menuState == STEAMDECK) drawSteamdeckGrid();
+  else if (menuState == PASSWORD_MANAGER) drawPasswordManagerGrid();
+}
+
+void handleBinaryFrames() {
+  if (frameLen > 0 && millis() - binLastByte > FRAME_IDLE_RESET_MS) frameLen = 0;
+
+  while (Serial.available() > 0) {
+    uint8_t b = Serial.read();
+    binLastByte = millis();
+    if (frameLen == 0 && b != FRAME_MAGIC) continue;
+    frameBuf[frameLen++] = b;
+    if (frameLen < 3 || frameLen < frameBuf[2] + 5) continue;
+
+    int payloadLen = frameBuf[2];
+    uint8_t seq = frameBuf[1];
+    uint16_t crc = ((uint16_t)frameBuf[3 + payloadLen] << 8) | frameBuf[4 + payloadLen];
+    frameLen = 0;
+
+    // An empty frame with a good CRC is the host cancelling: drop the partial file
+    if (payloadLen == 0 && crc == crc16Ccitt(frameBuf + 1, 2)) {
+      binUploadActive = false;
+      uploadFile.close();
+      SPIFFS.remove(uploadPartName);
+      Serial.println("UPLOAD_ABORT");
+      return;
+    }
+
+    if (seq != binExpectedSeq || crc != crc16Ccitt(frameBuf + 1, payloadLen + 2)) {
+      // Go-back-N: report the expected frame once and drop everything until it arrives
+      if (!binNakSent) {
+        Serial.print("NAK:"); Serial.println(binExpectedSeq);
+        binNakSent = true;
+      }
+      continue;
+    }
+
+    uploadFile.write(frameBuf + 3, payloadLen);
+    uploadRemaining -= payloadLen;
+    binNakSent = false;
+    Serial.print("ACK:"); Serial.println(seq);
+    binExpectedSeq++;
+
+    if (uploadRemaining <= 0) {
+      binUploadActive = false;
+      finishIconUpload();
+      return;
+    }
+    yield();
+  }
+
+  if (millis() - binLastByte > BIN_UPLOAD_TIMEOUT_MS) {
+    // The .part file is kept so the host can resume from it
+    binUploadActive = false;
+    uploadFile.close();
+    Serial.println("UPLOAD_ABORT");
+  }
+}
 
 void handleSerialIconUpload() {
+  if (binUploadActive) {
+    handleBinaryFrames();
+    return;
+  }
+
   if (Serial.available() > 0) {
     String line = Serial.readStringUntil('\n');
     line.trim();
     
-    if (line.startsWith("ICON_START:")) {
+    if (line == "CAPS?") {
+      Serial.println("CAPS:BIN1");
+    }
+    else if (line == "WHO?") {
+      printDeckId();
+    }
+    else if (line.startsWith("ICON_START:") || line.startsWith("ICON_BIN:")) {
       int firstColon = line.indexOf(':');
       int secondColon = line.indexOf(':', firstColon + 1);
       int thirdColon = line.indexOf(':', secondColon + 1);
+      int fourthColon = line.indexOf(':', thirdColon + 1);
       
       String iconType = line.substring(firstColon + 1, secondColon);
       uploadKey = line.substring(secondColon + 1, thirdColon);
-      uploadRemaining = line.substring(thirdColon + 1).toInt();
+      int totalSize = line.substring(thirdColon + 1, fourthColon < 0 ? line.length() : fourthColon).toInt();
+      // ICON_BIN:<type>:<key>:<size>:R asks to continue an interrupted upload
+      bool resume = line.startsWith("ICON_BIN:") && fourthColon >= 0 && line.substring(fourthColon + 1) == "R";
       
-      String filename = "/" + iconType + "_" + uploadKey + ".raw";
-      Serial.print("Opening for write: "); Serial.println(filename);
+      uploadFinalName = "/" + iconType + "_" + uploadKey + ".raw";
+      uploadPartName = "/" + iconType + "_" + uploadKey + ".part";
+      Serial.print("Opening for write: "); Serial.println(uploadPartName);
       
-      if (SPIFFS.exists(filename)) SPIFFS.remove(filename);
+      int resumeAt = 0;
+      if (resume && SPIFFS.exists(uploadPartName)) {
+        File part = SPIFFS.open(uploadPartName, "r");
+        resumeAt = part.size();
+        part.close();
+        if (resumeAt > totalSize) resumeAt = 0;
+      }
+      if (resumeAt > 0) {
+        uploadFile = SPIFFS.open(uploadPartName, "a");
+      } else {
+        if (SPIFFS.exists(uploadPartName)) SPIFFS.remove(uploadPartName);
+        uploadFile = SPIFFS.open(uploadPartName, "w");
+      }
+      uploadRemaining = totalSize - resumeAt;
       
-      uploadFile = SPIFFS.open(filename, "w");
       if (uploadFile) {
-         Serial.println("UPLOAD_START_OK");
+         if (line.startsWith("ICON_BIN:")) {
+           binUploadActive = true;
+           binNakSent = false;
+           binExpectedSeq = 0;
+           frameLen = 0;
+           binLastByte = millis();
+         }
+         // The resume offset is what the deck actually has on flash; the host continues from there
+         Serial.print("UPLOAD_START_OK:"); Serial.println(resumeAt);
+         if (binUploadActive && uploadRemaining <= 0) {
+           // Everything arrived before the interruption; only the rename was missing
+           binUploadActive = false;
+           finishIconUpload();
+         }
       } else {
          Serial.println("UPLOAD_START_FAIL");
       }
@@ -253,10 +393,7 @@ void handleSerialIconUpload() {
     }
     else if (line == "ICON_END") {
       if (uploadFile) {
-        uploadFile.close();
-        Serial.println("UPLOAD_DONE");
-        if (menuState == STEAMDECK) drawSteamdeckGrid();
-        else if (menuState == PASSWORD_MANAGER) drawPasswordManagerGrid();
+        finishIconUpload();
       }
     }
     else if (line.startsWith("LABEL_APP:")) {
@@ -277,7 +414,7 @@ void handleSerialIconUpload() {
         for (int c = 0; c < 4; c++) {
           if (String(keyMap[r][c]) == key) {
             dynamicAppLabels[r][c] = name;
-            Serial.println("LABEL_APP_OK");
+            Serial.print("LABEL_APP_OK:"); Serial.println(key);
             if (menuState == STEAMDECK) drawSteamdeckGrid();
             return;
           }
@@ -302,7 +439,7 @@ void handleSerialIconUpload() {
         for (int c = 0; c < 4; c++) {
           if (String(keyMap[r][c]) == key) {
             dynamicPassLabels[r][c] = name;
-            Serial.println("LABEL_PASS_OK");
+            Serial.print("LABEL_PASS_OK:"); Serial.println(key);
             if (menuState == PASSWORD_MANAGER) drawPasswordManagerGrid();
             return;
           }